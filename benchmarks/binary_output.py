@@ -0,0 +1,109 @@
+"""Đo throughput (MB/s) của đường output nhị phân cho lệnh exec-out.
+
+So sánh ba cách đọc output của `adb exec-out screencap -p` (adb giả ghi
+--bytes byte nhị phân):
+
+    text          cách cũ: Popen(text=True) + communicate(), decode toàn bộ
+    bytes         Popen không text + communicate(), giữ cả output trong bộ nhớ
+    binary        ADBHandler.execute_command(binary=True): readinto() vào buffer
+                  dùng lại rồi ghi thẳng ra file
+
+Mỗi cách kiểm tra sha256 của output so với dữ liệu gốc để phát hiện hỏng dữ liệu.
+
+    python benchmarks/binary_output.py [--runs 10] [--bytes 16777216] [--output result.json]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import FAKE_ADB, ROOT, emit_report
+
+COMMAND = ['exec-out', 'screencap', '-p']
+
+def expected_digest(size):
+    block = bytes(range(256)) * 4096
+    digest = hashlib.sha256()
+    remaining = size
+    while remaining > 0:
+        chunk = block[:remaining]
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.hexdigest()
+
+def read_text():
+    process = subprocess.Popen([FAKE_ADB] + COMMAND, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, bufsize=1, universal_newlines=True)
+    try:
+        stdout, _ = process.communicate()
+    except UnicodeDecodeError:
+        process.kill()
+        process.wait()
+        return None
+    data = stdout.encode()
+    return len(data), hashlib.sha256(data).hexdigest()
+
+def read_bytes():
+    result = subprocess.run([FAKE_ADB] + COMMAND, capture_output=True)
+    return len(result.stdout), hashlib.sha256(result.stdout).hexdigest()
+
+def make_read_binary(handler):
+    def read_binary():
+        task_id, result = handler.execute_command(' '.join(COMMAND), binary=True)
+        handler.cleanup_task(task_id)
+        os.remove(result['output_path'])
+        return result['bytes'], result['sha256']
+    return read_binary
+
+def measure(read, runs, size, digest):
+    walls = []
+    outcome = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        outcome = read()
+        walls.append(time.perf_counter() - started)
+        if outcome is None:
+            return {'error': 'UnicodeDecodeError: binary output is not valid text'}
+    median = statistics.median(walls)
+    return {
+        'bytes': outcome[0],
+        'intact': outcome == (size, digest),
+        'ms_median': round(median * 1000, 1),
+        'mb_per_sec': round(size / median / 1e6, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--bytes', type=int, default=16 * 1024 * 1024)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='binary-bench-')
+    os.environ.update(FAKE_ADB_LATENCY='0', FAKE_ADB_OUTPUT_BYTES=str(args.bytes),
+                      ADB_PATH=FAKE_ADB, BINARY_OUTPUT_DIR=workdir)
+    sys.path.insert(0, os.path.join(ROOT, 'proxy'))
+    from handlers.adb_handler import ADBHandler
+
+    try:
+        digest = expected_digest(args.bytes)
+        handler = ADBHandler()
+        emit_report({
+            'scenario': 'binary_output',
+            'config': vars(args),
+            'text': measure(read_text, args.runs, args.bytes, digest),
+            'bytes': measure(read_bytes, args.runs, args.bytes, digest),
+            'binary': measure(make_read_binary(handler), args.runs, args.bytes, digest),
+        }, args.output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
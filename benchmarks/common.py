@@ -0,0 +1,158 @@
+"""Tiện ích chung cho các kịch bản benchmark: đo CPU/RSS, percentile, xuất JSON."""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES = os.path.join(ROOT, 'benchmarks', 'fakes')
+FAKE_ADB = os.path.join(FAKES, 'fake_adb.py')
+PYTHON = sys.executable
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, timeout=30, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def latency_summary(latencies):
+    """p50/p99/max tính bằng mili giây"""
+    ms = [v * 1000 for v in latencies]
+    return {
+        'count': len(ms),
+        'p50_ms': round(percentile(ms, 50), 3) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 3) if ms else None,
+        'max_ms': round(max(ms), 3) if ms else None,
+    }
+
+class ResourceSampler:
+    """Lấy mẫu CPU và RSS của một process và toàn bộ process con.
+
+    CPU được cộng dồn từ cpu_times nên process con sống ngắn (adb giả) vẫn được
+    tính khi chúng đã được process cha wait.
+    """
+
+    def __init__(self, pid=None, interval=0.2):
+        self.process = psutil.Process(pid or os.getpid())
+        self.interval = interval
+        self.rss_samples = []
+        self.running = False
+        self.thread = None
+
+    def _cpu_seconds(self):
+        times = self.process.cpu_times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def _rss(self):
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while self.running:
+            try:
+                self.rss_samples.append(self._rss())
+            except psutil.Error:
+                break
+            time.sleep(self.interval)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.cpu_start = self._cpu_seconds()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        elapsed = time.monotonic() - self.started
+        try:
+            cpu = self._cpu_seconds() - self.cpu_start
+        except psutil.Error:
+            cpu = None
+        if self.thread:
+            self.thread.join()
+        rss = self.rss_samples or [0]
+        return {
+            'cpu_seconds': round(cpu, 3) if cpu is not None else None,
+            'cpu_percent': round(cpu / elapsed * 100, 1) if cpu is not None and elapsed else None,
+            'rss_peak_mb': round(max(rss) / 1024 / 1024, 1),
+            'rss_avg_mb': round(sum(rss) / len(rss) / 1024 / 1024, 1),
+        }
+
+def emit_report(report, output=None):
+    """In kết quả JSON và ghi thêm ra file nếu có --output để so sánh giữa các lần chạy"""
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+
+def python_env(**extra):
+    env = dict(os.environ)
+    env.update({k: str(v) for k, v in extra.items()})
+    env['PYTHONUNBUFFERED'] = '1'
+    return env
+
+def run_load(request, total, concurrency):
+    """Gọi request() tổng cộng `total` lần từ `concurrency` thread.
+
+    request() trả về True nếu thành công; trả về (latencies, lỗi, thời gian chạy).
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        local = []
+        failed = 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            started = time.perf_counter()
+            try:
+                ok = request()
+            except Exception:
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return latencies, errors[0], time.perf_counter() - started
@@ -0,0 +1,40 @@
+"""So sánh hai file kết quả benchmark (--output) và in chênh lệch các chỉ số.
+
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+import sys
+
+def flatten(data, prefix=''):
+    items = {}
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            items.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = flatten(json.load(f))
+    with open(args.after) as f:
+        after = flatten(json.load(f))
+
+    print(f"{'metric':<32}{'before':>14}{'after':>14}{'change':>10}")
+    for name in sorted(set(before) & set(after)):
+        if name.startswith('config.'):
+            continue
+        old, new = before[name], after[name]
+        change = f'{(new - old) / old * 100:+.1f}%' if old else ''
+        print(f'{name:<32}{old:>14}{new:>14}{change:>10}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""adb giả dùng cho benchmark, không cần emulator.
+
+Trỏ ADB_PATH (proxy) hoặc PATH (flask-proxy) tới file này. Hành vi chỉnh qua
+biến môi trường:
+
+    FAKE_ADB_LATENCY       giây chờ trước khi trả output (mặc định 0.01)
+    FAKE_ADB_JITTER        dao động ngẫu nhiên cộng thêm vào latency (mặc định 0)
+    FAKE_ADB_OUTPUT_BYTES  số byte output của shell/exec-out (mặc định 256);
+                           exec-out screencap/cat ghi byte nhị phân
+    FAKE_ADB_FAILURE_RATE  tỉ lệ lệnh thất bại, 0..1 (mặc định 0)
+    FAKE_ADB_DEVICES       danh sách serial, cách nhau bởi dấu phẩy
+    FAKE_ADB_LOGCAT_LINES  số dòng logcat trước khi thoát, 0 = chạy mãi
+"""
+import os
+import random
+import sys
+import time
+
+LATENCY = float(os.getenv('FAKE_ADB_LATENCY', '0.01'))
+JITTER = float(os.getenv('FAKE_ADB_JITTER', '0'))
+OUTPUT_BYTES = int(os.getenv('FAKE_ADB_OUTPUT_BYTES', '256'))
+FAILURE_RATE = float(os.getenv('FAKE_ADB_FAILURE_RATE', '0'))
+DEVICES = [d for d in os.getenv('FAKE_ADB_DEVICES', 'emulator-5554').split(',') if d]
+LOGCAT_LINES = int(os.getenv('FAKE_ADB_LOGCAT_LINES', '0'))
+LINE_WIDTH = 100
+
+def write_payload(args):
+    """Ghi OUTPUT_BYTES byte theo từng dòng, dòng đầu nhắc lại lệnh"""
+    out = sys.stdout
+    header = ' '.join(args)[:LINE_WIDTH]
+    out.write(header + '\n')
+    remaining = OUTPUT_BYTES - len(header) - 1
+    line = 'x' * (LINE_WIDTH - 1) + '\n'
+    while remaining > 0:
+        chunk = line if remaining >= len(line) else 'x' * (remaining - 1) + '\n'
+        out.write(chunk)
+        remaining -= len(chunk)
+    out.flush()
+
+def write_binary():
+    """Ghi OUTPUT_BYTES byte nhị phân: mọi giá trị 0..255, kể cả CR/LF và byte không hợp lệ UTF-8"""
+    out = sys.stdout.buffer
+    block = bytes(range(256)) * 4096
+    remaining = OUTPUT_BYTES
+    while remaining > 0:
+        chunk = block[:remaining]
+        out.write(chunk)
+        remaining -= len(chunk)
+    out.flush()
+
+def logcat():
+    count = 0
+    while not LOGCAT_LINES or count < LOGCAT_LINES:
+        sys.stdout.write(f'01-01 00:00:00.000  1000  1000 I Bench   : line {count}\n')
+        sys.stdout.flush()
+        count += 1
+        time.sleep(LATENCY)
+
+def main(argv):
+    args = list(argv)
+    serial = None
+    if len(args) >= 2 and args[0] == '-s':
+        serial = args[1]
+        args = args[2:]
+    if not args:
+        sys.stderr.write('adb: no command\n')
+        return 1
+
+    command = args[0]
+    if command == 'version':
+        print('Android Debug Bridge version 1.0.41 (fake)')
+        return 0
+    if command == 'devices':
+        print('List of devices attached')
+        for device in DEVICES:
+            print(f'{device}\tdevice')
+        return 0
+
+    time.sleep(LATENCY + random.uniform(0, JITTER))
+
+    if serial and serial not in DEVICES:
+        sys.stderr.write(f"adb: device '{serial}' not found\n")
+        return 1
+    if random.random() < FAILURE_RATE:
+        sys.stderr.write('error: closed\n')
+        return 1
+
+    if command in ('connect', 'disconnect'):
+        print(f'{command}ed to {args[1] if len(args) > 1 else ""}')
+    elif command == 'logcat':
+        logcat()
+    elif command == 'exec-out' and args[1:2] in (['screencap'], ['cat']):
+        write_binary()
+    else:
+        write_payload(args)
+    return 0
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except (BrokenPipeError, KeyboardInterrupt):
+        sys.exit(0)
@@ -0,0 +1,137 @@
+"""adb server giả nói giao thức host của adb (mặc định cổng 5037).
+
+Hỗ trợ host:version, host:devices, host:transport:<serial>, host:transport-any
+và các service shell:/exec: sau khi đã chọn transport. Đủ để benchmark client
+nói chuyện trực tiếp với adb server mà không cần fork adb.
+
+    python benchmarks/fakes/fake_adb_server.py [--port 5037] [--latency 0.01]
+        [--output-bytes 256] [--failure-rate 0] [--devices emulator-5554]
+"""
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+class FakeADBConfig:
+    def __init__(self, latency=0.01, output_bytes=256, failure_rate=0.0, devices=('emulator-5554',)):
+        self.latency = latency
+        self.output_bytes = output_bytes
+        self.failure_rate = failure_rate
+        self.devices = list(devices)
+
+def service_name(request):
+    """Tên service để đếm, bỏ phần serial/lệnh"""
+    if request.startswith('host:transport:'):
+        return 'host:transport'
+    if request.startswith('host:'):
+        return request
+    return request.split(':')[0]
+
+class _ADBRequestHandler(socketserver.BaseRequestHandler):
+    def _read_request(self):
+        header = self._recv_exact(4)
+        if not header:
+            return None
+        return self._recv_exact(int(header, 16)).decode()
+
+    def _recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return data
+            data += chunk
+        return data
+
+    def _okay(self, payload=None):
+        if payload is None:
+            self.request.sendall(b'OKAY')
+        else:
+            data = payload.encode()
+            self.request.sendall(b'OKAY' + f'{len(data):04x}'.encode() + data)
+
+    def _fail(self, message):
+        data = message.encode()
+        self.request.sendall(b'FAIL' + f'{len(data):04x}'.encode() + data)
+
+    def handle(self):
+        config = self.server.config
+        transport = None
+        while True:
+            request = self._read_request()
+            if request is None:
+                return
+            self.server.count(service_name(request))
+
+            if request == 'host:version':
+                self._okay('0029')
+            elif request == 'host:devices':
+                self._okay(''.join(f'{d}\tdevice\n' for d in config.devices))
+            elif request.startswith('host:transport:'):
+                transport = request.split(':', 2)[2]
+                if transport not in config.devices:
+                    self._fail(f"device '{transport}' not found")
+                    return
+                self._okay()
+            elif request in ('host:transport-any', 'host:transport-local'):
+                transport = config.devices[0] if config.devices else None
+                if transport is None:
+                    self._fail('no devices/emulators found')
+                    return
+                self._okay()
+            elif request.startswith(('shell:', 'exec:')):
+                if transport is None:
+                    self._fail('no transport selected')
+                    return
+                time.sleep(config.latency)
+                if random.random() < config.failure_rate:
+                    self._fail('closed')
+                    return
+                self._okay()
+                self.request.sendall(b'x' * config.output_bytes)
+                return
+            else:
+                self._fail(f'unknown host service {request}')
+                return
+
+class FakeADBServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _ADBRequestHandler)
+        self.config = config
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def count(self, service):
+        with self._lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5037)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--output-bytes', type=int, default=256)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--devices', default='emulator-5554')
+    args = parser.parse_args()
+
+    config = FakeADBConfig(args.latency, args.output_bytes, args.failure_rate,
+                           [d for d in args.devices.split(',') if d])
+    server = FakeADBServer((args.host, args.port), config)
+    print(f'Fake adb server listening on {args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
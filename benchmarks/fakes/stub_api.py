@@ -0,0 +1,166 @@
+"""Stub cục bộ của API production cho benchmark proxy.
+
+Phục vụ các endpoint mà proxy/handlers/api_handler.py gọi:
+
+    GET  /api/terminal/execute  trả task đang chờ (tối đa --batch mỗi lần poll)
+    POST /api/emulator/logs     nhận kết quả task
+    POST /api/emulator/status   nhận cập nhật trạng thái
+    POST /api/errors, GET /health
+
+Mỗi task mang một traceparent riêng; proxy gửi lại header này khi upload kết
+quả nên stub ghép được thời điểm phát task với thời điểm nhận kết quả.
+
+    python benchmarks/fakes/stub_api.py [--port 3000] [--tasks 1000]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class TaskSource:
+    """Sinh task cho proxy và ghi lại latency end-to-end của từng task"""
+
+    def __init__(self, total=1000, batch=10, command='shell echo bench',
+                 serial='emulator-5554', background_every=0, rate=0.0):
+        self.total = total
+        self.batch = batch
+        self.command = command
+        self.serial = serial
+        self.background_every = background_every
+        self.rate = rate
+        self.issued = {}
+        self.completed = {}
+        self.status_updates = 0
+        self.errors = 0
+        self.started = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def next_batch(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.started is None:
+                self.started = now
+            allowed = self.total
+            if self.rate:
+                # Giới hạn tốc độ phát task theo --rate (task/giây)
+                allowed = min(self.total, int((now - self.started) * self.rate) + 1)
+            count = max(0, min(self.batch, allowed - len(self.issued)))
+            tasks = []
+            for _ in range(count):
+                n = len(self.issued)
+                trace_id = f'{n + 1:032x}'
+                self.issued[trace_id] = now
+                tasks.append({
+                    'task_id': f'bench-{n}',
+                    'command': self.command,
+                    'emulator_serial': self.serial,
+                    'background': bool(self.background_every and n % self.background_every == 0),
+                    'traceparent': f'00-{trace_id}-{"0" * 15}1-00'
+                })
+        return tasks
+
+    def complete(self, traceparent):
+        if not traceparent:
+            return
+        trace_id = traceparent.split('-')[1] if traceparent.count('-') == 3 else None
+        now = time.monotonic()
+        with self.lock:
+            if trace_id in self.issued and trace_id not in self.completed:
+                self.completed[trace_id] = now
+                if len(self.completed) >= self.total:
+                    self.done.set()
+
+    def latencies(self):
+        with self.lock:
+            return [self.completed[t] - self.issued[t] for t in self.completed]
+
+    def throughput(self):
+        with self.lock:
+            if not self.completed:
+                return 0.0
+            elapsed = max(self.completed.values()) - self.started
+        return len(self.completed) / elapsed if elapsed > 0 else 0.0
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        source = self.server.source
+        path = self.path.split('?')[0]
+        if path == '/health':
+            self._send_json({'status': 'healthy'})
+        elif path == '/api/terminal/execute':
+            self._send_json({'status': 'success', 'tasks': source.next_batch()})
+        else:
+            self._send_json({'error': 'Not Found'}, 404)
+
+    def do_POST(self):
+        source = self.server.source
+        path = self.path.split('?')[0]
+        self._read_body()
+        if path == '/api/emulator/logs':
+            source.complete(self.headers.get('traceparent'))
+        elif path == '/api/emulator/status':
+            source.status_updates += 1
+        elif path == '/api/errors':
+            source.errors += 1
+        else:
+            self._send_json({'error': 'Not Found'}, 404)
+            return
+        self._send_json({'status': 'success'})
+
+    def log_message(self, format, *args):
+        pass
+
+class StubAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, source):
+        super().__init__(address, _StubRequestHandler)
+        self.source = source
+
+    def handle_error(self, request, client_address):
+        # Proxy bị dừng giữa chừng làm đứt kết nối keep-alive, không cần in traceback
+        pass
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--command', default='shell echo bench')
+    args = parser.parse_args()
+
+    source = TaskSource(args.tasks, args.batch, args.command)
+    server = StubAPIServer((args.host, args.port), source)
+    print(f'Stub API listening on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
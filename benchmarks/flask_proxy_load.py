@@ -0,0 +1,124 @@
+"""Benchmark các route của flask-proxy với adb giả và stub API.
+
+Chạy flask-proxy (server threaded) trong process con, đặt adb giả lên đầu PATH
+và trỏ LEGACY_API_URL về stub API, rồi bắn request song song vào:
+
+    execute  POST /api/emulator/execute
+    devices  GET  /api/emulator/devices
+    forward  POST /api/proxy/forward   (chuyển tiếp tới /health của stub API)
+
+    python benchmarks/flask_proxy_load.py [--route execute] [--requests 500]
+        [--concurrency 16] [--adb-latency 0.01] [--output result.json]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import (
+    FAKE_ADB, PYTHON, ROOT, ResourceSampler, emit_report, free_port,
+    latency_summary, python_env, run_load, wait_for_port
+)
+from fakes.stub_api import StubAPIServer, TaskSource
+
+LAUNCHER = '''
+import sys
+from config.default import Config
+Config.LEGACY_API_URL = sys.argv[1]
+from app import create_app
+create_app().run(host="127.0.0.1", port=int(sys.argv[2]), threaded=True, debug=False)
+'''
+
+def make_request(route, base_url, sessions):
+    def request():
+        session = sessions.session()
+        if route == 'execute':
+            response = session.post(f'{base_url}/api/emulator/execute',
+                                    json={'command': 'shell echo bench', 'device': 'emulator-5554'})
+            return response.ok and response.json().get('returncode') == 0
+        if route == 'devices':
+            response = session.get(f'{base_url}/api/emulator/devices')
+            return response.ok
+        response = session.post(f'{base_url}/api/proxy/forward', json={'path': '/health', 'method': 'GET'})
+        return response.ok
+    return request
+
+class _Sessions:
+    """Mỗi thread client dùng một requests.Session riêng (keep-alive)"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--route', choices=['execute', 'devices', 'forward'], default='execute')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--adb-latency', type=float, default=0.01)
+    parser.add_argument('--output-bytes', type=int, default=256)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    # flask-proxy gọi 'adb' theo tên nên đặt adb giả vào một thư mục trên PATH
+    bindir = tempfile.mkdtemp(prefix='fake-adb-')
+    os.chmod(FAKE_ADB, 0o755)
+    os.symlink(FAKE_ADB, os.path.join(bindir, 'adb'))
+    workdir = tempfile.mkdtemp(prefix='flask-proxy-bench-')
+
+    api = StubAPIServer(('127.0.0.1', free_port()), TaskSource(total=0)).start()
+    port = free_port()
+    env = python_env(
+        PATH=bindir + os.pathsep + os.environ.get('PATH', ''),
+        PYTHONPATH=os.path.join(ROOT, 'flask-proxy'),
+        FAKE_ADB_LATENCY=args.adb_latency,
+        FAKE_ADB_OUTPUT_BYTES=args.output_bytes,
+        FAKE_ADB_FAILURE_RATE=args.failure_rate,
+    )
+    server = subprocess.Popen(
+        [PYTHON, '-c', LAUNCHER, api.url, str(port)],
+        cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_port(port, process=server):
+            emit_report({'scenario': 'flask_proxy_load', 'error': 'flask-proxy did not start'}, args.output)
+            return 1
+
+        sampler = ResourceSampler(server.pid).start()
+        latencies, errors, elapsed = run_load(
+            make_request(args.route, f'http://127.0.0.1:{port}', _Sessions()),
+            args.requests, args.concurrency
+        )
+        resources = sampler.stop()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        api.shutdown()
+        shutil.rmtree(bindir, ignore_errors=True)
+
+    emit_report({
+        'scenario': 'flask_proxy_load',
+        'config': vars(args),
+        'requests_ok': len(latencies),
+        'errors': errors,
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'latency': latency_summary(latencies),
+        'resources': resources,
+    }, args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Benchmark GuiControlService (gui-control.py service) dưới tải song song.
+
+Chạy service trong process con rồi gửi request JSON qua socket giống client
+Node. Action mặc định là appium_sessions (chỉ đọc thống kê pool) để đo riêng
+chi phí nhận/parse/trả lời request; đổi --action/--params để đo action thật
+(cần Xvfb/Appium).
+
+    python benchmarks/gui_service_load.py [--requests 500] [--concurrency 16]
+        [--action appium_sessions] [--params '{}'] [--displays 1]
+        [--devices 4] [--output result.json]
+
+Với --displays N > 1 service chạy N display ảo; request được gán --devices key
+khác nhau để chia đều cho các display, và báo cáo kèm utilization từng display.
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import (
+    PYTHON, ROOT, ResourceSampler, emit_report, free_port, latency_summary,
+    python_env, run_load, wait_for_port
+)
+
+def send(port, action, params):
+    body = json.dumps({'action': action, 'params': params})
+    payload = (
+        'POST / HTTP/1.1\r\n'
+        'Host: 127.0.0.1\r\n'
+        'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        '\r\n'
+        f'{body}'
+    ).encode()
+    with socket.create_connection(('127.0.0.1', port), timeout=60) as conn:
+        conn.sendall(payload)
+        response = b''
+        while True:
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    header, _, content = response.partition(b'\r\n\r\n')
+    if not header.startswith(b'HTTP/1.1 200'):
+        return None
+    return json.loads(content)
+
+def make_request(port, action, params, devices):
+    keys = itertools.cycle([f'bench-device-{i}' for i in range(devices)]) if devices else None
+    lock = threading.Lock()
+
+    def request():
+        request_params = dict(params)
+        if keys is not None:
+            with lock:
+                request_params['device'] = next(keys)
+        result = send(port, action, request_params)
+        return result is not None and result.get('status') != 'error'
+    return request
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--action', default='appium_sessions')
+    parser.add_argument('--params', default='{}', help='JSON params của action')
+    parser.add_argument('--displays', type=int, default=1)
+    parser.add_argument('--devices', type=int, default=0, help='số device key luân phiên, 0 = không gán')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    port = free_port()
+    # Log DEBUG của service rất nhiều: ghi ra file để pipe không bị đầy làm service treo
+    log = tempfile.TemporaryFile()
+    service = subprocess.Popen(
+        [PYTHON, os.path.join(ROOT, 'gui-control.py'), 'service', '--port', str(port),
+         '--displays', str(args.displays)],
+        cwd=ROOT, env=python_env(),
+        stdout=subprocess.DEVNULL, stderr=log
+    )
+    try:
+        if not wait_for_port(port, args.startup_timeout, process=service):
+            service.kill()
+            service.wait()
+            log.seek(0)
+            stderr = log.read().decode(errors='replace')
+            emit_report({
+                'scenario': 'gui_service_load',
+                'error': 'gui-control service did not start',
+                'stderr_tail': stderr.splitlines()[-5:],
+            }, args.output)
+            return 1
+
+        sampler = ResourceSampler(service.pid).start()
+        latencies, errors, elapsed = run_load(
+            make_request(port, args.action, json.loads(args.params), args.devices),
+            args.requests, args.concurrency
+        )
+        resources = sampler.stop()
+        displays = (send(port, 'gui_displays', {}) or {}).get('displays')
+    finally:
+        if service.poll() is None:
+            service.terminate()
+            try:
+                service.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                service.kill()
+
+    emit_report({
+        'scenario': 'gui_service_load',
+        'config': vars(args),
+        'requests_ok': len(latencies),
+        'errors': errors,
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'latency': latency_summary(latencies),
+        'resources': resources,
+        'displays': displays,
+    }, args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
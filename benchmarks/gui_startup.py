@@ -0,0 +1,110 @@
+"""Đo thời gian khởi động của gui-control.py.
+
+    module_import  import gui-control.py với -X importtime, liệt kê các import
+                   tốn thời gian nhất và module nặng nào đã bị nạp
+    cli_local      lệnh CLI một lần chạy trong process mới (--local)
+    cli_forwarded  lệnh CLI một lần được chuyển tới service đang chạy
+
+    python benchmarks/gui_startup.py [--runs 10] [--action appium_sessions]
+        [--top 15] [--output result.json]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import PYTHON, ROOT, emit_report, free_port, python_env, wait_for_port
+
+GUI_CONTROL = os.path.join(ROOT, 'gui-control.py')
+HEAVY_MODULES = ['pyautogui', 'pyvirtualdisplay', 'appium', 'selenium']
+
+IMPORT_PROBE = f'''
+import runpy, sys
+runpy.run_path({GUI_CONTROL!r}, run_name='gui_control')
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+'''
+
+def parse_importtime(stderr, top):
+    """Lấy các import cấp cao nhất (không thụt lề) theo thời gian cumulative"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+        # Cột tên: một dấu cách rồi hai dấu cách cho mỗi cấp import lồng nhau
+        if name[1:2] == ' ':
+            continue
+        entries.append((int(cumulative_us), name.strip()))
+    entries.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 2)} for us, name in entries[:top]]
+
+def module_import(runs, top):
+    walls = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [PYTHON, '-X', 'importtime', '-c', IMPORT_PROBE],
+            cwd=ROOT, env=python_env(), capture_output=True, text=True
+        )
+        walls.append(time.perf_counter() - started)
+    return {
+        'ok': result.returncode == 0,
+        'wall_ms_median': round(statistics.median(walls) * 1000, 1),
+        'heavy_modules_loaded': [m for m in result.stdout.strip().split(',') if m],
+        'top_imports': parse_importtime(result.stderr, top),
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode else None,
+    }
+
+def run_cli(args, runs, env):
+    walls = []
+    output = ''
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([PYTHON, GUI_CONTROL] + args, cwd=ROOT, env=env,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - started)
+        output = result.stdout.strip()
+    return {
+        'wall_ms_median': round(statistics.median(walls) * 1000, 1),
+        'wall_ms_min': round(min(walls) * 1000, 1),
+        'last_output': output[-200:],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--action', default='appium_sessions')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    report = {'scenario': 'gui_startup', 'config': vars(args)}
+    report['module_import'] = module_import(args.runs, args.top)
+
+    # Cổng không có service: CLI phải tự chạy action
+    report['cli_local'] = run_cli([args.action, '--local'], args.runs,
+                                  python_env(GUI_CONTROL_PORT=free_port()))
+
+    port = free_port()
+    service = subprocess.Popen(
+        [PYTHON, GUI_CONTROL, 'service', '--port', str(port)],
+        cwd=ROOT, env=python_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if wait_for_port(port, process=service):
+            report['cli_forwarded'] = run_cli([args.action], args.runs,
+                                              python_env(GUI_CONTROL_PORT=port))
+        else:
+            report['cli_forwarded'] = {'error': 'gui-control service did not start'}
+    finally:
+        service.terminate()
+        service.wait(timeout=10)
+
+    emit_report(report, args.output)
+
+if __name__ == '__main__':
+    main()
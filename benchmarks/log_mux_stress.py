@@ -0,0 +1,79 @@
+"""Stress test cho LogMultiplexer trong startup.py.
+
+Chạy một process con ghi 100MB ra stdout và stderr; multiplexer phải đọc cạn
+pipe liên tục để process con không bao giờ bị block khi ghi.
+
+    python benchmarks/log_mux_stress.py [--mb 100] [--timeout 60]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from startup import LogMultiplexer
+
+CHILD = r'''
+import sys
+line = b"x" * 99 + b"\n"
+block = line * 10000
+total = int(sys.argv[1]) * 1024 * 1024
+written = 0
+while written < total:
+    out = sys.stdout.buffer if (written // len(block)) % 2 == 0 else sys.stderr.buffer
+    out.write(block)
+    written += len(block)
+sys.stdout.flush()
+sys.stderr.flush()
+'''
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        mux = LogMultiplexer(log_dir=log_dir)
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, '-c', CHILD, str(args.mb)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        mux.attach('stress', process)
+        try:
+            exit_code = process.wait(timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            print(json.dumps({"status": "error", "error": "child blocked writing to pipe"}))
+            sys.exit(1)
+        child_seconds = time.monotonic() - started
+
+        # Đợi multiplexer đọc hết phần còn lại trong pipe
+        expected = -(-args.mb * 1024 * 1024 // 1000000) * 1000000
+        while mux.stats()['stress']['bytes'] < expected and time.monotonic() - started < args.timeout:
+            time.sleep(0.05)
+        total_seconds = time.monotonic() - started
+        stats = mux.stats()['stress']
+        mux.stop()
+
+        result = {
+            "status": "success" if exit_code == 0 and stats['bytes'] >= expected else "error",
+            "mb_written": round(expected / 1024 / 1024, 1),
+            "mb_drained": round(stats['bytes'] / 1024 / 1024, 1),
+            "child_seconds": round(child_seconds, 2),
+            "drain_seconds": round(total_seconds, 2),
+            "mb_per_sec": round(stats['bytes'] / 1024 / 1024 / total_seconds, 1),
+            "tail_lines": stats['tail'],
+            "log_files": sorted(os.listdir(log_dir)),
+        }
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result["status"] == "success" else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark tốc độ ghi message của flask-websocket-app.
+
+So sánh INSERT + commit từng message (ORM) với MessageWriter (write-behind,
+batch trong một transaction, SQLite WAL), rồi đo truy vấn lịch sử có cursor.
+
+    python benchmarks/message_persistence.py [--messages 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'flask-websocket-app'))
+
+from app import create_app
+from app.models import db, User, Message
+from app.persistence import message_writer, message_history
+
+def make_config(database):
+    class BenchConfig:
+        TESTING = True
+        SECRET_KEY = 'bench'
+        SOCKETIO_MESSAGE_QUEUE = None
+        SOCKETIO_ASYNC_MODE = 'threading'
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{database}'
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        MESSAGE_QUEUE_SIZE = 10000
+        MESSAGE_BATCH_SIZE = 500
+        MESSAGE_FLUSH_INTERVAL = 0.05
+    return BenchConfig
+
+def bench_naive(app, user_ids, messages):
+    with app.app_context():
+        started = time.perf_counter()
+        for i in range(messages):
+            db.session.add(Message(user_id=user_ids[i % len(user_ids)], content=f'message {i}'))
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+    return {"messages": messages, "seconds": round(elapsed, 3), "inserts_per_sec": round(messages / elapsed)}
+
+def bench_write_behind(user_ids, messages):
+    started = time.perf_counter()
+    for i in range(messages):
+        message_writer.enqueue(user_ids[i % len(user_ids)], f'message {i}')
+    enqueued = time.perf_counter() - started
+    message_writer.flush(timeout=120)
+    elapsed = time.perf_counter() - started
+    stats = message_writer.stats()
+    return {
+        "messages": messages,
+        "seconds": round(elapsed, 3),
+        "enqueue_per_sec": round(messages / enqueued),
+        "inserts_per_sec": round(stats['written'] / elapsed),
+        "batches": stats['batches'],
+        "dropped": stats['dropped'],
+    }
+
+def bench_history(app, user_id, page_size):
+    with app.app_context():
+        started = time.perf_counter()
+        pages, rows, cursor = 0, 0, None
+        while True:
+            messages, cursor = message_history(user_id, page_size, cursor)
+            pages += 1
+            rows += len(messages)
+            if not cursor:
+                break
+        elapsed = time.perf_counter() - started
+    return {"pages": pages, "rows": rows, "ms_per_page": round(elapsed / pages * 1000, 3)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--naive-messages', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app, _ = create_app(make_config(os.path.join(directory, 'bench.db')))
+        with app.app_context():
+            users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(args.users)]
+            db.session.add_all(users)
+            db.session.commit()
+            user_ids = [user.id for user in users]
+
+        result = {
+            "per_message_commit": bench_naive(app, user_ids, args.naive_messages),
+            "write_behind": bench_write_behind(user_ids, args.messages),
+            "history": bench_history(app, user_ids[0], args.page_size),
+        }
+        message_writer.stop()
+        print(json.dumps(result, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark end-to-end ADBProxy: poll task -> chạy adb -> upload kết quả.
+
+Chạy proxy/proxy.py thật trong process con, trỏ tới stub API cục bộ và adb giả,
+rồi đo task/giây, latency p50/p99 (từ lúc stub phát task tới lúc nhận kết quả),
+CPU và RSS của proxy.
+
+    python benchmarks/proxy_throughput.py [--tasks 500] [--batch 10]
+        [--poll-interval 0.1] [--adb-latency 0.01] [--output-bytes 256]
+        [--failure-rate 0] [--background-every 0] [--output result.json]
+
+Task background chỉ được tính tới lúc proxy gửi kết quả "started".
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import (
+    FAKE_ADB, PYTHON, ROOT, ResourceSampler, emit_report, free_port,
+    latency_summary, python_env
+)
+from fakes.stub_api import StubAPIServer, TaskSource
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=0.0, help='task/giây, 0 = không giới hạn')
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--command', default='shell echo bench')
+    parser.add_argument('--adb-latency', type=float, default=0.01)
+    parser.add_argument('--output-bytes', type=int, default=256)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--background-every', type=int, default=0,
+                        help='cứ N task thì có 1 task background, 0 = không có')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    os.chmod(FAKE_ADB, 0o755)
+    source = TaskSource(args.tasks, args.batch, args.command,
+                        background_every=args.background_every, rate=args.rate)
+    api = StubAPIServer(('127.0.0.1', free_port()), source).start()
+
+    env = python_env(
+        PYTHONPATH=os.path.join(ROOT, 'proxy'),
+        ADB_PATH=FAKE_ADB,
+        API_HOST='http://127.0.0.1',
+        API_PORT=api.server_address[1],
+        POLL_INTERVAL=args.poll_interval,
+        ENABLE_OUTPUT_STREAMING=0,
+        METRICS_PORT=free_port(),
+        TRACE_SAMPLE_RATE=0,
+        FAKE_ADB_LATENCY=args.adb_latency,
+        FAKE_ADB_OUTPUT_BYTES=args.output_bytes,
+        FAKE_ADB_FAILURE_RATE=args.failure_rate,
+    )
+    workdir = tempfile.mkdtemp(prefix='proxy-bench-')
+    proxy = subprocess.Popen(
+        [PYTHON, os.path.join(ROOT, 'proxy', 'proxy.py')],
+        cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sampler = ResourceSampler(proxy.pid).start()
+
+    finished = source.done.wait(args.timeout)
+    resources = sampler.stop()
+    proxy.send_signal(signal.SIGTERM)
+    try:
+        proxy.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proxy.kill()
+    api.shutdown()
+
+    emit_report({
+        'scenario': 'proxy_throughput',
+        'config': vars(args),
+        'finished': finished,
+        'tasks_issued': len(source.issued),
+        'tasks_completed': len(source.completed),
+        'tasks_per_sec': round(source.throughput(), 1),
+        'latency': latency_summary(source.latencies()),
+        'status_updates': source.status_updates,
+        'errors_reported': source.errors,
+        'resources': resources,
+        'proxy_exit_code': proxy.returncode,
+    }, args.output)
+
+if __name__ == '__main__':
+    main()
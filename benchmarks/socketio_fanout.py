@@ -0,0 +1,104 @@
+"""Benchmark fan-out của flask-websocket-app.
+
+So sánh số message/giây thực sự được giao tới client khi phát broadcast
+(mỗi message tới mọi client) và khi phát theo room device:<serial>, với
+1k và 10k client giả lập (Flask-SocketIO test client, không qua mạng).
+
+    python benchmarks/socketio_fanout.py [--clients 1000 10000] [--messages 2000]
+
+Chạy nhiều worker thật: mỗi worker `gunicorn -k eventlet -w 1 run:app` trên
+một port riêng, cùng SOCKETIO_MESSAGE_QUEUE, sau load balancer có sticky session.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'flask-websocket-app'))
+
+from app import create_app
+from app.websocket.service import socketio, coalescer, publish
+
+class BenchConfig:
+    TESTING = True
+    SECRET_KEY = 'bench'
+    SOCKETIO_MESSAGE_QUEUE = None
+    SOCKETIO_ASYNC_MODE = 'threading'
+    SOCKETIO_COALESCE_INTERVAL = 0.1
+
+def drain(clients):
+    return sum(len(client.get_received()) for client in clients)
+
+def run(app, clients_count, devices, messages, broadcast_messages, updates_per_key):
+    clients = []
+    for i in range(clients_count):
+        client = socketio.test_client(app)
+        client.emit('subscribe', {'device': f'emulator-{i % devices}'})
+        clients.append(client)
+    drain(clients)
+
+    result = {"clients": clients_count, "devices": devices, "messages": messages}
+
+    # Broadcast: mỗi message tới mọi client (ít message hơn vì chi phí O(clients))
+    started = time.perf_counter()
+    for i in range(broadcast_messages):
+        socketio.emit('response', {'message': i})
+    delivered = drain(clients)
+    elapsed = time.perf_counter() - started
+    result["broadcast"] = {
+        "messages": broadcast_messages,
+        "delivered": delivered,
+        "seconds": round(elapsed, 3),
+        "published_per_sec": round(broadcast_messages / elapsed),
+        "delivered_per_sec": round(delivered / elapsed),
+    }
+
+    # Room: chỉ client subscribe device đó nhận message
+    started = time.perf_counter()
+    for i in range(messages):
+        publish('response', {'message': i}, device=f'emulator-{random.randrange(devices)}')
+    delivered = drain(clients)
+    elapsed = time.perf_counter() - started
+    result["rooms"] = {
+        "delivered": delivered,
+        "seconds": round(elapsed, 3),
+        "published_per_sec": round(messages / elapsed),
+        "delivered_per_sec": round(delivered / elapsed),
+    }
+
+    # Coalesced: cập nhật trạng thái tần suất cao, chỉ bản mới nhất mỗi chu kỳ được phát
+    started = time.perf_counter()
+    for i in range(messages):
+        device = f'emulator-{(i // updates_per_key) % devices}'
+        publish('status', {'seq': i}, device=device, key='status')
+    coalescer.flush()
+    delivered = drain(clients)
+    elapsed = time.perf_counter() - started
+    result["coalesced"] = {
+        "delivered": delivered,
+        "seconds": round(elapsed, 3),
+        "published_per_sec": round(messages / elapsed),
+        "delivered_per_sec": round(delivered / elapsed),
+    }
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--broadcast-messages', type=int, default=50)
+    parser.add_argument('--updates-per-key', type=int, default=20)
+    args = parser.parse_args()
+
+    app, _ = create_app(BenchConfig)
+    # Flush thủ công để đo được số event sau khi gộp
+    coalescer.interval = 3600
+    results = [run(app, n, args.devices, args.messages, args.broadcast_messages, args.updates_per_key) for n in args.clients]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
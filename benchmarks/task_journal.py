@@ -0,0 +1,98 @@
+"""Đo chi phí của TaskJournal (proxy/utils/journal.py) trên mỗi task.
+
+Mỗi task ghi accept, start (chờ commit), --lines dòng output, finish và
+reported. So sánh group commit với commit từng event (batch_size=1), chạy task
+tuần tự như vòng lặp chính hoặc song song từ nhiều thread, rồi đo thời gian
+replay khi khởi động lại.
+
+    python benchmarks/task_journal.py [--tasks 2000] [--lines 20] [--threads 8]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'proxy'))
+
+from utils.journal import TaskJournal
+
+def run_tasks(journal, prefix, count, lines):
+    for i in range(count):
+        api_task_id = f'{prefix}-{i}'
+        task_id = f'local-{prefix}-{i}'
+        journal.accept(api_task_id, {'command': 'shell echo bench', 'emulator_serial': 'emulator-5554'})
+        journal.start(api_task_id, task_id)
+        offset = 0
+        for n in range(lines):
+            line = f'output line {n} ' + 'x' * 60 + '\n'
+            journal.output(task_id, offset, line)
+            offset += len(line)
+        journal.finish(task_id, 'completed', 0)
+        journal.reported(task_id)
+
+def bench(path, tasks, lines, threads, batch_size):
+    journal = TaskJournal(path, batch_size=batch_size)
+    started = time.perf_counter()
+    per_thread = tasks // threads
+    workers = [
+        threading.Thread(target=run_tasks, args=(journal, f't{n}', per_thread, lines))
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    journal.flush(timeout=120)
+    elapsed = time.perf_counter() - started
+    stats = journal.stats()
+    journal.close()
+    done = per_thread * threads
+    return {
+        'tasks': done,
+        'threads': threads,
+        'batch_size': batch_size,
+        'seconds': round(elapsed, 3),
+        'us_per_task': round(elapsed / done * 1e6, 1),
+        'tasks_per_sec': round(done / elapsed),
+        'rows_written': stats['written'],
+        'commits': stats['commits'],
+    }
+
+def bench_replay(path):
+    journal = TaskJournal(path)
+    started = time.perf_counter()
+    pending = journal.replay()
+    elapsed = time.perf_counter() - started
+    tasks = len(journal.records)
+    journal.close()
+    return {'tasks': tasks, 'pending': len(pending), 'ms': round(elapsed * 1000, 2)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='journal-bench-')
+    try:
+        results = {}
+        for name, threads, batch_size in [
+            ('commit_per_event_sequential', 1, 1),
+            ('group_commit_sequential', 1, 500),
+            ('commit_per_event_concurrent', args.threads, 1),
+            ('group_commit_concurrent', args.threads, 500),
+        ]:
+            results[name] = bench(os.path.join(workdir, f'{name}.db'), args.tasks, args.lines,
+                                  threads, batch_size)
+        results['replay'] = bench_replay(os.path.join(workdir, 'group_commit_concurrent.db'))
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_restful import Api
 from config.default import Config
+from .utils.admission import AdmissionController
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -8,6 +9,7 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     api = Api(app)
+    app.extensions['admission'] = AdmissionController.from_config(app.config)
     
     # Register blueprints
     from .routes import terminal_bp, emulator_bp, proxy_bp
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 import subprocess
 from ..utils.logger import setup_logger
 
@@ -30,6 +30,12 @@ def execute_adb():
     
     if not command:
         return jsonify({'error': 'No command provided'}), 400
+    
+    # Queue briefly for a slot, then tell the client to back off
+    admission = current_app.extensions['admission']
+    if not admission.acquire():
+        retry_after = admission.retry_after()
+        return jsonify({'error': 'Host saturated', 'retry_after': retry_after}), 503, {'Retry-After': str(retry_after)}
         
     try:
         cmd = ['adb']
@@ -45,4 +51,6 @@ def execute_adb():
         })
     except Exception as e:
         logger.error(f'Error executing ADB command: {str(e)}')
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+    finally:
+        admission.release() 
\ No newline at end of file
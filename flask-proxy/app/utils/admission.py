@@ -0,0 +1,132 @@
+import os
+import socket
+import threading
+import time
+
+import psutil
+
+from .logger import setup_logger
+
+logger = setup_logger('admission')
+
+class AdmissionController:
+    """Limit concurrent adb commands by host load (AIMD).
+
+    A background thread samples CPU, memory, load average and adb server
+    latency every `interval` seconds. While any of them is over its threshold
+    the limit is multiplied by `decrease`, otherwise it grows by one up to
+    `max_limit`. Requests wait up to `queue_timeout` for a slot, then are
+    rejected with a Retry-After. The limit applies per worker process.
+
+    The AIMD rule, including the decrease cooldown, is the one of
+    proxy/utils/admission.py; the services are deployed separately and share
+    no package, so changes to the rule go to both.
+    """
+
+    def __init__(self, min_limit=2, max_limit=16, cpu_high=85, memory_high=90, load_high=1.5,
+                 adb_latency_high=0.5, adb_port=5037, decrease=0.7, cooldown=5, interval=1,
+                 queue_timeout=2):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.thresholds = {'cpu': cpu_high, 'memory': memory_high, 'load': load_high,
+                           'adb_latency': adb_latency_high}
+        self.adb_port = adb_port
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.last_decrease = float('-inf')
+        self.interval = interval
+        self.queue_timeout = queue_timeout
+        self.cpu_count = os.cpu_count() or 1
+        self.limit = max_limit
+        self.active = 0
+        self.last_sample = {}
+        self.condition = threading.Condition()
+        psutil.cpu_percent(interval=None)  # first call only sets the baseline
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_limit=config['ADMISSION_MIN_CONCURRENCY'],
+            max_limit=config['ADMISSION_MAX_CONCURRENCY'],
+            cpu_high=config['ADMISSION_CPU_HIGH'],
+            memory_high=config['ADMISSION_MEMORY_HIGH'],
+            load_high=config['ADMISSION_LOAD_HIGH'],
+            adb_latency_high=config['ADMISSION_ADB_LATENCY_HIGH'],
+            adb_port=config['ADB_SERVER_PORT'],
+            decrease=config['ADMISSION_DECREASE_FACTOR'],
+            cooldown=config['ADMISSION_DECREASE_COOLDOWN'],
+            interval=config['ADMISSION_SAMPLE_INTERVAL'],
+            queue_timeout=config['ADMISSION_QUEUE_TIMEOUT']
+        )
+
+    def _adb_latency(self):
+        started = time.monotonic()
+        try:
+            with socket.create_connection(('127.0.0.1', self.adb_port), timeout=2) as conn:
+                conn.sendall(b'000chost:version')
+                if conn.recv(4) != b'OKAY':
+                    return None
+        except socket.timeout:
+            return 2.0
+        except OSError:
+            return None  # adb server not started yet
+        return time.monotonic() - started
+
+    def sample(self):
+        sample = {
+            'cpu': psutil.cpu_percent(interval=None),
+            'memory': psutil.virtual_memory().percent,
+            'load': os.getloadavg()[0] / self.cpu_count if hasattr(os, 'getloadavg') else None,
+            'adb_latency': self._adb_latency()
+        }
+        over = [name for name, high in self.thresholds.items()
+                if sample[name] is not None and sample[name] >= high]
+        with self.condition:
+            self.last_sample = sample
+            limit = self.limit
+            if over:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    # Once per cooldown, so a sustained spike sees each decrease take effect
+                    self.last_decrease = now
+                    limit = max(self.min_limit, int(self.limit * self.decrease))
+            else:
+                limit = min(self.max_limit, self.limit + 1)
+            if limit != self.limit:
+                logger.info(f'Concurrency limit {self.limit} -> {limit}', extra={'saturated': over})
+                self.limit = limit
+                self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f'Error sampling host load: {str(e)}')
+
+    def acquire(self):
+        """Wait for a slot; False if none freed up within queue_timeout"""
+        deadline = time.monotonic() + self.queue_timeout
+        with self.condition:
+            while self.active >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def retry_after(self):
+        return max(1, int(self.interval * 2))
+
+    def stats(self):
+        with self.condition:
+            return {'limit': self.limit, 'active': self.active, 'sample': self.last_sample}
@@ -26,6 +26,19 @@ class Config:
     MAX_BACKGROUND_PROCESSES = 50
     PROCESS_CLEANUP_INTERVAL = 300
     
+    # Admission control (concurrent adb commands per worker, AIMD by host load)
+    ADB_SERVER_PORT = int(os.getenv('ANDROID_ADB_SERVER_PORT', '5037'))
+    ADMISSION_MIN_CONCURRENCY = 2
+    ADMISSION_MAX_CONCURRENCY = 16
+    ADMISSION_CPU_HIGH = 85  # percent
+    ADMISSION_MEMORY_HIGH = 90  # percent
+    ADMISSION_LOAD_HIGH = 1.5  # 1-minute load average per CPU
+    ADMISSION_ADB_LATENCY_HIGH = 0.5  # seconds
+    ADMISSION_DECREASE_FACTOR = 0.7  # AIMD tuning kept in step with proxy/config/settings.py
+    ADMISSION_DECREASE_COOLDOWN = 5  # seconds between two decreases
+    ADMISSION_SAMPLE_INTERVAL = 1  # seconds
+    ADMISSION_QUEUE_TIMEOUT = 2  # seconds a request waits for a slot before 503
+    
     # Security
     ALLOWED_COMMANDS = [
         'devices', 'connect', 'disconnect', 'shell',
@@ -1,16 +1,35 @@
+import atexit
+
 from flask import Flask
-from flask_socketio import SocketIO
 
-def create_app():
+from app.models import db
+from app.persistence import message_writer
+from app.websocket.service import socketio, coalescer, task_replay
+
+def create_app(config_object='config.Config'):
     app = Flask(__name__)
-    app.config.from_object('config.Config')
+    app.config.from_object(config_object)
+
+    # Redis message queue cho phép nhiều worker/process cùng phát event tới mọi client
+    socketio.init_app(
+        app,
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'),
+        channel=app.config.get('SOCKETIO_CHANNEL', 'flask-socketio'),
+        async_mode=app.config.get('SOCKETIO_ASYNC_MODE')
+    )
+    coalescer.interval = app.config.get('SOCKETIO_COALESCE_INTERVAL', 0.1)
+    task_replay.init_app(app)
 
-    socketio = SocketIO(app)
+    db.init_app(app)
+    message_writer.init_app(app)
+    with app.app_context():
+        db.create_all()
+    atexit.register(message_writer.stop)
 
     from app.api import api as api_blueprint
     app.register_blueprint(api_blueprint)
 
-    from app.websocket import websocket as websocket_blueprint
+    from app.websocket import websocket_bp as websocket_blueprint
     app.register_blueprint(websocket_blueprint)
 
-    return app, socketio
\ No newline at end of file
+    return app, socketio
@@ -1,6 +1,7 @@
-from flask import Blueprint, jsonify
+from flask import current_app, jsonify, request
 
-api = Blueprint('api', __name__)
+from . import api
+from app.persistence import message_history, message_writer
 
 @api.route('/api/health', methods=['GET'])
 def health_check():
@@ -9,4 +10,24 @@ def health_check():
 @api.route('/api/data', methods=['GET'])
 def get_data():
     # Placeholder for data retrieval logic
-    return jsonify({"data": "sample data"}), 200
\ No newline at end of file
+    return jsonify({"data": "sample data"}), 200
+
+@api.route('/api/messages', methods=['GET'])
+def get_messages():
+    """Lịch sử message của user, phân trang bằng cursor"""
+    user_id = request.args.get('user_id', type=int)
+    if user_id is None:
+        return jsonify({"error": "user_id is required"}), 400
+    limit = max(1, min(
+        request.args.get('limit', current_app.config.get('HISTORY_PAGE_SIZE', 50), type=int),
+        current_app.config.get('HISTORY_MAX_PAGE_SIZE', 200)
+    ))
+    try:
+        messages, next_cursor = message_history(user_id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    return jsonify({"messages": messages, "next_cursor": next_cursor}), 200
+
+@api.route('/api/messages/stats', methods=['GET'])
+def get_message_stats():
+    return jsonify(message_writer.stats()), 200
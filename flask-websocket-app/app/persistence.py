@@ -0,0 +1,135 @@
+import base64
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.models import db, Message
+
+class MessageWriter:
+    """Ghi message theo kiểu write-behind.
+
+    Socket handler chỉ đưa message vào hàng đợi có giới hạn; một thread nền
+    gom tối đa `batch_size` message và ghi trong một transaction duy nhất.
+    Handler chạy trên hub eventlet nên enqueue() không bao giờ chờ: hàng đợi
+    đầy thì message bị bỏ và handler báo lỗi cho client.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=500, flush_interval=0.05):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.app = None
+        self.thread = None
+        self.running = False
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config.get('MESSAGE_QUEUE_SIZE', self.queue.maxsize))
+        self.batch_size = app.config.get('MESSAGE_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('MESSAGE_FLUSH_INTERVAL', self.flush_interval)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self.thread.start()
+
+    def enqueue(self, user_id, content, timestamp=None):
+        """Đưa message vào hàng đợi; trả về False (bỏ message) nếu hàng đợi đầy"""
+        row = {
+            'user_id': user_id,
+            'content': str(content)[:500],
+            # Lấy thời điểm nhận, không phải thời điểm flush
+            'timestamp': timestamp or datetime.utcnow(),
+        }
+        try:
+            # put() chờ sẽ chặn cả hub eventlet, mọi socket đứng theo
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.start()
+        return True
+
+    def _take_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _write(self, rows):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(Message.__table__.insert(), rows)
+            self.written += len(rows)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            self.app.logger.error(f'Error writing {len(rows)} messages: {e}')
+        finally:
+            for _ in rows:
+                self.queue.task_done()
+
+    def flush(self, timeout=5):
+        """Đợi hàng đợi được ghi hết (dùng khi shutdown và trong benchmark)"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(self.flush_interval)
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+def encode_cursor(message):
+    raw = f'{message.timestamp.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(message_id)
+
+def message_history(user_id, limit=50, cursor=None):
+    """Lịch sử message mới nhất trước, phân trang bằng cursor (timestamp, id)"""
+    query = Message.query.filter(Message.user_id == user_id)
+    if cursor:
+        timestamp, message_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Message.timestamp < timestamp,
+            db.and_(Message.timestamp == timestamp, Message.id < message_id)
+        ))
+    rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [row.to_dict() for row in rows[:limit]], next_cursor
+
+message_writer = MessageWriter()
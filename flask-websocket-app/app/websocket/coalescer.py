@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+class EventCoalescer:
+    """Gộp các event tần suất cao trước khi phát tới client.
+
+    Event có `key` chỉ giữ bản mới nhất cho mỗi (event, room, key) và được
+    phát theo chu kỳ `interval`; event không có key được phát ngay.
+    """
+
+    def __init__(self, socketio, interval=0.1):
+        self.socketio = socketio
+        self.interval = interval
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.task = None
+        self.published = 0
+        self.emitted = 0
+
+    def publish(self, event, data, room=None, key=None, namespace=None):
+        self.published += 1
+        if key is None or not self.interval:
+            self._emit(event, data, room, namespace)
+            return
+        with self.lock:
+            self.pending[(event, room, key, namespace)] = data
+            self.pending.move_to_end((event, room, key, namespace))
+            if self.task is None:
+                self.task = self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            if not self.flush():
+                with self.lock:
+                    # Không còn event chờ: dừng vòng lặp, publish sau sẽ khởi động lại
+                    if not self.pending:
+                        self.task = None
+                        return
+
+    def flush(self):
+        """Phát tất cả event đang chờ, trả về số event đã phát"""
+        with self.lock:
+            pending, self.pending = self.pending, OrderedDict()
+        for (event, room, _, namespace), data in pending.items():
+            self._emit(event, data, room, namespace)
+        return len(pending)
+
+    def _emit(self, event, data, room, namespace):
+        self.emitted += 1
+        self.socketio.emit(event, data, to=room, namespace=namespace)
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "emitted": self.emitted,
+            "pending": len(self.pending),
+        }
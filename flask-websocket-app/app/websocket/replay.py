@@ -0,0 +1,28 @@
+import json
+
+class TaskReplay:
+    """Replay buffer output của task do ADB proxy ghi vào Redis.
+
+    Proxy giữ N batch gần nhất của mỗi task trong list `<prefix><task_id>`;
+    client subscribe muộn nhận lại các batch này trước output live.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.prefix = 'task_output:'
+
+    def init_app(self, app):
+        url = app.config.get('TASK_REPLAY_REDIS_URL')
+        self.prefix = app.config.get('TASK_REPLAY_KEY_PREFIX', self.prefix)
+        if url:
+            import redis
+            self.client = redis.Redis.from_url(url)
+
+    def get(self, task_id):
+        if self.client is None:
+            return []
+        try:
+            return [json.loads(item) for item in self.client.lrange(f'{self.prefix}{task_id}', 0, -1)]
+        except Exception as e:
+            print(f'Error reading replay for task {task_id}: {e}')
+            return []
@@ -1,6 +1,56 @@
-from flask_socketio import SocketIO, emit
+from flask import request
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+from app.persistence import message_writer
+from .coalescer import EventCoalescer
+from .replay import TaskReplay
 
 socketio = SocketIO()
+coalescer = EventCoalescer(socketio)
+task_replay = TaskReplay()
+
+# Client chỉ nhận event của các room đã subscribe: device:<serial>, task:<task_id>
+ROOM_KINDS = ('device', 'task')
+
+def room_name(kind, key):
+    return f"{kind}:{key}"
+
+def rooms_from(data):
+    """Lấy danh sách room từ payload {'device': ..., 'task': ..., 'rooms': [...]}
+
+    ValueError nếu device/task không phải chuỗi hoặc số, hay `rooms` không
+    phải list các chuỗi (một chuỗi sẽ bị duyệt thành room một ký tự).
+    """
+    if not isinstance(data, dict):
+        return []
+    rooms = []
+    for kind in ROOM_KINDS:
+        if data.get(kind):
+            if isinstance(data[kind], bool) or not isinstance(data[kind], (str, int)):
+                raise ValueError(f"'{kind}' must be a string")
+            rooms.append(room_name(kind, data[kind]))
+    requested = data.get('rooms') or []
+    if not isinstance(requested, list) or not all(isinstance(room, str) for room in requested):
+        raise ValueError("'rooms' must be a list of strings")
+    for room in requested:
+        if room.split(':', 1)[0] in ROOM_KINDS:
+            rooms.append(room)
+    return rooms
+
+def requested_rooms(data):
+    """rooms_from() cho socket handler; None (đã báo lỗi cho client) nếu payload sai"""
+    try:
+        return rooms_from(data)
+    except ValueError as e:
+        emit('error', {'message': f'Invalid rooms: {e}'}, to=request.sid)
+        return None
+
+def publish(event, data, device=None, task=None, key=None):
+    """Phát event tới room của device/task, gộp theo key nếu có"""
+    if device:
+        coalescer.publish(event, data, room=room_name('device', device), key=key)
+    if task:
+        coalescer.publish(event, data, room=room_name('task', task), key=key)
 
 @socketio.on('connect')
 def handle_connect():
@@ -10,7 +60,47 @@ def handle_connect():
 def handle_disconnect():
     print('Client disconnected')
 
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    rooms = requested_rooms(data)
+    if rooms is None:
+        return
+    for room in rooms:
+        join_room(room)
+    emit('subscribed', {'rooms': rooms})
+
+    # Gửi lại output gần nhất của task cho client subscribe muộn; client
+    # bỏ qua batch trùng với output live dựa trên `seq`
+    for room in rooms:
+        kind, key = room.split(':', 1)
+        if kind == 'task':
+            for batch in task_replay.get(key):
+                emit('task_output', dict(batch, replay=True))
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    rooms = requested_rooms(data)
+    if rooms is None:
+        return
+    for room in rooms:
+        leave_room(room)
+    emit('unsubscribed', {'rooms': rooms})
+
 @socketio.on('message')
 def handle_message(data):
-    print('Received message: ' + data)
-    emit('response', {'message': 'Message received: ' + data}, broadcast=True)
\ No newline at end of file
+    # Lưu write-behind, không chờ ghi DB trong handler
+    if isinstance(data, dict) and data.get('user_id') and data.get('message'):
+        if not message_writer.enqueue(data['user_id'], data['message']):
+            emit('error', {'message': 'Server busy, message not stored'}, to=request.sid)
+
+    rooms = requested_rooms(data)
+    if rooms is None:
+        return
+    if not rooms:
+        # Không chỉ định room: chỉ phản hồi cho client gửi
+        emit('response', {'message': f'Message received: {data}'}, to=request.sid)
+        return
+    message = data.get('message')
+    for room in rooms:
+        coalescer.publish('response', {'room': room, 'message': message},
+                          room=room, key=data.get('key'))
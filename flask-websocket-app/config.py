@@ -3,5 +3,15 @@ class Config:
     TESTING = False
     SECRET_KEY = 'your_secret_key'
     SOCKETIO_MESSAGE_QUEUE = 'redis://localhost:6379/0'
+    SOCKETIO_CHANNEL = 'flask-socketio'
+    SOCKETIO_ASYNC_MODE = 'eventlet'
+    SOCKETIO_COALESCE_INTERVAL = 0.1  # seconds
+    TASK_REPLAY_REDIS_URL = 'redis://localhost:6379/0'
+    TASK_REPLAY_KEY_PREFIX = 'task_output:'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    MESSAGE_QUEUE_SIZE = 10000
+    MESSAGE_BATCH_SIZE = 500
+    MESSAGE_FLUSH_INTERVAL = 0.05  # seconds
+    HISTORY_PAGE_SIZE = 50
+    HISTORY_MAX_PAGE_SIZE = 200
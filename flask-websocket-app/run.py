@@ -1,15 +1,6 @@
-from flask import Flask
-from flask_socketio import SocketIO
-from app.api.routes import register_routes
-from app.websocket.service import register_websocket
+from app import create_app
 
-app = Flask(__name__)
-app.config.from_object('config')
-
-socketio = SocketIO(app)
-
-register_routes(app)
-register_websocket(socketio)
+app, socketio = create_app()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True)
\ No newline at end of file
+    socketio.run(app, debug=True)
@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from app.api import api
+from app.models import db, Message, User
+from app.persistence import decode_cursor, encode_cursor, message_history
+
+class MessageHistoryTest(unittest.TestCase):
+    """Phân trang cursor trên SQLite in-memory, không cần Redis/eventlet"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['HISTORY_MAX_PAGE_SIZE'] = 3
+        db.init_app(self.app)
+        self.app.register_blueprint(api)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        db.session.add_all([User(id=1, username='a', email='a@x'), User(id=2, username='b', email='b@x')])
+        start = datetime(2024, 1, 1, 12, 0, 0, 123456)
+        # Hai message cùng timestamp: thứ tự phụ thuộc id
+        for n, offset in enumerate([0, 1, 2, 2, 3]):
+            db.session.add(Message(id=n + 1, user_id=1, content=f'm{n + 1}',
+                                   timestamp=start + timedelta(seconds=offset)))
+        db.session.add(Message(id=10, user_id=2, content='other', timestamp=start))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_pages_newest_first_without_gaps_or_duplicates(self):
+        pages = []
+        cursor = None
+        while True:
+            messages, cursor = message_history(1, limit=2, cursor=cursor)
+            pages.append([message['content'] for message in messages])
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, [['m5', 'm4'], ['m3', 'm2'], ['m1']])
+
+    def test_last_full_page_has_no_cursor(self):
+        messages, cursor = message_history(1, limit=5)
+        self.assertEqual(len(messages), 5)
+        self.assertIsNone(cursor)
+
+    def test_cursor_round_trip(self):
+        message = db.session.get(Message, 3)
+        self.assertEqual(decode_cursor(encode_cursor(message)), (message.timestamp, 3))
+
+    def test_api_pages_and_rejects_bad_cursors(self):
+        client = self.app.test_client()
+        response = client.get('/api/messages?user_id=1&limit=100')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual([message['id'] for message in body['messages']], [5, 4, 3])
+
+        response = client.get(f"/api/messages?user_id=1&cursor={body['next_cursor']}")
+        self.assertEqual([message['id'] for message in response.get_json()['messages']], [2, 1])
+
+        # 'Zm9v' là base64 của 'foo', thiếu phần id
+        for cursor in ('not-base64!', 'Zm9v'):
+            response = client.get(f'/api/messages?user_id=1&cursor={cursor}')
+            self.assertEqual(response.status_code, 400, cursor)
+        self.assertEqual(client.get('/api/messages').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
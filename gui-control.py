@@ -4,24 +4,20 @@ import os
 import logging
 import time
 import socket
-from pyvirtualdisplay import Display
+import threading
+import queue
+import re
+import signal
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import SimpleNamespace
 
-# Khởi tạo virtual display trước khi import pyautogui
-display = Display(visible=0, size=(1920, 1080))
-display.start()
-os.environ['DISPLAY'] = display.new_display_var
-
-# Sau khi set DISPLAY mới import các module GUI
-import pyautogui
-from appium import webdriver
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-
-# Cấu hình cho headless environment
-pyautogui.FAILSAFE = False  # Tắt failsafe vì đang chạy headless
+# Các module GUI/Appium nặng chỉ được import khi action cần tới (xem load_pyautogui,
+# load_webdriver), để lệnh CLI một lần và việc khởi động service không phải trả giá này
 
 # Cấu hình logging
+os.makedirs('logs', exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -32,6 +28,113 @@ logging.basicConfig(
 )
 logger = logging.getLogger('gui-control')
 
+# Cấu hình Appium session pool
+APPIUM_SERVER_URL = os.getenv('APPIUM_SERVER_URL', 'http://localhost:4723/wd/hub')
+APPIUM_DEFAULT_CAPS = {
+    "platformName": "Android",
+    "deviceName": "Android Emulator",
+    "appPackage": "com.example.android",
+    "appActivity": ".MainActivity",
+    "automationName": "UiAutomator2",
+    "noReset": True
+}
+APPIUM_SESSION_IDLE_TIMEOUT = int(os.getenv('APPIUM_SESSION_IDLE_TIMEOUT', '600'))  # seconds
+APPIUM_HEALTH_CHECK_INTERVAL = int(os.getenv('APPIUM_HEALTH_CHECK_INTERVAL', '30'))  # seconds
+APPIUM_WARM_DEVICES = [d for d in os.getenv('APPIUM_WARM_DEVICES', '').split(',') if d.strip()]
+APPIUM_FIND_TIMEOUT = 10  # seconds
+LOCATOR_CACHE_SIZE = 256
+
+GUI_CONTROL_HOST = os.getenv('GUI_CONTROL_HOST', '127.0.0.1')
+GUI_CONTROL_PORT = int(os.getenv('GUI_CONTROL_PORT', '5000'))
+GUI_CONTROL_CLIENT_TIMEOUT = 60  # seconds
+GUI_CONTROL_MAX_HEADER = 64 * 1024  # bytes
+GUI_CONTROL_MAX_BODY = 16 * 1024 * 1024  # bytes
+DISPLAY_SIZE = (1920, 1080)
+# Số display ảo cho thao tác GUI song song; 1 = dùng DISPLAY hiện tại trong process
+GUI_DISPLAY_COUNT = int(os.getenv('GUI_DISPLAY_COUNT', '1'))
+GUI_DISPLAY_BASE = int(os.getenv('GUI_DISPLAY_BASE', '100'))  # display :100, :101, ...
+DISPLAY_START_TIMEOUT = 10  # seconds
+# Một thao tác GUI treo quá lâu thì worker của display bị khởi động lại
+GUI_ACTION_TIMEOUT = int(os.getenv('GUI_ACTION_TIMEOUT', '45'))  # seconds
+
+# Map tên locator trong params sang strategy của WebDriver
+# (giá trị chuỗi của By.ID, By.XPATH, AppiumBy.ACCESSIBILITY_ID, By.CLASS_NAME)
+LOCATOR_STRATEGIES = {
+    'id': 'id',
+    'element_id': 'id',
+    'xpath': 'xpath',
+    'accessibility_id': 'accessibility id',
+    'class_name': 'class name',
+}
+
+_display_lock = threading.Lock()
+virtual_display = None
+_pyautogui = None
+_webdriver = None
+
+def display_available(display_var):
+    """DISPLAY đã trỏ tới một X server đang chạy (vd. Xvfb :99 do startup.py khởi động)"""
+    if not display_var:
+        return False
+    host, _, number = display_var.rpartition(':')
+    number = number.split('.')[0]
+    if host not in ('', 'unix'):
+        # Display qua TCP, không kiểm tra được bằng socket file
+        return True
+    return os.path.exists(f'/tmp/.X11-unix/X{number}')
+
+def ensure_display():
+    """Dùng lại DISPLAY có sẵn, chỉ tự khởi động Xvfb khi chưa có X server"""
+    global virtual_display
+    with _display_lock:
+        if virtual_display is not None or display_available(os.environ.get('DISPLAY')):
+            return os.environ['DISPLAY']
+        from pyvirtualdisplay import Display
+        virtual_display = Display(visible=0, size=DISPLAY_SIZE)
+        virtual_display.start()
+        os.environ['DISPLAY'] = virtual_display.new_display_var
+        logger.info(f"Started virtual display {os.environ['DISPLAY']}")
+        return os.environ['DISPLAY']
+
+def stop_display():
+    """Chỉ dừng Xvfb do chính process này khởi động"""
+    global virtual_display
+    with _display_lock:
+        if virtual_display is not None:
+            virtual_display.stop()
+            virtual_display = None
+
+def load_pyautogui():
+    """Import pyautogui sau khi đã có DISPLAY"""
+    global _pyautogui
+    if _pyautogui is None:
+        ensure_display()
+        import pyautogui
+        pyautogui.FAILSAFE = True
+        pyautogui.PAUSE = 0.5
+        _pyautogui = pyautogui
+    return _pyautogui
+
+def load_webdriver():
+    """Import Appium/Selenium khi action appium_* đầu tiên chạy"""
+    global _webdriver
+    if _webdriver is None:
+        from appium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import (
+            WebDriverException, StaleElementReferenceException, TimeoutException
+        )
+        _webdriver = SimpleNamespace(
+            webdriver=webdriver,
+            WebDriverWait=WebDriverWait,
+            EC=EC,
+            WebDriverException=WebDriverException,
+            StaleElementReferenceException=StaleElementReferenceException,
+            TimeoutException=TimeoutException,
+        )
+    return _webdriver
+
 def ensure_root_access():
     try:
         os.chmod('logs', 0o777)
@@ -58,84 +161,95 @@ def check_xvfb():
         logger.error(f"Error checking Xvfb: {str(e)}")
         return False
 
+def read_http_message(conn):
+    """Đọc một HTTP message: header tới dòng trống, rồi đúng Content-Length byte body.
+
+    Trả về (headers, body); (None, None) nếu bên kia đóng kết nối trước khi gửi gì.
+    ValueError nếu message sai định dạng hoặc quá lớn.
+    """
+    data = b''
+    while b'\r\n\r\n' not in data:
+        if len(data) > GUI_CONTROL_MAX_HEADER:
+            raise ValueError("Header too large")
+        chunk = conn.recv(65536)
+        if not chunk:
+            if not data:
+                return None, None
+            raise ValueError("Connection closed before end of headers")
+        data += chunk
+    head, _, body = data.partition(b'\r\n\r\n')
+
+    headers = {}
+    for line in head.decode('latin-1').split('\r\n')[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    content_length = int(headers.get('content-length', '0'))
+    if content_length < 0 or content_length > GUI_CONTROL_MAX_BODY:
+        raise ValueError(f"Invalid Content-Length: {content_length}")
+
+    chunks = [body]
+    received = len(body)
+    while received < content_length:
+        chunk = conn.recv(min(65536, content_length - received))
+        if not chunk:
+            raise ValueError("Connection closed before end of body")
+        chunks.append(chunk)
+        received += len(chunk)
+    return headers, b''.join(chunks)[:content_length]
+
+def http_response(status, payload):
+    body = json.dumps(payload).encode()
+    return (
+        f'HTTP/1.1 {status}\r\n'
+        'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        'Connection: close\r\n'
+        '\r\n'
+    ).encode() + body
+
 class GuiControlService:
-    def __init__(self, host='127.0.0.1', port=5000):
+    def __init__(self, host='127.0.0.1', port=5000, warm_devices=None, display_count=None):
         self.host = host
         self.port = port
-        self.controller = GuiController()
+        display_count = display_count if display_count is not None else GUI_DISPLAY_COUNT
+        # Nhiều display: mỗi display có Xvfb và worker process riêng
+        displays = DisplayPool(display_count) if display_count > 1 else None
+        self.controller = GuiController(displays=displays)
+        self.warm_devices = warm_devices if warm_devices is not None else APPIUM_WARM_DEVICES
         self.running = True
         logger.setLevel(logging.DEBUG)
 
     def start(self):
         """Khởi động service"""
         try:
+            # Làm nóng Appium session ở background để không chặn việc bind port
+            if self.warm_devices:
+                self.controller.sessions.warm_up(self.warm_devices)
+            self.controller.sessions.start_reaper()
+            if self.controller.displays:
+                self.controller.displays.start()
+
             logger.debug(f"Attempting to bind to {self.host}:{self.port}")
             server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server.bind((self.host, self.port))
-            server.listen(5)
+            server.listen(128)
             logger.info(f"GUI Control service listening on {self.host}:{self.port}")
 
             while self.running:
                 try:
                     client, addr = server.accept()
                     logger.debug(f"Accepted connection from {addr}")
-                    data = client.recv(4096).decode()
-                    if data:
-                        try:
-                            # Parse HTTP request
-                            request_lines = data.split('\n')
-                            content_length = 0
-                            body = ""
-                            
-                            # Get content length
-                            for line in request_lines:
-                                if line.lower().startswith('content-length:'):
-                                    content_length = int(line.split(':')[1].strip())
-                                    break
-                            
-                            # Get request body
-                            for i, line in enumerate(request_lines):
-                                if not line.strip():
-                                    body = '\n'.join(request_lines[i+1:])
-                                    break
-                            
-                            # Parse JSON from body
-                            command = json.loads(body)
-                            logger.debug(f"Received command: {command}")
-                            result = self.controller.execute_action(
-                                command['action'],
-                                command.get('params', {})
-                            )
-                            
-                            # Send HTTP response
-                            response = json.dumps(result)
-                            http_response = (
-                                'HTTP/1.1 200 OK\r\n'
-                                'Content-Type: application/json\r\n'
-                                f'Content-Length: {len(response)}\r\n'
-                                '\r\n'
-                                f'{response}'
-                            )
-                            client.send(http_response.encode())
-                            
-                        except json.JSONDecodeError as e:
-                            logger.error(f"JSON decode error: {e}")
-                            error_response = json.dumps({
-                                "status": "error",
-                                "error": "Invalid JSON"
-                            })
-                            http_response = (
-                                'HTTP/1.1 400 Bad Request\r\n'
-                                'Content-Type: application/json\r\n'
-                                f'Content-Length: {len(error_response)}\r\n'
-                                '\r\n'
-                                f'{error_response}'
-                            )
-                            client.send(http_response.encode())
-                    client.close()
+                    # Mỗi request chạy trên thread riêng để nhiều device được điều khiển song song
+                    thread = threading.Thread(
+                        target=self.handle_client,
+                        args=(client, addr),
+                        daemon=True
+                    )
+                    thread.start()
                 except Exception as e:
-                    logger.error(f"Error handling client: {e}")
+                    logger.error(f"Error accepting client: {e}")
 
         except Exception as e:
             logger.error(f"Service error: {e}")
@@ -143,31 +257,610 @@ class GuiControlService:
         finally:
             self.cleanup()
 
+    def handle_client(self, client, addr):
+        """Xử lý một HTTP request từ client"""
+        try:
+            client.settimeout(GUI_CONTROL_CLIENT_TIMEOUT)
+            try:
+                _, body = read_http_message(client)
+                if body is None:
+                    return
+                # Parse JSON from body
+                command = json.loads(body.decode())
+                action = command['action']
+            except (ValueError, KeyError, TypeError) as e:
+                # JSONDecodeError và UnicodeDecodeError đều là ValueError
+                logger.error(f"Invalid request from {addr}: {e}")
+                client.sendall(http_response('400 Bad Request', {
+                    "status": "error",
+                    "error": f"Invalid request: {e}"
+                }))
+                return
+
+            logger.debug(f"Received command: {command}")
+            result = self.controller.execute_action(action, command.get('params', {}))
+            client.sendall(http_response('200 OK', result))
+        except Exception as e:
+            logger.error(f"Error handling client {addr}: {e}")
+        finally:
+            client.close()
+
     def cleanup(self):
         """Dọn dẹp tài nguyên"""
         self.running = False
         self.controller.cleanup()
-        display.stop()
+        stop_display()
 
-class GuiController:
-    def __init__(self):
+def parse_locator(spec):
+    """Chuyển dict locator (vd. {'element_id': 'btn'}) thành (tên, (By, value))"""
+    for name, by in LOCATOR_STRATEGIES.items():
+        if spec.get(name):
+            return name, (by, spec[name])
+    raise ValueError(f"No supported locator in {spec}")
+
+class LocatorCache:
+    """Cache element đã resolve theo màn hình, phát hiện element stale khi dùng"""
+
+    def __init__(self, max_entries=LOCATOR_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.screen = None
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.screen = None
+
+    def set_screen(self, screen):
+        """Đổi màn hình thì bỏ toàn bộ element của màn hình cũ"""
+        if screen is not None and screen != self.screen:
+            self.entries.clear()
+            self.screen = screen
+
+    def _get(self, locator):
+        element = self.entries.get(locator)
+        if element is not None:
+            self.entries.move_to_end(locator)
+            self.hits += 1
+        return element
+
+    def _put(self, locator, element):
+        self.entries[locator] = element
+        self.entries.move_to_end(locator)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def find(self, driver, locator, timeout=APPIUM_FIND_TIMEOUT):
+        element = self._get(locator)
+        if element is None:
+            self.misses += 1
+            wd = load_webdriver()
+            element = wd.WebDriverWait(driver, timeout).until(wd.EC.presence_of_element_located(locator))
+            self._put(locator, element)
+        return element
+
+    def apply(self, driver, locator, op, timeout=APPIUM_FIND_TIMEOUT):
+        """Chạy op(element); nếu element đã stale thì resolve lại đúng một lần"""
+        element = self.find(driver, locator, timeout)
+        try:
+            return op(element)
+        except load_webdriver().StaleElementReferenceException:
+            self.entries.pop(locator, None)
+            return op(self.find(driver, locator, timeout))
+
+    def find_many(self, driver, locators, timeout=APPIUM_FIND_TIMEOUT):
+        """Resolve nhiều locator, các locator chưa xuất hiện dùng chung một lần chờ"""
+        found = {}
+        pending = []
+        for locator in locators:
+            element = self._get(locator)
+            if element is not None:
+                found[locator] = element
+            else:
+                pending.append(locator)
+        self.misses += len(pending)
+
+        def resolve(drv):
+            for locator in list(pending):
+                elements = drv.find_elements(*locator)
+                if elements:
+                    found[locator] = elements[0]
+                    self._put(locator, elements[0])
+                    pending.remove(locator)
+            return not pending
+
+        if pending and not resolve(driver):
+            wd = load_webdriver()
+            try:
+                wd.WebDriverWait(driver, timeout).until(resolve)
+            except wd.TimeoutException:
+                pass
+        return found
+
+    def stats(self):
+        return {"screen": self.screen, "entries": len(self.entries),
+                "hits": self.hits, "misses": self.misses}
+
+class PageSnapshot:
+    """Page source lấy một lần, truy vấn ID/XPath cục bộ trên cây XML"""
+
+    BOUNDS_RE = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+    def __init__(self, source):
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        self.root = ET.fromstring(source)
+        self.taken_at = time.time()
+        self._by_id = None
+
+    @classmethod
+    def capture(cls, driver):
+        return cls(driver.page_source)
+
+    def _id_index(self):
+        if self._by_id is None:
+            index = {}
+            for node in self.root.iter():
+                resource_id = node.get('resource-id')
+                if not resource_id:
+                    continue
+                index.setdefault(resource_id, []).append(node)
+                # "com.pkg:id/name" cũng tra được bằng "name"
+                if ':id/' in resource_id:
+                    index.setdefault(resource_id.split(':id/', 1)[1], []).append(node)
+            self._by_id = index
+        return self._by_id
+
+    def find(self, strategy, value):
+        if strategy in ('id', 'element_id'):
+            nodes = self._id_index().get(value, [])
+        elif strategy == 'xpath':
+            nodes = self._xpath(value)
+        elif strategy == 'accessibility_id':
+            nodes = [n for n in self.root.iter() if n.get('content-desc') == value]
+        elif strategy == 'text':
+            nodes = [n for n in self.root.iter() if n.get('text') == value]
+        elif strategy == 'class_name':
+            nodes = [n for n in self.root.iter() if n.get('class') == value or n.tag == value]
+        else:
+            raise ValueError(f"Unsupported locator strategy: {strategy}")
+        return [self.describe(node) for node in nodes]
+
+    def query(self, spec):
+        for strategy in list(LOCATOR_STRATEGIES) + ['text']:
+            if spec.get(strategy):
+                return self.find(strategy, spec[strategy])
+        raise ValueError(f"No supported locator in {spec}")
+
+    def _xpath(self, expression):
+        """ElementTree chỉ hỗ trợ một tập con XPath; đủ cho //tag[@attr='v'] và phép hợp |"""
+        nodes = []
+        for part in self._split_union(expression):
+            if part.startswith('//'):
+                part = '.' + part
+            elif part.startswith('/'):
+                head, _, rest = part[1:].partition('/')
+                if head not in (self.root.tag, '*'):
+                    continue
+                part = './' + rest if rest else '.'
+            nodes.extend(self.root.findall(part))
+        return nodes
+
+    @staticmethod
+    def _split_union(expression):
+        parts, current, quote = [], [], None
+        for char in expression:
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in ('"', "'"):
+                quote = char
+            elif char == '|':
+                parts.append(''.join(current).strip())
+                current = []
+                continue
+            current.append(char)
+        parts.append(''.join(current).strip())
+        return [p for p in parts if p]
+
+    def describe(self, node):
+        info = {
+            "id": node.get('resource-id'),
+            "text": node.get('text'),
+            "class": node.get('class') or node.tag,
+            "content_desc": node.get('content-desc'),
+            "clickable": node.get('clickable') == 'true',
+            "enabled": node.get('enabled') == 'true',
+        }
+        match = self.BOUNDS_RE.match(node.get('bounds') or '')
+        if match:
+            x1, y1, x2, y2 = map(int, match.groups())
+            info["bounds"] = [x1, y1, x2, y2]
+            info["center"] = [(x1 + x2) // 2, (y1 + y2) // 2]
+        return info
+
+class AppiumSession:
+    """Một Appium session gắn với một device, có lock riêng"""
+
+    def __init__(self, key, device, capabilities, pinned=False):
+        self.key = key
+        self.device = device
+        self.capabilities = capabilities
+        self.pinned = pinned
         self.driver = None
-        # Cấu hình pyautogui
-        pyautogui.FAILSAFE = True
-        pyautogui.PAUSE = 0.5
+        self.locators = LocatorCache()
+        self.lock = threading.RLock()
+        self.created_at = 0.0
+        self.last_used = 0.0
+        self.last_checked = 0.0
+
+    def connect(self):
+        """Tạo webdriver session mới"""
+        self.close()
+        self.driver = load_webdriver().webdriver.Remote(APPIUM_SERVER_URL, self.capabilities)
+        self.locators.clear()
+        self.created_at = self.last_used = self.last_checked = time.time()
+        logger.info(f"Appium session started for {self.device or 'default device'}")
 
-    def setup_appium(self):
+    def is_alive(self, max_age=APPIUM_HEALTH_CHECK_INTERVAL):
+        """Kiểm tra session còn sống, bỏ qua round trip nếu vừa kiểm tra gần đây"""
+        if not self.driver or not self.driver.session_id:
+            return False
+        if time.time() - self.last_checked < max_age:
+            return True
         try:
-            desired_caps = {
-                "platformName": "Android",
-                "deviceName": "Android Emulator",
-                "appPackage": "com.example.android",
-                "appActivity": ".MainActivity",
-                "automationName": "UiAutomator2",
-                "noReset": True
-            }
-            self.driver = webdriver.Remote('http://localhost:4723/wd/hub', desired_caps)
-            logger.info("Appium session started successfully")
+            self.driver.get_window_size()
+            self.last_checked = time.time()
+            return True
+        except Exception as e:
+            logger.warning(f"Appium session for {self.device or 'default device'} is dead: {e}")
+            return False
+
+    def close(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+                logger.info(f"Appium session closed for {self.device or 'default device'}")
+            except Exception as e:
+                logger.error(f"Error closing Appium session: {str(e)}")
+            finally:
+                self.driver = None
+
+class AppiumSessionPool:
+    """Pool Appium session theo device serial/capabilities"""
+
+    def __init__(self, idle_timeout=APPIUM_SESSION_IDLE_TIMEOUT,
+                 health_interval=APPIUM_HEALTH_CHECK_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def build_capabilities(device=None, capabilities=None):
+        caps = dict(APPIUM_DEFAULT_CAPS)
+        if device:
+            caps["udid"] = device
+            caps["deviceName"] = device
+        if capabilities:
+            caps.update(capabilities)
+        return caps
+
+    @staticmethod
+    def session_key(device, caps):
+        return f"{device or 'default'}|{json.dumps(caps, sort_keys=True)}"
+
+    def _get_or_create(self, device, capabilities, pinned=False):
+        caps = self.build_capabilities(device, capabilities)
+        key = self.session_key(device, caps)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = AppiumSession(key, device, caps, pinned=pinned)
+                self.sessions[key] = session
+            elif pinned:
+                session.pinned = True
+            return session
+
+    @contextmanager
+    def acquire(self, device=None, capabilities=None):
+        """Lấy session cho device, giữ lock của session trong suốt thao tác"""
+        session = self._get_or_create(device, capabilities)
+        with session.lock:
+            if not session.is_alive(self.health_interval):
+                session.connect()
+            try:
+                yield session
+            finally:
+                session.last_used = time.time()
+
+    def run(self, device, func, capabilities=None):
+        """Chạy func(session), tạo lại session một lần nếu session đã chết.
+
+        Kết nối lại thất bại cũng tính là một lần thử: session bị bỏ khỏi pool
+        để lần sau không dùng lại session cũ.
+        """
+        pinned = False
+        for attempt in range(2):
+            session = self._get_or_create(device, capabilities, pinned=pinned)
+            pinned = session.pinned
+            with session.lock:
+                try:
+                    if not session.is_alive(self.health_interval):
+                        session.connect()
+                except Exception as e:
+                    self.discard(session)
+                    if attempt:
+                        raise
+                    logger.warning(f"Retrying Appium connect for {device or 'default device'}: {e}")
+                    continue
+                try:
+                    return func(session)
+                except load_webdriver().WebDriverException as e:
+                    if attempt or self._session_alive(session.driver):
+                        raise
+                    logger.warning(f"Recreating Appium session for {device or 'default device'}: {e}")
+                    self.discard(session)
+                finally:
+                    session.last_used = time.time()
+
+    def discard(self, session):
+        """Đóng session và bỏ khỏi pool"""
+        with session.lock:
+            session.close()
+        with self.lock:
+            if self.sessions.get(session.key) is session:
+                del self.sessions[session.key]
+
+    def _session_alive(self, driver):
+        try:
+            driver.get_window_size()
+            return True
+        except Exception:
+            return False
+
+    def invalidate(self, device=None, capabilities=None):
+        """Đánh dấu session hỏng, lần acquire tiếp theo sẽ tạo lại"""
+        session = self._get_or_create(device, capabilities)
+        with session.lock:
+            session.close()
+
+    def warm_up(self, devices, capabilities=None):
+        """Tạo sẵn session cho các device ở background"""
+        def warm(device):
+            session = self._get_or_create(device, capabilities, pinned=True)
+            with session.lock:
+                try:
+                    if not session.is_alive(self.health_interval):
+                        session.connect()
+                except Exception as e:
+                    logger.error(f"Error warming Appium session for {device}: {e}")
+
+        threads = [threading.Thread(target=warm, args=(d,), daemon=True) for d in devices]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def start_reaper(self):
+        """Thread nền: đóng session idle, giữ session đã làm nóng luôn sống"""
+        if self._reaper:
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.evict_idle()
+
+    def evict_idle(self):
+        now = time.time()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            # Bỏ qua session đang được dùng
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                if session.pinned:
+                    if not session.is_alive(self.health_interval):
+                        try:
+                            session.connect()
+                        except Exception as e:
+                            logger.error(f"Error recreating Appium session for {session.device}: {e}")
+                elif session.driver and now - session.last_used > self.idle_timeout:
+                    logger.info(f"Evicting idle Appium session for {session.device or 'default device'}")
+                    session.close()
+                    with self.lock:
+                        self.sessions.pop(session.key, None)
+            finally:
+                session.lock.release()
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return [{
+                "device": s.device,
+                "connected": s.driver is not None,
+                "pinned": s.pinned,
+                "locators": s.locators.stats(),
+                "idle": round(now - s.last_used, 1) if s.last_used else None
+            } for s in self.sessions.values()]
+
+    def close_all(self):
+        self._stop.set()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            with session.lock:
+                session.close()
+
+class DisplaySlot:
+    """Một Xvfb riêng và một worker process chạy pyautogui trên display đó.
+
+    Worker nhận request JSON theo dòng qua stdin và trả kết quả qua stdout;
+    mỗi display chỉ chạy một thao tác tại một thời điểm.
+    """
+
+    def __init__(self, number):
+        self.number = number
+        self.display = f':{number}'
+        self.xvfb = None
+        self.worker = None
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.keys = set()
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+
+    def start(self):
+        import subprocess
+        self.stop()
+        if not display_available(self.display):
+            self.xvfb = subprocess.Popen(
+                ['Xvfb', self.display, '-screen', '0', f'{DISPLAY_SIZE[0]}x{DISPLAY_SIZE[1]}x24', '-nolisten', 'tcp'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            deadline = time.time() + DISPLAY_START_TIMEOUT
+            while not display_available(self.display):
+                if self.xvfb.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"Xvfb {self.display} failed to start")
+                time.sleep(0.05)
+        env = dict(os.environ, DISPLAY=self.display)
+        self.worker = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'display-worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1, env=env
+        )
+        # Đọc stdout ở thread riêng để execute() chờ kết quả có timeout
+        self.responses = queue.Queue()
+        threading.Thread(target=self._read_responses, args=(self.worker, self.responses), daemon=True).start()
+        self.started_at = time.time()
+        logger.info(f"Display worker started on {self.display} (pid {self.worker.pid})")
+
+    def execute(self, action, params):
+        with self.stats_lock:
+            self.waiting += 1
+        with self.lock:
+            with self.stats_lock:
+                self.waiting -= 1
+            started = time.time()
+            try:
+                if not self.worker or self.worker.poll() is not None:
+                    logger.warning(f"Display worker {self.display} is not running, restarting")
+                    self.start()
+                self.worker.stdin.write(json.dumps({'action': action, 'params': params}) + '\n')
+                self.worker.stdin.flush()
+                try:
+                    line = self.responses.get(timeout=GUI_ACTION_TIMEOUT)
+                except queue.Empty:
+                    logger.error(f"Display worker {self.display} timed out on {action}, restarting")
+                    self.start()
+                    raise RuntimeError(f"Action timed out after {GUI_ACTION_TIMEOUT}s on {self.display}")
+                if line is None:
+                    raise RuntimeError(f"Display worker {self.display} exited")
+                result = json.loads(line)
+            except Exception as e:
+                result = {"status": "error", "action": action, "error": str(e)}
+            self.requests += 1
+            if result.get('status') == 'error':
+                self.errors += 1
+            self.busy_seconds += time.time() - started
+        result['display'] = self.display
+        return result
+
+    @staticmethod
+    def _read_responses(worker, responses):
+        for line in worker.stdout:
+            responses.put(line)
+        responses.put(None)
+
+    def stop(self):
+        for process in (self.worker, self.xvfb):
+            if process and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except Exception:
+                    process.kill()
+        self.worker = self.xvfb = None
+
+    def stats(self):
+        uptime = max(time.time() - self.started_at, 1e-9)
+        return {
+            "display": self.display,
+            "alive": bool(self.worker and self.worker.poll() is None),
+            "keys": sorted(self.keys),
+            "requests": self.requests,
+            "errors": self.errors,
+            "waiting": self.waiting,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": round(min(self.busy_seconds / uptime, 1.0), 3),
+        }
+
+class DisplayPool:
+    """Pool display ảo; request được gán cố định vào một display theo key"""
+
+    def __init__(self, count, base=GUI_DISPLAY_BASE):
+        self.slots = [DisplaySlot(base + i) for i in range(count)]
+        self.assignments = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        for slot in self.slots:
+            try:
+                slot.start()
+            except Exception as e:
+                logger.error(f"Error starting display {slot.display}: {e}")
+
+    def route(self, params):
+        """display/session/device giữ nguyên display; không có key thì chọn display rảnh nhất"""
+        key = params.get('display') or params.get('session') or params.get('device')
+        with self.lock:
+            if key is None:
+                return min(self.slots, key=lambda slot: (slot.waiting + slot.lock.locked(), slot.requests))
+            slot = self.assignments.get(key)
+            if slot is None:
+                slot = min(self.slots, key=lambda slot: (len(slot.keys), slot.waiting))
+                self.assignments[key] = slot
+                slot.keys.add(key)
+            return slot
+
+    def execute(self, action, params):
+        return self.route(params).execute(action, params)
+
+    def release(self, key):
+        with self.lock:
+            slot = self.assignments.pop(key, None)
+            if slot:
+                slot.keys.discard(key)
+
+    def stats(self):
+        return [slot.stats() for slot in self.slots]
+
+    def close(self):
+        for slot in self.slots:
+            slot.stop()
+
+class GuiController:
+    # Action chạy ngay trong process service, không cần display
+    SERVICE_ACTIONS = ('gui_displays',)
+
+    def __init__(self, displays=None):
+        self.sessions = AppiumSessionPool()
+        self.displays = displays
+        # pyautogui chỉ điều khiển một display, các thao tác GUI phải chạy tuần tự
+        self.gui_lock = threading.Lock()
+
+    def setup_appium(self, device=None, capabilities=None):
+        try:
+            with self.sessions.acquire(device, capabilities):
+                pass
             return True
         except Exception as e:
             logger.error(f"Error setting up Appium: {str(e)}")
@@ -175,7 +868,14 @@ class GuiController:
 
     def execute_action(self, action, params=None):
         try:
-            result = getattr(self, f"action_{action}")(params)
+            handler = getattr(self, f"action_{action}")
+            if action.startswith('appium_') or action in self.SERVICE_ACTIONS:
+                result = handler(params)
+            elif self.displays is not None:
+                return self.displays.execute(action, params)
+            else:
+                with self.gui_lock:
+                    result = handler(params)
             return {"status": "success", "action": action, **result}
         except Exception as e:
             logger.error(f"Error executing {action}: {str(e)}")
@@ -183,69 +883,199 @@ class GuiController:
 
     def action_click(self, params):
         x, y = params['x'], params['y']
-        pyautogui.click(x, y)
+        load_pyautogui().click(x, y)
         return {"x": x, "y": y}
 
     def action_type(self, params):
         text = params['text']
-        pyautogui.typewrite(text)
+        load_pyautogui().typewrite(text)
         return {"text": text}
 
     def action_screenshot(self, params):
         filename = params.get('filename', 'screenshot.png')
-        screenshot = pyautogui.screenshot()
+        screenshot = load_pyautogui().screenshot()
         screenshot.save(filename)
         return {"file": filename}
 
     def action_move(self, params):
         x, y = params['x'], params['y']
-        pyautogui.moveTo(x, y)
+        load_pyautogui().moveTo(x, y)
         return {"x": x, "y": y}
 
     def action_scroll(self, params):
         amount = params['amount']
-        pyautogui.scroll(amount)
+        load_pyautogui().scroll(amount)
         return {"amount": amount}
 
     def action_appium_click(self, params):
-        if not self.driver:
-            if not self.setup_appium():
-                return {"error": "Appium setup failed"}
-        
-        element_id = params['element_id']
-        wait = WebDriverWait(self.driver, 10)
-        element = wait.until(EC.presence_of_element_located((By.ID, element_id)))
-        element.click()
-        return {"element_id": element_id}
+        device = params.get('device')
+        name, locator = parse_locator(params)
 
-    def action_appium_type(self, params):
-        if not self.driver:
-            if not self.setup_appium():
-                return {"error": "Appium setup failed"}
+        def click(session):
+            session.locators.set_screen(params.get('screen'))
+            session.locators.apply(session.driver, locator, lambda element: element.click())
+
+        self.sessions.run(device, click, params.get('capabilities'))
+        return {name: locator[1], "device": device}
 
-        element_id = params['element_id']
+    def action_appium_type(self, params):
+        device = params.get('device')
+        name, locator = parse_locator(params)
         text = params['text']
-        wait = WebDriverWait(self.driver, 10)
-        element = wait.until(EC.presence_of_element_located((By.ID, element_id)))
-        element.send_keys(text)
-        return {"element_id": element_id, "text": text}
 
-    def action_appium_screenshot(self, params):
-        if not self.driver:
-            if not self.setup_appium():
-                return {"error": "Appium setup failed"}
+        def type_text(session):
+            session.locators.set_screen(params.get('screen'))
+            session.locators.apply(session.driver, locator, lambda element: element.send_keys(text))
+
+        self.sessions.run(device, type_text, params.get('capabilities'))
+        return {name: locator[1], "text": text, "device": device}
+
+    def action_appium_fill(self, params):
+        """Điền nhiều field: resolve tất cả locator trong một lượt rồi send_keys"""
+        device = params.get('device')
+        fields = [(parse_locator(field)[1], field['text']) for field in params['fields']]
+
+        def fill(session):
+            cache = session.locators
+            cache.set_screen(params.get('screen'))
+            cache.find_many(session.driver, [locator for locator, _ in fields])
+            for locator, text in fields:
+                cache.apply(session.driver, locator, lambda element: element.send_keys(text))
+
+        self.sessions.run(device, fill, params.get('capabilities'))
+        return {"filled": len(fields), "device": device}
+
+    def action_appium_find(self, params):
+        """Tìm nhiều locator trong một request"""
+        device = params.get('device')
+        specs = params['locators']
+        locators = [parse_locator(spec)[1] for spec in specs]
+
+        def find(session):
+            session.locators.set_screen(params.get('screen'))
+            return session.locators.find_many(
+                session.driver, locators, params.get('timeout', APPIUM_FIND_TIMEOUT)
+            )
+
+        found = self.sessions.run(device, find, params.get('capabilities'))
+        return {
+            "found": [locator in found for locator in locators],
+            "device": device
+        }
+
+    def action_appium_query(self, params):
+        """Lấy page source một lần và truy vấn nhiều locator cục bộ"""
+        device = params.get('device')
+        snapshot = self.sessions.run(
+            device,
+            lambda session: PageSnapshot.capture(session.driver),
+            params.get('capabilities')
+        )
+        return {
+            "results": [snapshot.query(spec) for spec in params['queries']],
+            "device": device
+        }
 
+    def action_appium_screenshot(self, params):
+        device = params.get('device')
         filename = params.get('filename', 'appium_screenshot.png')
-        self.driver.get_screenshot_as_file(filename)
-        return {"file": filename}
+        self.sessions.run(
+            device,
+            lambda session: session.driver.get_screenshot_as_file(filename),
+            params.get('capabilities')
+        )
+        return {"file": filename, "device": device}
+
+    def action_appium_sessions(self, params):
+        return {"sessions": self.sessions.stats()}
+
+    def action_gui_displays(self, params):
+        """Thống kê sử dụng từng display"""
+        if self.displays is None:
+            return {"displays": [{"display": os.environ.get('DISPLAY'), "mode": "in-process"}]}
+        return {"displays": self.displays.stats()}
 
     def cleanup(self):
-        if self.driver:
-            try:
-                self.driver.quit()
-                logger.info("Appium session closed")
-            except Exception as e:
-                logger.error(f"Error closing Appium session: {str(e)}")
+        self.sessions.close_all()
+        if self.displays:
+            self.displays.close()
+
+def parse_service_args(args):
+    """Parse --port, --warm-devices và --displays cho chế độ service"""
+    options = {'port': 5000, 'warm_devices': None, 'displays': None}
+    i = 0
+    while i < len(args):
+        if args[i] == '--port' and i + 1 < len(args):
+            options['port'] = int(args[i + 1])
+            i += 1
+        elif args[i] == '--warm-devices' and i + 1 < len(args):
+            options['warm_devices'] = [d for d in args[i + 1].split(',') if d.strip()]
+            i += 1
+        elif args[i] == '--displays' and i + 1 < len(args):
+            options['displays'] = int(args[i + 1])
+            i += 1
+        i += 1
+    return options
+
+def run_display_worker():
+    """Nhận request JSON theo dòng từ stdin, thực hiện trên DISPLAY hiện tại"""
+    controller = GuiController()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            result = controller.execute_action(request['action'], request.get('params', {}))
+        except (ValueError, KeyError) as e:
+            result = {"status": "error", "error": f"Invalid request: {e}"}
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    controller.cleanup()
+
+def parse_cli_params(command, args):
+    """Chuyển tham số dòng lệnh của một action thành params"""
+    params = {}
+    if command == 'click' or command == 'move':
+        params = {'x': int(args[0]), 'y': int(args[1])}
+    elif command == 'type':
+        params = {'text': args[0]}
+    elif command == 'scroll':
+        params = {'amount': int(args[0])}
+    elif command == 'appium_click':
+        params = {'element_id': args[0]}
+        if len(args) > 1:
+            params['device'] = args[1]
+    elif command == 'appium_type':
+        params = {'element_id': args[0], 'text': args[1]}
+        if len(args) > 2:
+            params['device'] = args[2]
+    elif command == 'screenshot':
+        params = {}
+    elif command == 'appium_screenshot':
+        params = {'device': args[0]} if args else {}
+    return params
+
+def forward_to_service(action, params, host=GUI_CONTROL_HOST, port=GUI_CONTROL_PORT):
+    """Gửi action tới service đang chạy; trả về None nếu không có service"""
+    body = json.dumps({'action': action, 'params': params}).encode()
+    request = (
+        'POST / HTTP/1.1\r\n'
+        f'Host: {host}\r\n'
+        'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        '\r\n'
+    ).encode() + body
+    try:
+        conn = socket.create_connection((host, port), timeout=1)
+    except OSError:
+        return None
+    with conn:
+        conn.settimeout(GUI_CONTROL_CLIENT_TIMEOUT)
+        conn.sendall(request)
+        _, response = read_http_message(conn)
+    if response is None:
+        raise ValueError("Service closed the connection without a response")
+    return json.loads(response.decode())
 
 def main():
     if len(sys.argv) < 2:
@@ -256,26 +1086,42 @@ def main():
     
     if command == 'service':
         # Chạy như một service
-        service = GuiControlService()
+        ensure_root_access()
+        options = parse_service_args(sys.argv[2:])
+        service = GuiControlService(
+            port=options['port'],
+            warm_devices=options['warm_devices'],
+            display_count=options['displays']
+        )
+        # SIGTERM từ startup.py phải đi qua cleanup để dừng các Xvfb/worker của pool;
+        # chỉ đặt được ở main thread nên không nằm trong start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
         service.start()
+    elif command == 'display-worker':
+        # Worker của DisplayPool, DISPLAY đã được process cha đặt sẵn
+        run_display_worker()
     else:
-        # Chạy như command line tool
-        controller = GuiController()
+        # Chạy như command line tool: chuyển tới service nếu đang chạy,
+        # --local để luôn chạy trong process này
+        args = [arg for arg in sys.argv[2:] if arg != '--local']
         try:
-            params = {}
-            if command == 'click' or command == 'move':
-                params = {'x': int(sys.argv[2]), 'y': int(sys.argv[3])}
-            elif command == 'type':
-                params = {'text': sys.argv[2]}
-            elif command == 'scroll':
-                params = {'amount': int(sys.argv[2])}
-            elif command == 'appium_click':
-                params = {'element_id': sys.argv[2]}
-            elif command == 'appium_type':
-                params = {'element_id': sys.argv[2], 'text': sys.argv[3]}
-            elif command == 'screenshot' or command == 'appium_screenshot':
-                params = {}
+            params = parse_cli_params(command, args)
+        except (IndexError, ValueError) as e:
+            print(json.dumps({"status": "error", "error": f"Invalid arguments: {e}"}))
+            sys.exit(1)
+
+        if '--local' not in sys.argv:
+            try:
+                result = forward_to_service(command, params)
+            except (OSError, ValueError) as e:
+                result = {"status": "error", "action": command, "error": f"Service request failed: {e}"}
+            if result is not None:
+                print(json.dumps(result))
+                return
 
+        ensure_root_access()
+        controller = GuiController()
+        try:
             result = controller.execute_action(command, params)
             print(json.dumps(result))
 
@@ -283,7 +1129,7 @@ def main():
             print(json.dumps({"status": "error", "error": str(e)}))
         finally:
             controller.cleanup()
+            stop_display()
 
 if __name__ == "__main__":
-    ensure_root_access()
     main()
\ No newline at end of file
@@ -1,10 +1,12 @@
 import os
+import socket
 
 # API Configuration
-API_HOST = "https://doremonsieucap88.com"
-API_PORT = 3000
+API_HOST = os.getenv("API_HOST", "https://doremonsieucap88.com")
+API_PORT = int(os.getenv("API_PORT", "3000"))
 API_ENDPOINTS = {
     "terminal_execute": "/api/terminal/execute",
+    "terminal_ack": "/api/terminal/ack",
     "emulator_execute": "/api/emulator/execute-adb",
     "emulator_status": "/api/emulator/status",
     "emulator_logs": "/api/emulator/logs"
@@ -14,6 +16,10 @@ API_ENDPOINTS = {
 ADB_PATH = os.getenv("ADB_PATH", "/usr/bin/adb")
 DEFAULT_SERIAL = "127.0.0.1:6555"
 ADB_TIMEOUT = 60  # seconds
+BINARY_OUTPUT_DIR = os.getenv("BINARY_OUTPUT_DIR", os.path.join("data", "binary"))
+BINARY_BUFFER_SIZE = 1024 * 1024  # bytes read per readinto() of exec-out output
+BINARY_COMMANDS = ("exec-out screencap", "exec-out cat")  # run binary-safe unless the task says otherwise
+LOGCAT_BUFFER_RECORDS = 50000  # parsed logcat records kept per device
 
 # Logging Configuration
 LOG_DIR = "logs"
@@ -22,9 +28,9 @@ LOG_LEVEL = "DEBUG"
 LOG_FILE = "proxy.log"
 
 # Process Configuration
-MAX_CONCURRENT_TASKS = 10
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", "10"))  # scheduler workers
 TASK_TIMEOUT = 3600  # 1 hour
-POLL_INTERVAL = 1  # seconds
+POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "1"))  # seconds
 
 # Security Configuration
 SSL_VERIFY = True
@@ -34,10 +40,109 @@ SSL_KEY_PATH = "ssl/private.key"
 # Performance Configuration
 CHUNK_SIZE = 8192  # bytes
 MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
+RETRY_DELAY = 5  # seconds, base of the jittered retry backoff
+RETRY_MAX_DELAY = 60  # seconds
+RETRY_QUEUE_SIZE = 1000  # API writes kept for background retry
+
+# API Resilience
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3"))  # seconds
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "10"))  # seconds
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures that open an endpoint's circuit
+BREAKER_RECOVERY_TIMEOUT = 30  # seconds before a half-open probe
+
+# Result Spool (API writes kept on disk while the API is unreachable)
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join("data", "spool"))
+SPOOL_SEGMENT_SIZE = 1024 * 1024  # bytes
+SPOOL_MAX_BYTES = 256 * 1024 * 1024  # oldest segments are evicted beyond this
+SPOOL_MAX_AGE = 7 * 86400  # seconds
+SPOOL_REPLAY_RATE = 50  # requests per second once the API is back
+SPOOL_CHECK_INTERVAL = 10  # seconds between health checks while requests are spooled
+
+# Live Output Streaming (Socket.IO app via Redis message queue)
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "redis://localhost:6379/0")
+SOCKETIO_CHANNEL = "flask-socketio"
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+STREAM_MAX_BATCH_LINES = 500
+STREAM_REPLAY_BATCHES = 200  # batches kept per task for late joiners
+STREAM_REPLAY_TTL = 3600  # seconds
+STREAM_REPLAY_KEY_PREFIX = "task_output:"
+STREAM_FAILURE_THRESHOLD = 3  # consecutive publish errors before publishing pauses
+STREAM_BACKOFF_MAX = 60  # seconds, pause doubles from 1 second up to this
+
+# Metrics (Prometheus text format)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9105"))
+
+# Tracing (spans exported to a JSONL file or an OTLP/HTTP collector)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")  # "jsonl" or "otlp"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_FILE = os.path.join(LOG_DIR, "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+
+# Task Journal (SQLite WAL with group commit)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join("data", "task_journal.db"))
+JOURNAL_BATCH_SIZE = 500
+JOURNAL_FLUSH_INTERVAL = 0.01  # seconds
+JOURNAL_RETENTION = 86400  # seconds a reported task is remembered to drop re-deliveries
+JOURNAL_PRUNE_INTERVAL = 300  # seconds between pruning expired tasks while running
+
+# Task Intake Dedupe (LRU + TTL index of tasks already taken)
+DEDUPE_CAPACITY = 100000
+DEDUPE_TTL = 3600  # seconds a task id is remembered
+DEDUPE_CONTENT_TTL = 5  # seconds for tasks without an id, keyed on their content
+
+# Task Scheduling (priority classes carried in the task's "priority" field)
+PRIORITY_WEIGHTS = {"interactive": 16, "normal": 4, "bulk": 1}  # share of workers when all are queued
+PRIORITY_AGING = {"interactive": None, "normal": 10, "bulk": 60}  # seconds before a waiting task runs next
+INTERACTIVE_RESERVED_WORKERS = 1  # workers only interactive tasks may use
+
+# Admission Control (AIMD concurrency limit driven by host load)
+ADB_SERVER_PORT = int(os.getenv("ANDROID_ADB_SERVER_PORT", "5037"))
+ADMISSION_MIN_CONCURRENCY = 2
+ADMISSION_CPU_HIGH = 85  # percent
+ADMISSION_MEMORY_HIGH = 90  # percent
+ADMISSION_LOAD_HIGH = 1.5  # 1-minute load average per CPU
+ADMISSION_ADB_LATENCY_HIGH = 0.5  # seconds for the adb server to answer host:version
+ADMISSION_DECREASE_FACTOR = 0.7
+ADMISSION_DECREASE_COOLDOWN = 5  # seconds between two decreases, so one shows its effect first
+ADMISSION_SAMPLE_INTERVAL = 1  # seconds
+ADMISSION_MAX_QUEUE = 1000  # tasks left with the API once this many are waiting
+
+# Device Telemetry (one combined adb shell per device and interval)
+TELEMETRY_INTERVAL = 15  # seconds
+TELEMETRY_HISTORY = 5760  # samples kept per device (24 hours at 15 seconds)
+TELEMETRY_TIMEOUT = 10  # seconds
+
+# Multi-node Device Ownership (leases on serials, consistent hashing of network emulators)
+COORDINATION_BACKEND = os.getenv("COORDINATION_BACKEND", "none")  # "redis", "memory" or "none"
+COORDINATION_REDIS_URL = os.getenv("COORDINATION_REDIS_URL", "redis://localhost:6379/0")
+COORDINATION_KEY_PREFIX = "adbproxy:"
+NODE_ID = os.getenv("NODE_ID", socket.gethostname())  # set per proxy when several share a host
+LEASE_TTL = 15  # seconds
+LEASE_RENEW_INTERVAL = 5  # seconds
+HASH_RING_REPLICAS = 64  # virtual nodes per proxy
+
+# Task Transport ("http" polls the API, "redis" reads a stream through a consumer group)
+TASK_TRANSPORT = os.getenv("TASK_TRANSPORT", "http")
+TASK_STREAM_URL = os.getenv("TASK_STREAM_URL", "redis://localhost:6379/0")
+TASK_STREAM_KEY = "adbproxy:tasks"
+TASK_STREAM_GROUP = "adb-proxies"
+TASK_STREAM_BATCH = 100
+TASK_STREAM_CLAIM_IDLE = 60  # seconds a pending entry sits untouched before it is claimed
+TASK_STREAM_CLAIM_INTERVAL = 15  # seconds, also how often running entries are kept alive
+TASK_STREAM_MAX_DELIVERIES = 5  # then the entry moves to the dead-letter stream
+TASK_STREAM_MAXLEN = 100000  # approximate entries kept per stream
 
 # Feature Flags
 ENABLE_BACKGROUND_TASKS = True
 ENABLE_TASK_MONITORING = True
 ENABLE_AUTO_RECONNECT = True
-ENABLE_ERROR_REPORTING = True 
\ No newline at end of file
+ENABLE_ERROR_REPORTING = True
+ENABLE_OUTPUT_STREAMING = os.getenv("ENABLE_OUTPUT_STREAMING", "0") == "1"  # needs Redis
+ENABLE_METRICS = True
+ENABLE_TRACING = True
+ENABLE_TASK_JOURNAL = True
+ENABLE_RESULT_SPOOL = True
+ENABLE_ADMISSION_CONTROL = True
+ENABLE_LOGCAT_INGESTION = True
+ENABLE_TELEMETRY = True 
\ No newline at end of file
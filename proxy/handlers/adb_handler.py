@@ -4,21 +4,50 @@ import uuid
 import time
 import os
 import sys
-from typing import Dict, Optional, Tuple
+import hashlib
+import re
+import tempfile
+from typing import Dict, Optional, Set, Tuple
 
 from utils.logger import logger
+from utils.metrics import (
+    TASK_DISPATCH_SECONDS,
+    ADB_SPAWN_SECONDS,
+    TIME_TO_FIRST_BYTE_SECONDS,
+    COMMAND_DURATION_SECONDS,
+    BINARY_OUTPUT_BYTES
+)
+from utils.tracing import tracer
+from utils.logcat import LogcatFilter, LogcatStore
 from config.settings import (
     ADB_PATH,
     ADB_TIMEOUT,
     DEFAULT_SERIAL,
-    ENABLE_BACKGROUND_TASKS
+    ENABLE_BACKGROUND_TASKS,
+    BINARY_OUTPUT_DIR,
+    BINARY_BUFFER_SIZE,
+    LOGCAT_BUFFER_RECORDS,
+    ENABLE_LOGCAT_INGESTION
 )
 
 class ADBHandler:
-    def __init__(self):
+    def __init__(self, publisher=None, journal=None):
         self.running_tasks: Dict[str, subprocess.Popen] = {}
         self.task_outputs: Dict[str, str] = {}
         self.task_threads: Dict[str, threading.Thread] = {}
+        self.task_serials: Dict[str, Optional[str]] = {}
+        self.task_started: Dict[str, float] = {}
+        # Foreground tasks whose result is still being collected by a worker
+        self.foreground_tasks: Set[str] = set()
+        # Per-thread read buffer reused by every binary command of that worker
+        self.buffers = threading.local()
+        # Parsed logcat records of every device, queryable by time range and level
+        self.logcat = LogcatStore(LOGCAT_BUFFER_RECORDS)
+        
+        # Optional live output publisher (see handlers.stream_handler)
+        self.publisher = publisher
+        # Optional durable task journal (see utils.journal)
+        self.journal = journal
         
         # Verify ADB installation
         self._verify_adb()
@@ -36,10 +65,35 @@ class ADBHandler:
         self, 
         command: str, 
         serial: Optional[str] = None,
-        background: bool = False
+        background: bool = False,
+        received_at: Optional[float] = None,
+        api_task_id: Optional[str] = None,
+        binary: bool = False,
+        logcat_filter: Optional[Dict] = None,
+        task_id: Optional[str] = None
     ) -> Tuple[str, Dict]:
-        """Execute an ADB command and return task ID and initial response"""
-        task_id = str(uuid.uuid4())
+        """Execute an ADB command and return task ID and initial response
+
+        received_at is the time.monotonic() timestamp at which the task was
+        polled from the API, used for the dispatch latency metric. Tasks with an
+        api_task_id are recorded in the journal. Binary commands (exec-out) run
+        in the foreground and their raw output is written to a file under
+        BINARY_OUTPUT_DIR, see _execute_binary. Background logcat output is
+        parsed into the per-device logcat store and only lines passing
+        logcat_filter ({"spec", "regex", "level"}) are forwarded. The task id is
+        generated unless the caller passes one.
+        """
+        task_id = task_id or str(uuid.uuid4())
+        subcommand = command.split()[0] if command.split() else ""
+        ingest_logcat = ENABLE_LOGCAT_INGESTION and background and ENABLE_BACKGROUND_TASKS and subcommand == "logcat"
+        if ingest_logcat and "-v" not in command.split():
+            command = command.replace("logcat", "logcat -v threadtime", 1)
+        span = tracer.start_span("adb.execute_command", attributes={
+            "task.id": task_id,
+            "adb.subcommand": subcommand,
+            "adb.serial": serial or "",
+            "adb.background": background
+        })
         
         # Prepare full command
         if serial:
@@ -49,7 +103,12 @@ class ADBHandler:
         
         logger.debug(f"Executing command: {' '.join(full_command)}")
         
+        if binary:
+            return self._execute_binary(task_id, full_command, subcommand, span, received_at, api_task_id)
+        
         try:
+            record_filter = LogcatFilter.from_task(logcat_filter) if ingest_logcat else None
+            spawn_start = time.monotonic()
             process = subprocess.Popen(
                 full_command,
                 stdout=subprocess.PIPE,
@@ -58,18 +117,28 @@ class ADBHandler:
                 bufsize=1,
                 universal_newlines=True
             )
+            spawned_at = time.monotonic()
+            ADB_SPAWN_SECONDS.observe(spawned_at - spawn_start)
+            span.set_attribute("adb.spawn_ms", (spawned_at - spawn_start) * 1000)
+            if received_at is not None:
+                TASK_DISPATCH_SECONDS.observe(spawned_at - received_at)
             
             self.running_tasks[task_id] = process
+            self.task_started[task_id] = spawned_at
             self.task_outputs[task_id] = ""
+            self.task_serials[task_id] = serial
+            if self.journal and api_task_id:
+                self.journal.start(api_task_id, task_id, process.pid)
             
             if background and ENABLE_BACKGROUND_TASKS:
                 thread = threading.Thread(
                     target=self._monitor_task,
-                    args=(task_id, process)
+                    args=(task_id, process, subcommand, span, ingest_logcat, record_filter)
                 )
                 thread.daemon = True
                 thread.start()
                 self.task_threads[task_id] = thread
+                span.end()
                 
                 return task_id, {
                     "status": "started",
@@ -77,9 +146,21 @@ class ADBHandler:
                     "task_id": task_id
                 }
             else:
+                self.foreground_tasks.add(task_id)
                 try:
                     stdout, stderr = process.communicate(timeout=ADB_TIMEOUT)
                     exit_code = process.returncode
+                    span.set_attribute("adb.exit_code", exit_code)
+                    span.end("ok" if exit_code == 0 else "error")
+                    COMMAND_DURATION_SECONDS.observe(
+                        time.monotonic() - spawned_at,
+                        subcommand,
+                        "completed" if exit_code == 0 else "error"
+                    )
+                    
+                    if self.journal:
+                        self.journal.output(task_id, 0, stdout if exit_code == 0 else (stderr or stdout))
+                        self.journal.finish(task_id, "completed" if exit_code == 0 else "error", exit_code)
                     
                     if exit_code == 0:
                         self.task_outputs[task_id] = stdout
@@ -99,38 +180,211 @@ class ADBHandler:
                         
                 except subprocess.TimeoutExpired:
                     process.kill()
+                    if self.journal:
+                        self.journal.finish(task_id, "error", -1)
+                    COMMAND_DURATION_SECONDS.observe(time.monotonic() - spawned_at, subcommand, "timeout")
+                    span.set_attribute("error", "timeout")
+                    span.end("error")
                     return task_id, {
                         "status": "error",
                         "error": "Command timed out",
                         "exit_code": -1
                     }
+                finally:
+                    self.foreground_tasks.discard(task_id)
                     
         except Exception as e:
             logger.error(f"Error executing command: {e}")
+            span.set_attribute("error", str(e))
+            span.end("error")
             return task_id, {
                 "status": "error",
                 "error": str(e),
                 "exit_code": -1
             }
     
-    def _monitor_task(self, task_id: str, process: subprocess.Popen):
+    def _abort(self, task_id: str, process: subprocess.Popen):
+        """Kill a process whose task failed before producing a result and forget the task"""
+        if process.poll() is None:
+            process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Process of task {task_id} did not exit after kill")
+        self.foreground_tasks.discard(task_id)
+        self.cleanup_task(task_id)
+        if self.journal:
+            try:
+                self.journal.finish(task_id, "error", -1)
+            except Exception as e:
+                logger.error(f"Error journaling aborted task {task_id}: {e}")
+    
+    def _buffer(self) -> memoryview:
+        view = getattr(self.buffers, "view", None)
+        if view is None:
+            view = self.buffers.view = memoryview(bytearray(BINARY_BUFFER_SIZE))
+        return view
+    
+    def _execute_binary(
+        self,
+        task_id: str,
+        full_command: list,
+        subcommand: str,
+        span,
+        received_at: Optional[float] = None,
+        api_task_id: Optional[str] = None
+    ) -> Tuple[str, Dict]:
+        """Stream raw adb stdout into a file without decoding it.
+        
+        stdout is unbuffered and read with readinto() into the worker's reused
+        buffer; slices of it are written and hashed through a memoryview, so
+        no bytes object or str is created per chunk.
+        """
+        extension = ".png" if "screencap" in full_command and "-p" in full_command else ".bin"
+        path = os.path.join(BINARY_OUTPUT_DIR, task_id + extension)
+        view = self._buffer()
+        digest = hashlib.sha256()
+        total = 0
+        process = None
+        timer = None
+        
+        try:
+            os.makedirs(BINARY_OUTPUT_DIR, exist_ok=True)
+            with tempfile.TemporaryFile() as errors, open(path, "wb", buffering=0) as sink:
+                spawn_start = time.monotonic()
+                process = subprocess.Popen(full_command, stdout=subprocess.PIPE, stderr=errors, bufsize=0)
+                spawned_at = time.monotonic()
+                ADB_SPAWN_SECONDS.observe(spawned_at - spawn_start)
+                span.set_attribute("adb.spawn_ms", (spawned_at - spawn_start) * 1000)
+                if received_at is not None:
+                    TASK_DISPATCH_SECONDS.observe(spawned_at - received_at)
+                
+                self.running_tasks[task_id] = process
+                self.task_started[task_id] = spawned_at
+                self.task_outputs[task_id] = ""
+                self.foreground_tasks.add(task_id)
+                if self.journal and api_task_id:
+                    self.journal.start(api_task_id, task_id, process.pid)
+                
+                expired = threading.Event()
+                timer = threading.Timer(ADB_TIMEOUT, lambda: (expired.set(), process.kill()))
+                timer.start()
+                try:
+                    while True:
+                        n = process.stdout.readinto(view)
+                        if not n:
+                            break
+                        chunk = view[:n]
+                        digest.update(chunk)
+                        written = 0
+                        while written < n:
+                            written += sink.write(chunk[written:])
+                        total += n
+                    exit_code = process.wait()
+                finally:
+                    timer.cancel()
+                    process.stdout.close()
+                    self.foreground_tasks.discard(task_id)
+                timed_out = expired.is_set()
+                errors.seek(0)
+                stderr = errors.read().decode(errors="replace")
+        except Exception as e:
+            logger.error(f"Error executing binary command: {e}")
+            if timer is not None:
+                timer.cancel()
+            if process is not None:
+                self._abort(task_id, process)
+            span.set_attribute("error", str(e))
+            span.end("error")
+            return task_id, {"status": "error", "error": str(e), "exit_code": -1}
+        
+        duration = time.monotonic() - spawned_at
+        status = "completed" if exit_code == 0 else "error"
+        BINARY_OUTPUT_BYTES.inc(total, subcommand)
+        COMMAND_DURATION_SECONDS.observe(duration, subcommand, "timeout" if timed_out else status)
+        span.set_attribute("adb.exit_code", exit_code)
+        span.set_attribute("adb.output_bytes", total)
+        span.end("ok" if exit_code == 0 else "error")
+        self.task_outputs[task_id] = path
+        if self.journal:
+            self.journal.finish(task_id, status, exit_code)
+        
+        result = {
+            "status": status,
+            "output_path": path,
+            "bytes": total,
+            "sha256": digest.hexdigest(),
+            "exit_code": exit_code
+        }
+        if exit_code != 0:
+            result["error"] = "Command timed out" if timed_out else stderr
+        return task_id, result
+    
+    def query_logcat(self, serial: Optional[str] = None, **params) -> Dict:
+        """Buffered logcat records of a device, see LogcatStore.query"""
+        serial = serial or DEFAULT_SERIAL
+        try:
+            records = self.logcat.query(serial, **params)
+        except (TypeError, ValueError, re.error) as e:
+            return {"status": "error", "error": f"Invalid logcat query: {e}"}
+        return {"status": "completed", "serial": serial, "records": records}
+    
+    def capture_screenshot(self, serial: Optional[str] = None) -> Tuple[str, Dict]:
+        """Save a PNG screenshot of the device via exec-out screencap"""
+        return self.execute_command("exec-out screencap -p", serial=serial, binary=True)
+    
+    def _monitor_task(
+        self,
+        task_id: str,
+        process: subprocess.Popen,
+        subcommand: str = "",
+        parent_span=None,
+        ingest_logcat: bool = False,
+        record_filter: Optional[LogcatFilter] = None
+    ):
         """Monitor a background task and collect its output"""
         output = []
+        serial = self.task_serials.get(task_id)
+        started = self.task_started.get(task_id, time.monotonic())
+        first_byte = True
+        offset = 0
+        ingested = 0
+        span = tracer.start_span("adb.monitor_task", parent=parent_span, attributes={
+            "task.id": task_id,
+            "adb.subcommand": subcommand
+        })
         
-        while True:
-            if process.poll() is not None:
-                break
-                
-            line = process.stdout.readline()
-            if line:
-                output.append(line)
-                self.task_outputs[task_id] = "".join(output)
-                logger.log_task(task_id, line.strip())
-            
-            time.sleep(0.1)
+        # readline() blocks until a line is available, so lines are
+        # forwarded as soon as adb writes them
+        for line in iter(process.stdout.readline, ""):
+            if first_byte:
+                TIME_TO_FIRST_BYTE_SECONDS.observe(time.monotonic() - started)
+                span.set_attribute("adb.first_byte_ms", (time.monotonic() - started) * 1000)
+                first_byte = False
+            if ingest_logcat:
+                # Only the bounded device buffer keeps ingested lines: a logcat
+                # task runs indefinitely, so its output is not accumulated or journaled
+                record = self.logcat.ingest(serial or DEFAULT_SERIAL, line)
+                if record_filter is not None and (record is None or not record_filter.matches(record)):
+                    continue
+                ingested += 1
+                self.task_outputs[task_id] = f"{ingested} logcat lines buffered for {serial or DEFAULT_SERIAL}"
+                if self.publisher:
+                    self.publisher.publish(task_id, serial, line)
+                continue
+            output.append(line)
+            self.task_outputs[task_id] = "".join(output)
+            if self.journal:
+                self.journal.output(task_id, offset, line)
+            offset += len(line)
+            logger.log_task(task_id, line.strip())
+            if self.publisher:
+                self.publisher.publish(task_id, serial, line)
         
         # Collect any remaining output
         remaining_output, errors = process.communicate()
+        if ingested:
+            output.append(self.task_outputs[task_id] + "\n")
         if remaining_output:
             output.append(remaining_output)
         if errors:
@@ -138,6 +392,30 @@ class ADBHandler:
         
         self.task_outputs[task_id] = "".join(output)
         logger.log_task(task_id, "Task completed")
+        
+        if self.journal:
+            tail = (remaining_output or "") + (f"Errors: {errors}" if errors else "")
+            self.journal.output(task_id, offset, tail)
+            self.journal.finish(task_id, "completed" if process.returncode == 0 else "error", process.returncode)
+        
+        COMMAND_DURATION_SECONDS.observe(
+            time.monotonic() - started,
+            subcommand,
+            "completed" if process.returncode == 0 else "error"
+        )
+        span.set_attribute("adb.exit_code", process.returncode)
+        span.set_attribute("adb.output_lines", len(output) + ingested)
+        span.end("ok" if process.returncode == 0 else "error")
+        
+        if self.publisher:
+            for line in (remaining_output or "").splitlines():
+                self.publisher.publish(task_id, serial, line)
+            if errors:
+                self.publisher.publish(task_id, serial, f"Errors: {errors}")
+            self.publisher.finish(task_id, serial, {
+                "status": "completed" if process.returncode == 0 else "error",
+                "exit_code": process.returncode
+            })
     
     def get_task_status(self, task_id: str) -> Dict:
         """Get the status and output of a task"""
@@ -150,7 +428,7 @@ class ADBHandler:
         process = self.running_tasks[task_id]
         exit_code = process.poll()
         
-        if exit_code is None:
+        if exit_code is None or task_id in self.foreground_tasks:
             return {
                 "status": "running",
                 "output": self.task_outputs.get(task_id, ""),
@@ -198,6 +476,10 @@ class ADBHandler:
             del self.task_outputs[task_id]
         if task_id in self.task_threads:
             del self.task_threads[task_id]
+        if task_id in self.task_serials:
+            del self.task_serials[task_id]
+        if task_id in self.task_started:
+            del self.task_started[task_id]
     
     def check_device_status(self, serial: Optional[str] = None) -> Dict:
         """Check the status of an Android device"""
@@ -1,92 +1,283 @@
 import requests
+import itertools
 import json
-from typing import Dict, Optional
+import threading
+import time
+from typing import Callable, Dict, Optional
 from urllib.parse import urljoin
 
-from proxy.config.settings import (
+from config.settings import (
     API_HOST,
     API_PORT,
     API_ENDPOINTS,
     SSL_VERIFY,
     MAX_RETRIES,
-    RETRY_DELAY
+    RETRY_DELAY,
+    RETRY_MAX_DELAY,
+    RETRY_QUEUE_SIZE,
+    API_CONNECT_TIMEOUT,
+    API_READ_TIMEOUT,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RECOVERY_TIMEOUT,
+    SPOOL_DIR,
+    SPOOL_SEGMENT_SIZE,
+    SPOOL_MAX_BYTES,
+    SPOOL_MAX_AGE,
+    SPOOL_REPLAY_RATE,
+    ENABLE_RESULT_SPOOL
 )
-from proxy.utils.logger import logger
+from utils.logger import logger
+from utils.metrics import API_REQUEST_SECONDS, API_ERRORS, API_RETRY_QUEUE, SPOOL_BYTES, timed
+from utils.resilience import BLOCKED, DELIVERED, FAILED, RETRY, CircuitBreaker, RetryQueue
+from utils.spool import Spool
+from utils.tracing import tracer
 
 class APIHandler:
-    def __init__(self):
+    def __init__(self, on_acknowledged: Optional[Callable[[Dict], None]] = None):
         self.base_url = f"{API_HOST}:{API_PORT}"
         self.session = requests.Session()
         self.session.verify = SSL_VERIFY
+        self.timeout = (API_CONNECT_TIMEOUT, API_READ_TIMEOUT)
+        # Called with a request's `ack` once it is delivered, also after a spool replay
+        self.on_acknowledged = on_acknowledged
         
-        # Set up retry strategy
-        retry_strategy = requests.adapters.Retry(
-            total=MAX_RETRIES,
-            backoff_factor=RETRY_DELAY,
-            status_forcelist=[500, 502, 503, 504]
-        )
-        adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
+        # Failures are retried by the retry queue, never inline on the caller's thread
+        adapter = requests.adapters.HTTPAdapter(max_retries=0)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
+        
+        # Writes the retry queue gives up on are kept on disk until the API is back
+        self.spool = None
+        self.replay_thread: Optional[threading.Thread] = None
+        if ENABLE_RESULT_SPOOL:
+            self.spool = Spool(SPOOL_DIR, SPOOL_SEGMENT_SIZE, SPOOL_MAX_BYTES, SPOOL_MAX_AGE)
+            SPOOL_BYTES.set_function(self.spool.pending_bytes)
+        
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retry_queue = RetryQueue(
+            self._deliver,
+            max_size=RETRY_QUEUE_SIZE,
+            max_attempts=MAX_RETRIES,
+            base_delay=RETRY_DELAY,
+            max_delay=RETRY_MAX_DELAY,
+            on_drop=self._spool_request if self.spool else None
+        )
+        self.retry_ids = itertools.count()
+        API_RETRY_QUEUE.set_function(self.retry_queue.size)
     
-    def _make_request(
-        self,
-        method: str,
-        endpoint: str,
-        data: Optional[Dict] = None,
-        params: Optional[Dict] = None
-    ) -> Dict:
-        """Make an HTTP request to the API"""
-        url = urljoin(self.base_url, endpoint)
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers.setdefault(endpoint, CircuitBreaker(
+                endpoint, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT
+            ))
+        return breaker
+    
+    def _send(self, request: Dict):
+        """Perform one attempt; returns (response dict, outcome)"""
+        endpoint = request["endpoint"]
+        breaker = self._breaker(endpoint)
+        if not breaker.allow():
+            request["retry_after"] = breaker.retry_after() or RETRY_DELAY
+            return {"status": "error", "error": f"Circuit open for {endpoint}"}, BLOCKED
         
         try:
             response = self.session.request(
-                method=method,
-                url=url,
-                json=data,
-                params=params
+                method=request["method"],
+                url=urljoin(self.base_url, endpoint),
+                json=request["data"],
+                params=request["params"],
+                headers=request["headers"],
+                timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()
             
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {e}")
-            return {
-                "status": "error",
-                "error": str(e)
-            }
+            API_ERRORS.inc(1, endpoint)
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code is not None and status_code < 500:
+                # The API answered: a rejected request says nothing about its health
+                breaker.record_success()
+                outcome = FAILED
+            else:
+                breaker.record_failure()
+                outcome = RETRY
+            return {"status": "error", "error": str(e)}, outcome
+        except Exception:
+            # Lets the next probe through if this one ended without a result
+            breaker.release_probe()
+            raise
+        
+        # The API answered. requests' JSONDecodeError is also a RequestException,
+        # so the body is decoded out here: a POST that got a non-JSON 200 must
+        # not count as a failure nor be sent again
+        breaker.record_success()
+        try:
+            return response.json(), DELIVERED
+        except ValueError as e:
+            logger.error(f"Invalid API response: {e}")
+            return {"status": "error", "error": str(e)}, FAILED
+    
+    def _deliver(self, request: Dict) -> str:
+        """Retry queue callback"""
+        _, outcome = self._send(request)
+        if outcome == DELIVERED:
+            self._acknowledge(request)
+        return outcome
+    
+    def _acknowledge(self, request: Dict):
+        if request.get("ack") and self.on_acknowledged:
+            try:
+                self.on_acknowledged(request["ack"])
+            except Exception as e:
+                logger.error(f"Error acknowledging delivered request {request['endpoint']}: {e}")
+    
+    def _spool_request(self, request: Dict):
+        self.spool.append({
+            "method": request["method"],
+            "endpoint": request["endpoint"],
+            "data": request["data"],
+            "params": request["params"],
+            "ack": request.get("ack"),
+            "spooled_at": time.time()
+        })
     
-    def send_task_result(self, task_id: str, result: Dict) -> Dict:
+    def _replay_record(self, record: Dict) -> bool:
+        """Spool replay callback; False stops the replay"""
+        record["headers"] = {}
+        _, outcome = self._send(record)
+        if outcome == FAILED:
+            logger.error(f"API rejected spooled request {record['method']} {record['endpoint']}")
+        elif outcome == DELIVERED:
+            self._acknowledge(record)
+        time.sleep(1 / SPOOL_REPLAY_RATE)
+        return outcome in (DELIVERED, FAILED)
+    
+    def _replay_spool(self, batch: int = 1000):
+        delivered = batch
+        while delivered == batch:
+            delivered = self.spool.replay(self._replay_record, limit=batch)
+            logger.info(f"Replayed {delivered} spooled API requests")
+    
+    def spool_pending(self) -> bool:
+        return self.spool is not None and not self.spool.empty()
+    
+    def replay_spool(self):
+        """Start replaying spooled requests in the background, paced to SPOOL_REPLAY_RATE.
+        
+        Records are re-sent one request each, in order, over the pooled session:
+        the API has no bulk endpoint for results or statuses to batch them into.
+        """
+        if not self.spool_pending() or (self.replay_thread and self.replay_thread.is_alive()):
+            return
+        self.replay_thread = threading.Thread(target=self._replay_spool, daemon=True)
+        self.replay_thread.start()
+    
+    def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[Dict] = None,
+        params: Optional[Dict] = None,
+        retry_key: Optional[str] = None,
+        ack: Optional[Dict] = None
+    ) -> Dict:
+        """Make an HTTP request to the API.
+        
+        Fails fast while the endpoint's circuit is open. With a retry_key a failed
+        request is handed to the retry queue and the error is still returned, so
+        callers never wait for retries. `ack` (JSON-serializable, kept when the
+        request is spooled) is passed to on_acknowledged once a retry or a spool
+        replay delivers it; callers acknowledge immediate deliveries themselves.
+        """
+        request = {
+            "method": method,
+            "endpoint": endpoint,
+            "data": data,
+            "params": params,
+            "headers": tracer.inject(),
+            "ack": ack
+        }
+        result, outcome = self._send(request)
+        if outcome in (RETRY, BLOCKED):
+            span = tracer.current()
+            if span is not None:
+                span.set_attribute("error", result["error"])
+                span.status = "error"
+            if retry_key is not None:
+                self.retry_queue.submit(retry_key, request,
+                                        delay=request.get("retry_after") if outcome == BLOCKED else None)
+                result["retry_queued"] = True
+        return result
+    
+    @timed(API_REQUEST_SECONDS)
+    @tracer.traced("api.send_task_result", require_parent=True)
+    def send_task_result(self, task_id: str, result: Dict, ack: Optional[Dict] = None) -> Dict:
         """Send task execution result back to API"""
         endpoint = API_ENDPOINTS["emulator_logs"].replace(":taskId", task_id)
-        return self._make_request("POST", endpoint, data=result)
+        return self._make_request("POST", endpoint, data=result,
+                                  retry_key=f"result:{task_id}", ack=ack)
     
-    def update_task_status(self, task_id: str, status: Dict) -> Dict:
-        """Update task status in API"""
+    @timed(API_REQUEST_SECONDS)
+    @tracer.traced("api.update_task_status", require_parent=True)
+    def update_task_status(self, task_id: str, status: Dict, retry: bool = True,
+                           ack: Optional[Dict] = None) -> Dict:
+        """Update task status in API; a newer status replaces one waiting for retry"""
         endpoint = API_ENDPOINTS["emulator_status"].replace(":taskId", task_id)
-        return self._make_request("POST", endpoint, data=status)
+        return self._make_request("POST", endpoint, data=status,
+                                  retry_key=f"status:{task_id}" if retry else None,
+                                  ack=ack)
     
+    @timed(API_REQUEST_SECONDS)
     def get_pending_tasks(self) -> Dict:
         """Get list of pending tasks from API"""
         return self._make_request("GET", API_ENDPOINTS["terminal_execute"])
     
+    @timed(API_REQUEST_SECONDS)
+    def ack_task(self, task_id: str, lease_id: str) -> Dict:
+        """Confirm a leased task was taken so the API stops re-delivering it"""
+        return self._make_request("POST", API_ENDPOINTS["terminal_ack"],
+                                  data={"task_id": task_id, "lease_id": lease_id},
+                                  retry_key=f"ack:{task_id}")
+    
+    @timed(API_REQUEST_SECONDS)
+    @tracer.traced("api.send_device_status", require_parent=True)
     def send_device_status(self, serial: str, status: Dict) -> Dict:
         """Send device status to API"""
         endpoint = API_ENDPOINTS["emulator_status"].replace(":serial", serial)
-        return self._make_request("POST", endpoint, data=status)
+        return self._make_request("POST", endpoint, data=status, retry_key=f"device:{serial}")
     
+    @timed(API_REQUEST_SECONDS)
+    @tracer.traced("api.send_error", require_parent=True)
     def send_error(self, error: str, context: Optional[Dict] = None) -> Dict:
         """Send error information to API"""
         data = {
             "error": error,
             "context": context or {}
         }
-        return self._make_request("POST", "/api/errors", data=data)
+        return self._make_request("POST", "/api/errors", data=data,
+                                  retry_key=f"error:{next(self.retry_ids)}")
     
+    @timed(API_REQUEST_SECONDS)
     def healthcheck(self) -> bool:
         """Check if API is accessible"""
         try:
             response = self._make_request("GET", "/health")
-            return response.get("status") == "healthy"
+            healthy = response.get("status") == "healthy"
+            if healthy:
+                self.replay_spool()
+            return healthy
         except:
-            return False 
\ No newline at end of file
+            return False
+    
+    def close(self):
+        """Stop the retry queue, spooling the writes still waiting for a retry"""
+        pending = self.retry_queue.stop()
+        if self.spool:
+            for request in pending:
+                self._spool_request(request)
+            self.spool.close()
+        elif pending:
+            logger.warning(f"Dropping {len(pending)} API requests waiting for retry")
+        self.session.close()
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+from config.settings import (
+    SOCKETIO_MESSAGE_QUEUE,
+    SOCKETIO_CHANNEL,
+    STREAM_FLUSH_INTERVAL,
+    STREAM_MAX_BATCH_LINES,
+    STREAM_REPLAY_BATCHES,
+    STREAM_REPLAY_TTL,
+    STREAM_REPLAY_KEY_PREFIX,
+    STREAM_FAILURE_THRESHOLD,
+    STREAM_BACKOFF_MAX
+)
+
+class TaskStreamPublisher:
+    """Publish live task output to the Socket.IO app through its Redis message queue.
+
+    Lines are batched per task and flushed every STREAM_FLUSH_INTERVAL seconds
+    to the rooms task:<task_id> and device:<serial>. Every batch is also kept in
+    a bounded Redis list so late subscribers can be replayed. After
+    STREAM_FAILURE_THRESHOLD consecutive Redis errors publishing pauses, with
+    a doubling backoff, and output produced meanwhile is dropped.
+    """
+
+    def __init__(self, url: str = SOCKETIO_MESSAGE_QUEUE, flush_interval: float = STREAM_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.buffers: Dict[str, List[str]] = {}
+        self.serials: Dict[str, Optional[str]] = {}
+        self.sequence: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.emit_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = True
+        self.enabled = False
+        self.failures = 0
+        self.paused_until = 0.0
+
+        try:
+            import redis
+            import socketio
+        except ImportError as e:
+            logger.warning(f"Output streaming disabled: {e}")
+            return
+
+        self.redis = redis.Redis.from_url(url)
+        self.manager = socketio.RedisManager(url, channel=SOCKETIO_CHANNEL, write_only=True)
+        self.enabled = True
+
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+        logger.info("Task output streaming enabled")
+
+    def publish(self, task_id: str, serial: Optional[str], line: str):
+        """Queue one output line for the next batch"""
+        if not self.enabled or self.paused():
+            return
+        with self.lock:
+            buffer = self.buffers.setdefault(task_id, [])
+            self.serials[task_id] = serial
+            buffer.append(line.rstrip("\n"))
+            full = len(buffer) >= STREAM_MAX_BATCH_LINES
+        if full:
+            self.wakeup.set()
+
+    def finish(self, task_id: str, serial: Optional[str], status: Dict):
+        """Flush remaining output and notify subscribers that the task ended"""
+        if not self.enabled:
+            return
+        self.flush()
+        if self.paused():
+            self._forget(task_id)
+            return
+        payload = {
+            "task_id": task_id,
+            "serial": serial,
+            "status": status.get("status"),
+            "exit_code": status.get("exit_code")
+        }
+        try:
+            self.manager.emit("task_finished", payload, room=self._rooms(task_id, serial))
+            self.failures = 0
+        except Exception as e:
+            self._failed(f"Error publishing task {task_id} finish: {e}")
+        self._forget(task_id)
+
+    def _forget(self, task_id: str):
+        with self.emit_lock:
+            self.sequence.pop(task_id, None)
+        with self.lock:
+            self.serials.pop(task_id, None)
+
+    def paused(self) -> bool:
+        return self.paused_until > time.monotonic()
+
+    def _failed(self, message: str):
+        """Count a publish error; pause publishing once they keep happening"""
+        self.failures += 1
+        if self.failures < STREAM_FAILURE_THRESHOLD:
+            logger.error(message)
+            return
+        backoff = min(STREAM_BACKOFF_MAX, 2 ** (self.failures - STREAM_FAILURE_THRESHOLD))
+        self.paused_until = time.monotonic() + backoff
+        with self.lock:
+            self.buffers = {}
+        logger.warning(f"{message} (output streaming paused for {backoff}s)")
+
+    def _flush_loop(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Emit all buffered lines, one batch per task"""
+        with self.emit_lock:
+            with self.lock:
+                batches, self.buffers = self.buffers, {}
+                serials = dict(self.serials)
+            for task_id, lines in batches.items():
+                if lines and not self.paused():
+                    self._emit_batch(task_id, serials.get(task_id), lines)
+
+    def _emit_batch(self, task_id: str, serial: Optional[str], lines: List[str]):
+        seq = self.sequence.get(task_id, 0)
+        self.sequence[task_id] = seq + len(lines)
+        payload = {
+            "task_id": task_id,
+            "serial": serial,
+            "seq": seq,
+            "lines": lines
+        }
+        try:
+            key = f"{STREAM_REPLAY_KEY_PREFIX}{task_id}"
+            pipe = self.redis.pipeline()
+            pipe.rpush(key, json.dumps(payload))
+            pipe.ltrim(key, -STREAM_REPLAY_BATCHES, -1)
+            pipe.expire(key, STREAM_REPLAY_TTL)
+            pipe.execute()
+            self.manager.emit("task_output", payload, room=self._rooms(task_id, serial))
+            self.failures = 0
+        except Exception as e:
+            self._failed(f"Error publishing output for task {task_id}: {e}")
+
+    def _rooms(self, task_id: str, serial: Optional[str]) -> List[str]:
+        rooms = [f"task:{task_id}"]
+        if serial:
+            rooms.append(f"device:{serial}")
+        return rooms
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.enabled:
+            self.flush()
@@ -0,0 +1,262 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import TASK_STREAM_ENTRIES
+from config.settings import (
+    TASK_STREAM_URL,
+    TASK_STREAM_KEY,
+    TASK_STREAM_GROUP,
+    TASK_STREAM_BATCH,
+    TASK_STREAM_CLAIM_IDLE,
+    TASK_STREAM_CLAIM_INTERVAL,
+    TASK_STREAM_MAX_DELIVERIES,
+    TASK_STREAM_MAXLEN,
+    POLL_INTERVAL
+)
+
+# Consumer holding entries for devices no proxy owns
+UNOWNED = "unowned"
+
+class RedisTaskQueue:
+    """Receive tasks from a Redis stream shared by every proxy through a consumer group.
+
+    Each entry holds one task as JSON in its "task" field. Entries stay in this
+    consumer's pending list until ack() is called after the result reached the
+    API, so delivery is at-least-once. Consumers are named after the proxy
+    node: a task for a device another node owns is handed to that node's
+    consumer (hand_off), without counting as a delivery. Entries nobody touched
+    for TASK_STREAM_CLAIM_IDLE seconds (a proxy stopped, or no node owned the
+    device) are claimed by a proxy for which `owns(task)` holds; entries
+    already delivered TASK_STREAM_MAX_DELIVERIES times, or requeued that many
+    times, go to "<stream>:dead".
+    """
+
+    def __init__(self, consumer: str, url: str = TASK_STREAM_URL, stream: str = TASK_STREAM_KEY,
+                 group: str = TASK_STREAM_GROUP, client=None,
+                 owns: Optional[Callable[[Dict], bool]] = None):
+        self.consumer = consumer
+        self.stream = stream
+        self.group = group
+        self.owns = owns or (lambda task: True)
+        self.dead_letters = f"{stream}:dead"
+        self.inflight: Dict[str, float] = {}  # entry id -> time read
+        self.lock = threading.Lock()
+        self.last_claim = 0.0
+        self.last_keep_alive = 0.0
+        self.recovered = False
+        self.recover_from = "0"  # own pending entries after this id are still to be recovered
+
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.redis = client
+        try:
+            self.redis.xgroup_create(stream, group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        logger.info(f"Reading tasks from Redis stream {stream} as {group}/{consumer}")
+
+    def submit(self, task: Dict) -> str:
+        """Add a task to the stream (producer side)"""
+        return self.redis.xadd(self.stream, {"task": json.dumps(task)},
+                               maxlen=TASK_STREAM_MAXLEN, approximate=True)
+
+    def _tasks(self, entries, outcome: str) -> List[Dict]:
+        tasks = []
+        for entry_id, fields in entries:
+            if not fields or "task" not in fields:
+                # Trimmed from the stream while pending
+                self.redis.xack(self.stream, self.group, entry_id)
+                continue
+            try:
+                task = json.loads(fields["task"])
+            except ValueError:
+                logger.error(f"Malformed task in stream entry {entry_id}")
+                self._dead_letter(entry_id, fields)
+                continue
+            task["stream_id"] = entry_id
+            with self.lock:
+                self.inflight[entry_id] = time.monotonic()
+            tasks.append(task)
+        TASK_STREAM_ENTRIES.inc(len(tasks), outcome)
+        return tasks
+
+    def _dead_letter(self, entry_id: str, fields: Dict):
+        pipe = self.redis.pipeline()
+        pipe.xadd(self.dead_letters, dict(fields, source_id=entry_id), maxlen=TASK_STREAM_MAXLEN, approximate=True)
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.execute()
+        self._forget(entry_id)
+        TASK_STREAM_ENTRIES.inc(1, "dead_lettered")
+
+    def _forget(self, entry_id: Optional[str]):
+        with self.lock:
+            self.inflight.pop(entry_id, None)
+
+    def keep_alive(self):
+        """Reset the idle time of entries still running here so nobody claims them.
+
+        Called on every poll, also while the proxy is too busy to read entries;
+        the XCLAIM is only sent every TASK_STREAM_CLAIM_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if now - self.last_keep_alive < TASK_STREAM_CLAIM_INTERVAL:
+            return
+        self.last_keep_alive = now
+        with self.lock:
+            entry_ids = list(self.inflight)
+        if entry_ids:
+            self.redis.xclaim(self.stream, self.group, self.consumer, 0, entry_ids, justid=True)
+
+    def _read(self, entry_ids: List[str]) -> List[tuple]:
+        """(entry id, fields) of pending entries, fields None if trimmed from the stream"""
+        pipe = self.redis.pipeline()
+        for entry_id in entry_ids:
+            pipe.xrange(self.stream, entry_id, entry_id)
+        return [(entry_id, found[0][1] if found else None)
+                for entry_id, found in zip(entry_ids, pipe.execute())]
+
+    def _wanted(self, fields: Optional[Dict]) -> bool:
+        if not fields or "task" not in fields:
+            return True  # claimed to be acknowledged
+        try:
+            return self.owns(json.loads(fields["task"]))
+        except ValueError:
+            return True  # claimed to be dead-lettered
+
+    def _take_handoffs(self) -> List[Dict]:
+        """Entries other proxies handed to this one, see hand_off()"""
+        idle_ms = int(TASK_STREAM_CLAIM_IDLE * 1000)
+        with self.lock:
+            inflight = set(self.inflight)
+        entry_ids = [
+            entry["message_id"]
+            for entry in self.redis.xpending_range(self.stream, self.group, "-", "+", TASK_STREAM_BATCH,
+                                                   consumername=self.consumer, idle=idle_ms)
+            if entry["message_id"] not in inflight
+        ]
+        if not entry_ids:
+            return []
+        # JUSTID: taking a hand-off does not count as a delivery
+        self.redis.xclaim(self.stream, self.group, self.consumer, 0, entry_ids, justid=True)
+        return self._tasks(self._read(entry_ids), "handoff_taken")
+
+    def _claim_stale(self) -> List[Dict]:
+        """Take over entries of devices this proxy owns left pending by other consumers"""
+        idle_ms = int(TASK_STREAM_CLAIM_IDLE * 1000)
+        stale = [
+            entry for entry in self.redis.xpending_range(self.stream, self.group, "-", "+",
+                                                         TASK_STREAM_BATCH, idle=idle_ms)
+            if entry["consumer"] != self.consumer
+        ]
+        if not stale:
+            return []
+        times = {entry["message_id"]: entry["times_delivered"] for entry in stale}
+        deliveries = {entry_id: times[entry_id] for entry_id, fields in self._read(list(times))
+                      if self._wanted(fields)}
+        if not deliveries:
+            return []
+        claimed = self.redis.xclaim(self.stream, self.group, self.consumer, idle_ms, list(deliveries))
+        entries = []
+        for entry_id, fields in claimed:
+            if deliveries.get(entry_id, 0) >= TASK_STREAM_MAX_DELIVERIES:
+                logger.warning(f"Stream entry {entry_id} delivered {deliveries[entry_id]} times, dead-lettering")
+                self._dead_letter(entry_id, fields or {})
+            else:
+                entries.append((entry_id, fields))
+        if entries:
+            logger.info(f"Claimed {len(entries)} stale task(s)")
+        return self._tasks(entries, "claimed")
+
+    def get_pending_tasks(self, block: float = POLL_INTERVAL) -> Dict:
+        """Tasks for this proxy, in the shape of APIHandler.get_pending_tasks().
+
+        Blocks up to `block` seconds for new entries. The first calls return the
+        entries this consumer had not acknowledged before a restart, a batch at
+        a time, until none are left.
+        """
+        try:
+            while not self.recovered:
+                response = self.redis.xreadgroup(self.group, self.consumer, {self.stream: self.recover_from},
+                                                 count=TASK_STREAM_BATCH)
+                entries = response[0][1] if response else []
+                if not entries:
+                    self.recovered = True
+                    break
+                self.recover_from = entries[-1][0]
+                tasks = self._tasks(entries, "recovered")
+                if tasks:
+                    logger.info(f"Recovered {len(tasks)} unacknowledged task(s)")
+                    return {"status": "success", "tasks": tasks}
+
+            self.keep_alive()
+            tasks = self._take_handoffs()
+            if tasks:
+                return {"status": "success", "tasks": tasks}
+
+            now = time.monotonic()
+            if now - self.last_claim >= TASK_STREAM_CLAIM_INTERVAL:
+                self.last_claim = now
+                tasks = self._claim_stale()
+                if tasks:
+                    return {"status": "success", "tasks": tasks}
+
+            response = self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"},
+                                             count=TASK_STREAM_BATCH, block=int(block * 1000))
+            return {"status": "success", "tasks": self._tasks(response[0][1] if response else [], "read")}
+        except Exception as e:
+            logger.error(f"Error reading task stream: {e}")
+            time.sleep(block)
+            return {"status": "error", "error": str(e)}
+
+    def ack(self, entry_id: str):
+        """Acknowledge an entry once its result was delivered"""
+        self.redis.xack(self.stream, self.group, entry_id)
+        self._forget(entry_id)
+        TASK_STREAM_ENTRIES.inc(1, "acked")
+
+    def hand_off(self, entry_id: str, owner: Optional[str]):
+        """Move an entry this proxy won't run to the pending list of `owner`.
+
+        The owner takes it on its next poll, and the hand-off does not count as
+        a delivery. Without an owner the entry is parked on the UNOWNED consumer,
+        to be claimed, as one more delivery, after TASK_STREAM_CLAIM_IDLE
+        seconds by a proxy that owns the device by then.
+        """
+        if owner:
+            # Idle as if stale, so the owner's _take_handoffs() finds it at once
+            self.redis.xclaim(self.stream, self.group, owner, 0, [entry_id],
+                              idle=int(TASK_STREAM_CLAIM_IDLE * 1000) + 1000, justid=True)
+        else:
+            self.redis.xclaim(self.stream, self.group, UNOWNED, 0, [entry_id], justid=True)
+        self._forget(entry_id)
+        TASK_STREAM_ENTRIES.inc(1, "handed_off" if owner else "parked")
+
+    def requeue(self, task: Dict):
+        """Put a task this proxy cannot take now back at the end of the stream.
+
+        The task's "redeliveries" count goes up each time; past
+        TASK_STREAM_MAX_DELIVERIES it is dead-lettered instead.
+        """
+        entry_id = task.get("stream_id")
+        payload = {key: value for key, value in task.items() if key != "stream_id"}
+        payload["redeliveries"] = payload.get("redeliveries", 0) + 1
+        if payload["redeliveries"] > TASK_STREAM_MAX_DELIVERIES and entry_id:
+            logger.warning(f"Stream entry {entry_id} requeued {TASK_STREAM_MAX_DELIVERIES} times, dead-lettering")
+            self._dead_letter(entry_id, {"task": json.dumps(payload)})
+            return
+        pipe = self.redis.pipeline()
+        pipe.xadd(self.stream, {"task": json.dumps(payload)}, maxlen=TASK_STREAM_MAXLEN, approximate=True)
+        if entry_id:
+            pipe.xack(self.stream, self.group, entry_id)
+        pipe.execute()
+        self._forget(entry_id)
+        TASK_STREAM_ENTRIES.inc(1, "requeued")
+
+    def stats(self) -> Dict:
+        summary = self.redis.xpending(self.stream, self.group)
+        return {"inflight": len(self.inflight), "group_pending": summary.get("pending", 0)}
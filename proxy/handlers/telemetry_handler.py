@@ -0,0 +1,207 @@
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import TELEMETRY_SAMPLE_SECONDS
+from config.settings import ADB_PATH, TELEMETRY_INTERVAL, TELEMETRY_HISTORY, TELEMETRY_TIMEOUT
+
+# One shell invocation collects every metric; sections are split on the @@ markers
+TELEMETRY_SCRIPT = (
+    "echo @@battery; dumpsys battery; "
+    "echo @@meminfo; cat /proc/meminfo; "
+    "echo @@stat; head -n 1 /proc/stat; "
+    "echo @@loadavg; cat /proc/loadavg; "
+    "echo @@boot; getprop sys.boot_completed"
+)
+
+METRICS = (
+    "battery_level",
+    "battery_temp_c",
+    "mem_total_mb",
+    "mem_available_mb",
+    "mem_used_pct",
+    "cpu_pct",
+    "load1",
+    "boot_completed"
+)
+
+BATTERY_FIELD = re.compile(r"^\s*(level|temperature):\s*(-?\d+)", re.MULTILINE)
+MEMINFO_FIELD = re.compile(r"^(MemTotal|MemAvailable):\s+(\d+) kB", re.MULTILINE)
+
+def split_sections(output: str) -> Dict[str, str]:
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith("@@"):
+            current = sections.setdefault(line[2:].strip(), [])
+        elif current is not None:
+            current.append(line)
+    return {name: "\n".join(lines) for name, lines in sections.items()}
+
+def parse_cpu_times(stat: str) -> Optional[List[int]]:
+    """Jiffies of the aggregate "cpu" line of /proc/stat"""
+    fields = stat.split()
+    if not fields or fields[0] != "cpu":
+        return None
+    return [int(value) for value in fields[1:]]
+
+def parse_telemetry(output: str, previous_cpu: Optional[List[int]] = None):
+    """Metric values from the telemetry script output and the CPU counters.
+
+    CPU usage is the busy share of jiffies since `previous_cpu`, so the first
+    sample of a device has none.
+    """
+    sections = split_sections(output)
+    sample: Dict[str, Optional[float]] = {}
+
+    battery = dict(BATTERY_FIELD.findall(sections.get("battery", "")))
+    if "level" in battery:
+        sample["battery_level"] = float(battery["level"])
+    if "temperature" in battery:
+        sample["battery_temp_c"] = int(battery["temperature"]) / 10
+
+    meminfo = {key: int(value) for key, value in MEMINFO_FIELD.findall(sections.get("meminfo", ""))}
+    if "MemTotal" in meminfo:
+        sample["mem_total_mb"] = meminfo["MemTotal"] / 1024
+        if "MemAvailable" in meminfo:
+            sample["mem_available_mb"] = meminfo["MemAvailable"] / 1024
+            sample["mem_used_pct"] = 100 * (1 - meminfo["MemAvailable"] / meminfo["MemTotal"])
+
+    cpu = parse_cpu_times(sections.get("stat", ""))
+    if cpu and previous_cpu and len(cpu) == len(previous_cpu):
+        deltas = [now - before for now, before in zip(cpu, previous_cpu)]
+        total = sum(deltas)
+        idle = deltas[3] + (deltas[4] if len(deltas) > 4 else 0)  # idle + iowait
+        if total > 0:
+            sample["cpu_pct"] = 100 * (total - idle) / total
+
+    loadavg = sections.get("loadavg", "").split()
+    if loadavg:
+        try:
+            sample["load1"] = float(loadavg[0])
+        except ValueError:
+            pass
+
+    boot = sections.get("boot", "").strip()
+    if boot:
+        sample["boot_completed"] = 1.0 if boot == "1" else 0.0
+
+    return sample, cpu
+
+class TelemetrySampler:
+    """Sample a fixed metric set of every attached device at TELEMETRY_INTERVAL.
+
+    Each device costs one adb spawn per interval (see TELEMETRY_SCRIPT) instead
+    of one per metric. Samples are kept in a NumPy ring per device, see
+    utils.timeseries.TimeSeriesRing.
+    """
+
+    def __init__(self, interval: float = TELEMETRY_INTERVAL, history: int = TELEMETRY_HISTORY,
+                 workers: int = 8):
+        self.interval = interval
+        self.history = history
+        self.series: Dict[str, object] = {}
+        self.cpu_times: Dict[str, List[int]] = {}
+        self.lock = threading.Lock()
+        self.running = False
+
+        try:
+            from utils.timeseries import TimeSeriesRing
+        except ImportError as e:
+            logger.warning(f"Device telemetry disabled: {e}")
+            return
+        self.ring_class = TimeSeriesRing
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="telemetry")
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _devices(self) -> List[str]:
+        result = subprocess.run([ADB_PATH, "devices"], capture_output=True, text=True,
+                                timeout=TELEMETRY_TIMEOUT)
+        devices = []
+        for line in result.stdout.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1] == "device":
+                devices.append(parts[0])
+        return devices
+
+    def sample_device(self, serial: str) -> Optional[Dict]:
+        started = time.monotonic()
+        try:
+            result = subprocess.run([ADB_PATH, "-s", serial, "shell", TELEMETRY_SCRIPT],
+                                    capture_output=True, text=True, timeout=TELEMETRY_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Telemetry sample of {serial} timed out")
+            return None
+        TELEMETRY_SAMPLE_SECONDS.observe(time.monotonic() - started)
+        if result.returncode != 0:
+            logger.warning(f"Telemetry sample of {serial} failed: {result.stderr.strip()}")
+            return None
+
+        sample, cpu = parse_telemetry(result.stdout, self.cpu_times.get(serial))
+        if cpu:
+            self.cpu_times[serial] = cpu
+        with self.lock:
+            series = self.series.get(serial)
+            if series is None:
+                series = self.series[serial] = self.ring_class(METRICS, self.history)
+        series.append(sample)
+        return sample
+
+    def _run(self):
+        while self.running:
+            cycle_start = time.monotonic()
+            try:
+                list(self.pool.map(self.sample_device, self._devices()))
+            except Exception as e:
+                logger.error(f"Error sampling device telemetry: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - cycle_start)))
+
+    @staticmethod
+    def _invalid_query(metrics, window, percentiles) -> Optional[str]:
+        """Reason a query cannot be answered, None if it is valid"""
+        if metrics is not None:
+            if not isinstance(metrics, list) or not all(isinstance(name, str) for name in metrics):
+                return "metrics must be a list of metric names"
+            unknown = [name for name in metrics if name not in METRICS]
+            if unknown:
+                return f"Unknown metrics: {', '.join(unknown)}"
+        if window is not None and (isinstance(window, bool) or not isinstance(window, (int, float))
+                                   or window <= 0):
+            return "window must be a positive number of seconds"
+        if percentiles is not None:
+            if not isinstance(percentiles, list) or not all(
+                not isinstance(pct, bool) and isinstance(pct, (int, float)) and 0 <= pct <= 100
+                for pct in percentiles
+            ):
+                return "percentiles must be a list of numbers between 0 and 100"
+        return None
+
+    def query(self, serial: str, metrics: Optional[List[str]] = None, window: Optional[float] = None,
+              percentiles: Optional[List[float]] = None) -> Dict:
+        """latest/min/max/mean/percentiles per metric of a device over the last `window` seconds"""
+        series = self.series.get(serial)
+        if series is None:
+            return {"status": "error", "error": f"No telemetry for {serial}"}
+        error = self._invalid_query(metrics, window, percentiles)
+        if error:
+            return {"status": "error", "error": error}
+        return {
+            "status": "completed",
+            "serial": serial,
+            "samples": len(series),
+            "metrics": {
+                name: series.summary(name, window, percentiles or (50, 95, 99))
+                for name in metrics or METRICS
+            }
+        }
+
+    def stop(self):
+        self.running = False
+        if hasattr(self, "pool"):
+            self.pool.shutdown(wait=False)
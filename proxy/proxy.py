@@ -2,30 +2,188 @@ import time
 import signal
 import sys
 import os
+import uuid
 from typing import Optional
 
 # Sửa lại cách import
 from handlers.adb_handler import ADBHandler
 from handlers.api_handler import APIHandler
+from handlers.stream_handler import TaskStreamPublisher
+from handlers.telemetry_handler import TelemetrySampler
+from handlers.task_queue_handler import RedisTaskQueue
 from utils.logger import logger
+from utils.metrics import (
+    TASKS_RECEIVED,
+    TASKS_SKIPPED,
+    MAIN_LOOP_LAG_SECONDS,
+    RUNNING_TASKS,
+    OUTPUT_BYTES_BUFFERED,
+    OWNED_DEVICES,
+    CLUSTER_NODES,
+    TASK_STREAM_INFLIGHT,
+    start_metrics_server
+)
+from utils.tracing import tracer, configure_tracing
+from utils.dedupe import DedupeIndex, task_content_key
+from utils.scheduler import TaskScheduler
+from utils.admission import AdmissionController, HostSampler
+from utils.coordination import DeviceCoordinator, MemoryLeaseStore, RedisLeaseStore
+from utils.journal import TaskJournal, RUNNING
 from config.settings import (
     POLL_INTERVAL,
     ENABLE_TASK_MONITORING,
-    ENABLE_AUTO_RECONNECT
+    ENABLE_AUTO_RECONNECT,
+    ENABLE_OUTPUT_STREAMING,
+    ENABLE_METRICS,
+    METRICS_HOST,
+    METRICS_PORT,
+    ENABLE_TRACING,
+    TRACE_EXPORTER,
+    TRACE_SAMPLE_RATE,
+    TRACE_FILE,
+    TRACE_OTLP_ENDPOINT,
+    ENABLE_TASK_JOURNAL,
+    JOURNAL_PATH,
+    JOURNAL_BATCH_SIZE,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_RETENTION,
+    JOURNAL_PRUNE_INTERVAL,
+    SPOOL_CHECK_INTERVAL,
+    DEDUPE_CAPACITY,
+    DEDUPE_TTL,
+    DEDUPE_CONTENT_TTL,
+    MAX_CONCURRENT_TASKS,
+    PRIORITY_WEIGHTS,
+    PRIORITY_AGING,
+    INTERACTIVE_RESERVED_WORKERS,
+    ADB_SERVER_PORT,
+    ADMISSION_MIN_CONCURRENCY,
+    ADMISSION_CPU_HIGH,
+    ADMISSION_MEMORY_HIGH,
+    ADMISSION_LOAD_HIGH,
+    ADMISSION_ADB_LATENCY_HIGH,
+    ADMISSION_DECREASE_FACTOR,
+    ADMISSION_DECREASE_COOLDOWN,
+    ADMISSION_SAMPLE_INTERVAL,
+    ADMISSION_MAX_QUEUE,
+    ENABLE_ADMISSION_CONTROL,
+    BINARY_COMMANDS,
+    ENABLE_TELEMETRY,
+    COORDINATION_BACKEND,
+    COORDINATION_REDIS_URL,
+    COORDINATION_KEY_PREFIX,
+    NODE_ID,
+    LEASE_TTL,
+    LEASE_RENEW_INTERVAL,
+    HASH_RING_REPLICAS,
+    TASK_TRANSPORT,
+    DEFAULT_SERIAL
 )
 
 class ADBProxy:
     def __init__(self):
-        self.adb_handler = ADBHandler()
-        self.api_handler = APIHandler()
+        self.stream_publisher = TaskStreamPublisher() if ENABLE_OUTPUT_STREAMING else None
+        
+        # Replay the journal before accepting anything so re-delivered tasks are recognised
+        self.journal = None
+        self.pending_reports = []
+        if ENABLE_TASK_JOURNAL:
+            self.journal = TaskJournal(JOURNAL_PATH, JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_INTERVAL,
+                                       JOURNAL_RETENTION, JOURNAL_PRUNE_INTERVAL)
+            self.pending_reports = self.journal.replay()
+        
+        # Tasks already taken, so a task returned by several polls runs once
+        self.seen_tasks = DedupeIndex(DEDUPE_CAPACITY, DEDUPE_TTL)
+        self.seen_contents = DedupeIndex(DEDUPE_CAPACITY, DEDUPE_CONTENT_TTL)
+        
+        self.adb_handler = ADBHandler(publisher=self.stream_publisher, journal=self.journal)
+        self.api_handler = APIHandler(on_acknowledged=self.acknowledge)
+        self.task_queue = self.create_task_queue()
+        # Background task id -> stream entry, acked once the final status is delivered
+        self.stream_entries = {}
+        self.telemetry = TelemetrySampler() if ENABLE_TELEMETRY else None
+        
+        # Tasks run on a worker pool by priority class ("priority" field) and tenant
+        self.scheduler = TaskScheduler(
+            self.run_task,
+            workers=MAX_CONCURRENT_TASKS,
+            weights=PRIORITY_WEIGHTS,
+            aging=PRIORITY_AGING,
+            reserved=INTERACTIVE_RESERVED_WORKERS
+        )
+        
+        # Shrink the worker limit while the host (and its emulators) is saturated
+        self.admission = None
+        if ENABLE_ADMISSION_CONTROL:
+            self.admission = AdmissionController(
+                min_limit=ADMISSION_MIN_CONCURRENCY,
+                max_limit=MAX_CONCURRENT_TASKS,
+                cpu_high=ADMISSION_CPU_HIGH,
+                memory_high=ADMISSION_MEMORY_HIGH,
+                load_high=ADMISSION_LOAD_HIGH,
+                adb_latency_high=ADMISSION_ADB_LATENCY_HIGH,
+                decrease=ADMISSION_DECREASE_FACTOR,
+                cooldown=ADMISSION_DECREASE_COOLDOWN,
+                interval=ADMISSION_SAMPLE_INTERVAL,
+                sampler=HostSampler(ADB_SERVER_PORT)
+            )
+            self.admission.add_listener(self.scheduler.set_limit)
+        
+        # With several proxies on one fleet, each device is driven by the node holding its lease
+        self.coordinator = self.create_coordinator()
         self.running = True
         
+        # Gauges are computed when /metrics is scraped, not on the hot path
+        RUNNING_TASKS.set_function(lambda: sum(
+            1 for process in list(self.adb_handler.running_tasks.values()) if process.poll() is None
+        ))
+        OUTPUT_BYTES_BUFFERED.set_function(lambda: sum(
+            len(output) for output in list(self.adb_handler.task_outputs.values())
+        ))
+        if self.coordinator:
+            OWNED_DEVICES.set_function(lambda: len(self.coordinator.owned))
+            CLUSTER_NODES.set_function(lambda: len(self.coordinator.ring.nodes))
+        if self.task_queue:
+            TASK_STREAM_INFLIGHT.set_function(lambda: len(self.task_queue.inflight))
+        self.metrics_server = start_metrics_server(METRICS_HOST, METRICS_PORT) if ENABLE_METRICS else None
+        if ENABLE_TRACING:
+            configure_tracing(TRACE_EXPORTER, TRACE_SAMPLE_RATE, TRACE_FILE, TRACE_OTLP_ENDPOINT)
+        
         # Set up signal handlers
         signal.signal(signal.SIGTERM, self.handle_shutdown)
         signal.signal(signal.SIGINT, self.handle_shutdown)
         
         logger.info("ADB Proxy initialized successfully")
     
+    def create_task_queue(self) -> Optional[RedisTaskQueue]:
+        if TASK_TRANSPORT != "redis":
+            return None
+        try:
+            return RedisTaskQueue(NODE_ID, owns=self.owns_task)
+        except ImportError as e:
+            logger.warning(f"Redis task transport unavailable, polling the API: {e}")
+            return None
+    
+    def create_coordinator(self) -> Optional[DeviceCoordinator]:
+        if COORDINATION_BACKEND == "none":
+            return None
+        if COORDINATION_BACKEND == "memory":
+            store = MemoryLeaseStore()
+        else:
+            try:
+                store = RedisLeaseStore(COORDINATION_REDIS_URL, COORDINATION_KEY_PREFIX)
+            except ImportError as e:
+                logger.warning(f"Device sharding disabled: {e}")
+                return None
+        return DeviceCoordinator(
+            NODE_ID,
+            store,
+            lambda: self.adb_handler.check_device_status().get("devices", {}).keys(),
+            lease_ttl=LEASE_TTL,
+            renew_interval=LEASE_RENEW_INTERVAL,
+            replicas=HASH_RING_REPLICAS
+        )
+    
     def start(self):
         """Start the proxy service"""
         logger.info("Starting ADB Proxy service")
@@ -37,23 +195,47 @@ class ADBProxy:
                 return False
             
             # Main service loop
+            last_spool_check = time.monotonic()
+            last_maintenance = 0.0
             while self.running:
+                cycle_start = time.monotonic()
                 try:
+                    # Report tasks left unreported by the previous run
+                    if self.pending_reports:
+                        self.report_recovered_tasks()
+                    
+                    # Replay spooled results once the API answers health checks again
+                    if cycle_start - last_spool_check >= SPOOL_CHECK_INTERVAL:
+                        last_spool_check = cycle_start
+                        if self.api_handler.spool_pending():
+                            self.api_handler.healthcheck()
+                    
                     # Check for new tasks
-                    tasks = self.api_handler.get_pending_tasks()
+                    tasks = self.fetch_tasks()
+                    received_at = time.monotonic()
                     if tasks.get("status") == "success":
                         for task in tasks.get("tasks", []):
-                            self.handle_task(task)
-                    
-                    # Monitor running tasks if enabled
-                    if ENABLE_TASK_MONITORING:
-                        self.monitor_tasks()
+                            TASKS_RECEIVED.inc()
+                            self.handle_task(task, received_at)
                     
-                    # Auto-reconnect to devices if enabled
-                    if ENABLE_AUTO_RECONNECT:
-                        self.check_device_connections()
+                    # At most once per POLL_INTERVAL: a stream read returns as
+                    # soon as entries arrive, so cycles can be much shorter
+                    now = time.monotonic()
+                    if now - last_maintenance >= POLL_INTERVAL:
+                        last_maintenance = now
+                        
+                        # Monitor running tasks if enabled
+                        if ENABLE_TASK_MONITORING:
+                            self.monitor_tasks()
+                        
+                        # Auto-reconnect to devices if enabled
+                        if ENABLE_AUTO_RECONNECT:
+                            self.check_device_connections()
                     
-                    time.sleep(POLL_INTERVAL)
+                    if not self.task_queue:
+                        # The stream read already blocked for up to POLL_INTERVAL
+                        time.sleep(POLL_INTERVAL)
+                    MAIN_LOOP_LAG_SECONDS.observe(max(0.0, time.monotonic() - cycle_start - POLL_INTERVAL))
                     
                 except Exception as e:
                     logger.error(f"Error in main loop: {e}")
@@ -67,33 +249,258 @@ class ADBProxy:
             logger.error(f"Fatal error in proxy service: {e}")
             return False
     
-    def handle_task(self, task: dict):
-        """Handle a new task from API"""
+    def fetch_tasks(self) -> dict:
+        """New tasks from the Redis stream, or from the API when polling"""
+        if not self.task_queue:
+            return self.api_handler.get_pending_tasks()
+        if self.scheduler.depth() >= ADMISSION_MAX_QUEUE:
+            # Leave entries in the stream for other proxies instead of bouncing them,
+            # but keep those already taken from being claimed while they wait
+            try:
+                self.task_queue.keep_alive()
+            except Exception as e:
+                logger.error(f"Error keeping stream entries alive: {e}")
+            time.sleep(POLL_INTERVAL)
+            return {"status": "success", "tasks": []}
+        return self.task_queue.get_pending_tasks()
+    
+    def handle_task(self, task: dict, received_at: Optional[float] = None):
+        """Accept a new task from API and queue it for a worker"""
+        api_task_id = task.get("task_id")
+        command = task.get("command")
+        
+        if not command and "logcat_query" not in task and "telemetry_query" not in task:
+            logger.error(f"Invalid task received: {task}")
+            self.ack_entry(task)
+            return
+        
+        if self.scheduler.depth() >= ADMISSION_MAX_QUEUE:
+            # Not taken, so the API keeps it pending and offers it again later
+            logger.warning(f"Task queue full, leaving task {api_task_id} with the API")
+            TASKS_SKIPPED.inc(1, "queue_full")
+            self.requeue_entry(task)
+            return
+        
+        serial = task.get("emulator_serial") or DEFAULT_SERIAL
+        if self.coordinator and not self.coordinator.is_owner(serial):
+            # Left with the API, or handed to the node that owns the device
+            owner = self.coordinator.owner(serial)
+            logger.debug(f"Task {api_task_id} is for {serial}, owned by {owner}")
+            TASKS_SKIPPED.inc(1, "not_owner")
+            self.hand_off_entry(task, owner)
+            return
+        
+        if not self.take_task(task):
+            self.ack_entry(task)
+            return
+        
+        if self.journal and api_task_id and not self.journal.accept(api_task_id, task):
+            logger.info(f"Task {api_task_id} already journaled, skipping re-delivery")
+            TASKS_SKIPPED.inc(1, "journaled")
+            self.ack_entry(task)
+            return
+        
+        self.scheduler.submit(task, received_at, tenant=task.get("tenant"))
+    
+    def ack_entry(self, task: dict):
+        """Remove a task from this proxy's stream pending list"""
+        if self.task_queue and task.get("stream_id"):
+            self.task_queue.ack(task["stream_id"])
+    
+    def requeue_entry(self, task: dict):
+        """Hand a stream task back for another proxy"""
+        if self.task_queue and task.get("stream_id"):
+            self.task_queue.requeue(task)
+    
+    def hand_off_entry(self, task: dict, owner: Optional[str]):
+        """Pass a stream task to the proxy that owns its device"""
+        if self.task_queue and task.get("stream_id"):
+            self.task_queue.hand_off(task["stream_id"], owner)
+    
+    def owns_task(self, task: dict) -> bool:
+        """Whether this proxy may claim a stale stream task: its device is ours, or nobody's"""
+        if not self.coordinator:
+            return True
+        serial = task.get("emulator_serial") or DEFAULT_SERIAL
+        return self.coordinator.is_owner(serial) or self.coordinator.owner(serial) is None
+    
+    def delivery_ack(self, task_id: str, entry_id: Optional[str] = None, journaled: bool = True) -> Optional[dict]:
+        """What to acknowledge once the final result of a task reached the API, None if nothing"""
+        journaled = journaled and self.journal is not None
+        if not journaled and entry_id is None:
+            return None
+        return {"task_id": task_id, "stream_id": entry_id, "journaled": journaled}
+    
+    def acknowledge(self, ack: dict):
+        """Mark a task reported in the journal and ack its stream entry.
+        
+        Also called by the API handler when a retry or a spool replay delivers the result.
+        """
+        if ack.get("journaled") and self.journal:
+            self.journal.reported(ack["task_id"])
+        if ack.get("stream_id") and self.task_queue:
+            self.task_queue.ack(ack["stream_id"])
+    
+    def run_task(self, task: dict, received_at: Optional[float] = None):
+        """Execute a task and report its result; runs on a scheduler worker"""
+        try:
+            self.execute_task(task, received_at)
+        finally:
+            # Tasks that never spawned adb (queries, spawn failures) may be re-delivered
+            if self.journal and task.get("task_id"):
+                self.journal.release(task["task_id"])
+    
+    def execute_task(self, task: dict, received_at: Optional[float] = None):
+        """Answer a query task or run its adb command"""
         task_id = task.get("task_id")
+        api_task_id = task_id
         command = task.get("command")
         serial = task.get("emulator_serial")
         background = task.get("background", False)
         
-        if not command:
-            logger.error(f"Invalid task received: {task}")
+        if "logcat_query" in task:
+            self.answer_logcat_query(task)
+            return
+        if "telemetry_query" in task:
+            self.answer_telemetry_query(task)
             return
         
         try:
-            # Execute command
-            task_id, result = self.adb_handler.execute_command(
-                command=command,
-                serial=serial,
-                background=background
+            # Continue the trace started by the API when the payload carries one
+            span = tracer.start_span(
+                "proxy.handle_task",
+                trace_id=task.get("trace_id"),
+                traceparent=task.get("traceparent"),
+                attributes={
+                    "task.api_id": task_id or "",
+                    "task.type": command.split()[0],
+                    "task.priority": task.get("priority", "normal"),
+                    "task.background": background,
+                    "adb.serial": serial or ""
+                }
             )
+            if received_at is not None:
+                # Time spent behind earlier tasks and waiting for a worker
+                span.set_attribute("task.queue_wait_ms", (time.monotonic() - received_at) * 1000)
             
-            # Send initial result
-            self.api_handler.send_task_result(task_id, result)
-            
-            logger.info(f"Task {task_id} handled successfully")
-            
+            with span:
+                # A background task can finish, and be finalized by monitor_tasks,
+                # before execute_command returns: register its entry beforehand
+                task_id = str(uuid.uuid4())
+                entry_id = task.get("stream_id")
+                if background and entry_id:
+                    self.stream_entries[task_id] = entry_id
+                
+                # Execute command
+                task_id, result = self.adb_handler.execute_command(
+                    command=command,
+                    serial=serial,
+                    background=background,
+                    received_at=received_at,
+                    api_task_id=api_task_id,
+                    binary=task.get("binary", command.startswith(BINARY_COMMANDS)),
+                    logcat_filter=task.get("logcat_filter"),
+                    task_id=task_id
+                )
+                span.set_attribute("task.id", task_id)
+                
+                # Send initial result
+                final = result.get("status") in ("completed", "error")
+                if final:
+                    self.stream_entries.pop(task_id, None)
+                ack = self.delivery_ack(task_id, entry_id) if final else None
+                response = self.api_handler.send_task_result(task_id, result, ack=ack)
+                if ack and response.get("status") != "error":
+                    self.acknowledge(ack)
+                
+                logger.info(f"Task {task_id} handled successfully")
+                
         except Exception as e:
             logger.error(f"Error handling task: {e}")
             self.api_handler.send_error(str(e), context=task)
+            self.ack_entry(task)
+    
+    def answer_logcat_query(self, task: dict):
+        """Send buffered logcat records of a device matching the task's query.
+        
+        task["logcat_query"] takes since/until (epoch seconds), spec (logcat
+        filterspec), regex, level and limit.
+        """
+        query = task["logcat_query"] or {}
+        if not isinstance(query, dict):
+            result = {"status": "error", "error": "Invalid logcat query: expected an object"}
+        else:
+            try:
+                result = self.adb_handler.query_logcat(task.get("emulator_serial"), **query)
+            except Exception as e:
+                logger.error(f"Error answering logcat query: {e}")
+                result = {"status": "error", "error": str(e)}
+        task_id = task.get("task_id") or f"logcat-query-{int(time.time() * 1000)}"
+        self.send_answer(task, task_id, result)
+    
+    def answer_telemetry_query(self, task: dict):
+        """Send telemetry statistics of a device.
+        
+        task["telemetry_query"] takes metrics (names, default all), window
+        (seconds, default all history) and percentiles.
+        """
+        serial = task.get("emulator_serial") or DEFAULT_SERIAL
+        if self.telemetry is None or not self.telemetry.running:
+            result = {"status": "error", "error": "Device telemetry is disabled"}
+        elif not isinstance(task["telemetry_query"] or {}, dict):
+            result = {"status": "error", "error": "Invalid telemetry query: expected an object"}
+        else:
+            query = task["telemetry_query"] or {}
+            try:
+                result = self.telemetry.query(serial, query.get("metrics"), query.get("window"),
+                                              query.get("percentiles"))
+            except Exception as e:
+                logger.error(f"Error answering telemetry query: {e}")
+                result = {"status": "error", "error": str(e)}
+        task_id = task.get("task_id") or f"telemetry-query-{int(time.time() * 1000)}"
+        self.send_answer(task, task_id, result)
+    
+    def send_answer(self, task: dict, task_id: str, result: dict):
+        """Send the result of a query task, acking its stream entry once delivered"""
+        ack = self.delivery_ack(task_id, task.get("stream_id"), journaled=False)
+        response = self.api_handler.send_task_result(task_id, result, ack=ack)
+        if ack and response.get("status") != "error":
+            self.acknowledge(ack)
+    
+    def take_task(self, task: dict) -> bool:
+        """Claim a task for execution; False for duplicates and lost leases.
+        
+        Tasks are keyed on their API id, or on their content when they have
+        none. Leased tasks are acked before running; a lease the API rejects
+        or that expired while queued is left for the API to re-deliver.
+        """
+        api_task_id = task.get("task_id")
+        index = self.seen_tasks if api_task_id else self.seen_contents
+        key = api_task_id or task_content_key(task)
+        if not index.add(key):
+            logger.debug(f"Skipping duplicate delivery of task {key}")
+            TASKS_SKIPPED.inc(1, "duplicate")
+            return False
+        
+        lease_id = task.get("lease_id")
+        if not lease_id or not api_task_id:
+            return True
+        
+        expires_at = task.get("lease_expires_at")
+        if expires_at is not None and time.time() >= float(expires_at):
+            logger.warning(f"Lease of task {api_task_id} expired before it could run")
+            TASKS_SKIPPED.inc(1, "lease_expired")
+            index.discard(key)
+            return False
+        
+        response = self.api_handler.ack_task(api_task_id, lease_id)
+        if response.get("status") == "error" and not response.get("retry_queued"):
+            # The API answered and refused: the lease belongs to someone else now
+            logger.warning(f"Lease of task {api_task_id} rejected: {response.get('error')}")
+            TASKS_SKIPPED.inc(1, "lease_rejected")
+            index.discard(key)
+            return False
+        return True
     
     def monitor_tasks(self):
         """Monitor and update status of running tasks"""
@@ -102,15 +509,34 @@ class ADBProxy:
                 status = self.adb_handler.get_task_status(task_id)
                 
                 # Send status update to API
-                self.api_handler.update_task_status(task_id, status)
+                final = status["status"] in ["completed", "error"]
+                ack = self.delivery_ack(task_id, self.stream_entries.pop(task_id, None)) if final else None
+                response = self.api_handler.update_task_status(task_id, status, ack=ack)
                 
                 # Clean up completed tasks
-                if status["status"] in ["completed", "error"]:
+                if final:
+                    if ack and response.get("status") != "error":
+                        self.acknowledge(ack)
                     self.adb_handler.cleanup_task(task_id)
                     
             except Exception as e:
                 logger.error(f"Error monitoring task {task_id}: {e}")
     
+    def report_recovered_tasks(self):
+        """Send the final status of tasks interrupted or unreported before a restart"""
+        remaining = []
+        for record in self.pending_reports:
+            # Retried here on the next loop, not by the API handler's retry queue
+            response = self.api_handler.update_task_status(record.task_id, record.status_payload(), retry=False)
+            if response.get("status") == "error":
+                remaining.append(record)
+                continue
+            if record.state == RUNNING:
+                self.journal.finish(record.task_id, "error", -1)
+            self.journal.reported(record.task_id)
+            logger.info(f"Reported recovered task {record.api_task_id} ({record.task_id})")
+        self.pending_reports = remaining
+    
     def check_device_connections(self):
         """Check and maintain device connections"""
         try:
@@ -128,6 +554,11 @@ class ADBProxy:
         """Handle graceful shutdown"""
         logger.info("Shutting down ADB Proxy...")
         self.running = False
+        self.scheduler.stop()
+        if self.admission:
+            self.admission.stop()
+        if self.telemetry:
+            self.telemetry.stop()
         
         # Stop all running tasks
         for task_id in list(self.adb_handler.running_tasks.keys()):
@@ -135,6 +566,17 @@ class ADBProxy:
                 self.adb_handler.stop_task(task_id)
             except Exception as e:
                 logger.error(f"Error stopping task {task_id}: {e}")
+        if self.coordinator:
+            self.coordinator.stop()
+        
+        if self.stream_publisher:
+            self.stream_publisher.stop()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        tracer.shutdown()
+        self.api_handler.close()
+        if self.journal:
+            self.journal.close()
         
         logger.info("Shutdown complete")
         sys.exit(0)
@@ -0,0 +1,96 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.coordination import DeviceCoordinator, MemoryLeaseStore, is_host_serial, is_network_serial
+
+class IsNetworkSerialTest(unittest.TestCase):
+    def test_usb_and_loopback_serials_are_local(self):
+        for serial in ("emulator-5554", "R58M123ABC", "127.0.0.1:6555", "127.0.0.1:5555",
+                       "localhost:5555", "[::1]:5555"):
+            self.assertFalse(is_network_serial(serial), serial)
+
+    def test_remote_host_port_serials_are_network(self):
+        for serial in ("10.0.0.5:5555", "emu-host:5555", "[fd00::5]:5555"):
+            self.assertTrue(is_network_serial(serial), serial)
+
+    def test_only_loopback_and_emulator_serials_are_host_serials(self):
+        for serial in ("emulator-5554", "127.0.0.1:6555", "localhost:5555"):
+            self.assertTrue(is_host_serial(serial), serial)
+        for serial in ("R58M123ABC", "10.0.0.5:5555"):
+            self.assertFalse(is_host_serial(serial), serial)
+
+class DeviceCoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryLeaseStore()
+        self.devices = {"node-a": [], "node-b": []}
+        self.nodes = {}
+
+    def tearDown(self):
+        for node in self.nodes.values():
+            node.stop()
+
+    def start(self, node_id: str) -> DeviceCoordinator:
+        node = DeviceCoordinator(node_id, self.store, lambda: self.devices[node_id], renew_interval=3600)
+        self.nodes[node_id] = node
+        return node
+
+    def refresh(self):
+        # Twice: the first pass may only discover the other nodes
+        for _ in range(2):
+            for node in self.nodes.values():
+                node.refresh()
+
+    def test_usb_device_is_owned_by_its_lease_holder_on_every_node(self):
+        self.devices["node-a"] = ["R58M123ABC"]
+        a, b = self.start("node-a"), self.start("node-b")
+        self.refresh()
+
+        self.assertTrue(a.is_owner("R58M123ABC"))
+        self.assertFalse(b.is_owner("R58M123ABC"))
+        self.assertEqual(b.owner("R58M123ABC"), "node-a")
+
+    def test_unleased_usb_device_is_not_assigned_by_the_ring(self):
+        a, b = self.start("node-a"), self.start("node-b")
+        self.refresh()
+
+        self.assertIsNone(a.owner("R58M123ABC"))
+        self.assertFalse(a.is_owner("R58M123ABC") or b.is_owner("R58M123ABC"))
+
+    def test_loopback_device_is_owned_by_the_node_it_is_attached_to(self):
+        self.devices["node-b"] = ["127.0.0.1:6555"]
+        a, b = self.start("node-a"), self.start("node-b")
+        self.refresh()
+
+        self.assertIsNone(a.owner("127.0.0.1:6555"))
+        self.assertTrue(b.is_owner("127.0.0.1:6555"))
+
+    def test_local_emulators_with_the_same_serial_are_owned_by_each_node(self):
+        self.devices["node-a"] = ["127.0.0.1:6555", "emulator-5554"]
+        self.devices["node-b"] = ["127.0.0.1:6555", "emulator-5554"]
+        a, b = self.start("node-a"), self.start("node-b")
+        self.refresh()
+
+        for serial in ("127.0.0.1:6555", "emulator-5554"):
+            self.assertTrue(a.is_owner(serial), serial)
+            self.assertTrue(b.is_owner(serial), serial)
+        self.assertEqual(self.store.leases, {})
+
+    def test_network_device_has_exactly_one_owner(self):
+        a, b = self.start("node-a"), self.start("node-b")
+        for node in (a, b):
+            node.observe("10.0.0.5:5555")
+        self.refresh()
+
+        owners = {node.owner("10.0.0.5:5555") for node in (a, b)}
+        self.assertEqual(len(owners), 1)
+        self.assertEqual(self.store.owners(["10.0.0.5:5555"])["10.0.0.5:5555"], owners.pop())
+
+    def test_network_device_falls_back_to_the_ring_without_holder(self):
+        a = self.start("node-a")
+        self.assertEqual(a.owner("10.0.0.5:5555"), a.ring.lookup("10.0.0.5:5555"))
+
+if __name__ == "__main__":
+    unittest.main()
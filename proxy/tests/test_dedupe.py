@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dedupe import DedupeIndex, task_content_key
+
+class DedupeIndexTest(unittest.TestCase):
+    def test_key_is_seen_once_within_the_window(self):
+        index = DedupeIndex(capacity=10, ttl=60)
+        self.assertTrue(index.add("task-1"))
+        self.assertFalse(index.add("task-1"))
+        self.assertIn("task-1", index)
+
+    def test_oldest_key_is_evicted_beyond_capacity(self):
+        index = DedupeIndex(capacity=3, ttl=60)
+        for key in ("a", "b", "c", "d"):
+            self.assertTrue(index.add(key))
+
+        self.assertEqual(len(index), 3)
+        self.assertNotIn("a", index)
+        self.assertTrue(index.add("a"))
+        self.assertNotIn("b", index)
+
+    def test_expired_keys_are_dropped(self):
+        index = DedupeIndex(capacity=10, ttl=0.05)
+        index.add("a")
+        index.add("b")
+        time.sleep(0.1)
+
+        self.assertNotIn("a", index)
+        self.assertTrue(index.add("a"))
+        # adding expires everything older than the window from the front
+        self.assertEqual(list(index.entries), ["a"])
+
+    def test_discarded_key_is_processed_again(self):
+        index = DedupeIndex(capacity=10, ttl=60)
+        index.add("task-1")
+        index.discard("task-1")
+        index.discard("never-added")
+        self.assertTrue(index.add("task-1"))
+
+class TaskContentKeyTest(unittest.TestCase):
+    def test_same_content_has_the_same_key(self):
+        task = {"command": "shell getprop", "emulator_serial": "emulator-5554"}
+        self.assertEqual(task_content_key(task), task_content_key(dict(task, background=False)))
+
+    def test_key_depends_on_what_the_task_does(self):
+        task = {"command": "shell getprop", "emulator_serial": "emulator-5554"}
+        self.assertNotEqual(task_content_key(task), task_content_key(dict(task, emulator_serial="emulator-5556")))
+        self.assertNotEqual(task_content_key(task), task_content_key(dict(task, background=True)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.journal import FINISHED, REPORTED, RUNNING, TaskJournal
+
+class TaskJournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "journal.db")
+        self.journal = self.open()
+
+    def open(self, **kwargs) -> TaskJournal:
+        journal = TaskJournal(self.path, prune_interval=3600, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def reopen(self, **kwargs) -> TaskJournal:
+        self.journal.flush()
+        self.journal.close()
+        return self.open(**kwargs)
+
+    def run_task(self, api_task_id, task_id, output=("hello ", "world"), finish=True, report=True):
+        self.journal.accept(api_task_id, {"command": "shell echo", "emulator_serial": "emulator-5554"})
+        self.journal.start(api_task_id, task_id, pid=42)
+        offset = 0
+        for chunk in output:
+            self.journal.output(task_id, offset, chunk)
+            offset += len(chunk)
+        if finish:
+            self.journal.finish(task_id, "completed", 0)
+        if report:
+            self.journal.reported(task_id)
+
+    def test_accept_is_idempotent(self):
+        self.assertTrue(self.journal.accept("api-1", {"command": "shell echo"}))
+        self.assertFalse(self.journal.accept("api-1", {"command": "shell echo"}))
+
+    def test_released_task_is_accepted_again(self):
+        self.journal.accept("api-1", {"command": "shell echo"})
+        self.journal.release("api-1")
+        self.assertTrue(self.journal.accept("api-1", {"command": "shell echo"}))
+
+    def test_replay_reports_interrupted_and_unreported_tasks(self):
+        self.run_task("api-running", "task-1", finish=False, report=False)
+        self.run_task("api-finished", "task-2", report=False)
+        self.run_task("api-reported", "task-3")
+        self.journal.accept("api-accepted", {"command": "shell echo"})
+
+        journal = self.reopen()
+        pending = {record.api_task_id: record for record in journal.replay()}
+
+        self.assertEqual(set(pending), {"api-running", "api-finished"})
+        running = pending["api-running"]
+        self.assertEqual(running.state, RUNNING)
+        self.assertEqual(running.serial, "emulator-5554")
+        self.assertEqual(running.status_payload(), {
+            "status": "error",
+            "error": "Task interrupted by proxy restart",
+            "output": "hello world",
+            "exit_code": -1
+        })
+        self.assertEqual(pending["api-finished"].state, FINISHED)
+        self.assertEqual(pending["api-finished"].status_payload(),
+                         {"status": "completed", "output": "hello world", "exit_code": 0})
+
+        # reported tasks stay known (deduplicated) without their output; never started ones are forgotten
+        self.assertEqual(journal.lookup("api-reported").state, REPORTED)
+        self.assertEqual(journal.lookup("api-reported").output, [])
+        self.assertIsNone(journal.lookup("api-accepted"))
+        self.assertTrue(journal.accept("api-accepted", {"command": "shell echo"}))
+
+    def test_replayed_running_task_can_still_be_finished_and_reported(self):
+        self.run_task("api-1", "task-1", finish=False, report=False)
+        journal = self.reopen()
+        journal.replay()
+
+        journal.finish("task-1", "error", -1)
+        journal.reported("task-1")
+        self.assertEqual(journal.lookup("api-1").state, REPORTED)
+
+    def test_output_of_reported_tasks_is_compacted(self):
+        self.run_task("api-1", "task-1")
+        journal = self.reopen()
+        journal.replay()
+
+        events = [row[0] for row in journal.connection.execute(
+            "SELECT event FROM journal WHERE api_task_id = 'api-1' ORDER BY seq")]
+        self.assertEqual(events, ["accept", "start", "finish", "reported"])
+
+    def test_prune_drops_tasks_reported_before_the_retention(self):
+        self.journal.retention = 0.05
+        self.run_task("api-old", "task-1")
+        self.journal.accept("api-abandoned", {"command": "shell echo"})
+        self.journal.flush()
+        time.sleep(0.1)
+        self.run_task("api-new", "task-2")
+        self.journal.flush()
+
+        self.journal.prune()
+
+        self.assertIsNone(self.journal.lookup("api-old"))
+        self.assertIsNone(self.journal.lookup("api-abandoned"))
+        self.assertEqual(self.journal.lookup("api-new").state, REPORTED)
+        tasks = {row[0] for row in self.journal.connection.execute("SELECT DISTINCT api_task_id FROM journal")}
+        self.assertEqual(tasks, {"api-new"})
+
+    def test_replay_drops_tasks_reported_before_the_retention(self):
+        self.run_task("api-old", "task-1")
+        self.journal.flush()
+        time.sleep(0.1)
+        journal = self.reopen(retention=0.05)
+
+        self.assertEqual(journal.replay(), [])
+        self.assertIsNone(journal.lookup("api-old"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logcat import LogcatFilter, LogcatParser, LogcatRecord, LogcatStore, RingBuffer
+
+def record(ts: float, tag: str = "MyApp", level: str = "I", message: str = "hello") -> LogcatRecord:
+    return LogcatRecord(ts, 100, 101, level, tag, message)
+
+class LogcatParserTest(unittest.TestCase):
+    def test_parses_threadtime_lines(self):
+        parsed = LogcatParser().parse(
+            "03-17 16:13:47.413  1234  1250 W ActivityManager: Slow operation: 52ms\r\n")
+
+        expected = datetime(time.localtime().tm_year, 3, 17, 16, 13, 47).timestamp() + 0.413
+        self.assertAlmostEqual(parsed.ts, expected, places=3)
+        self.assertEqual((parsed.pid, parsed.tid, parsed.level), (1234, 1250, "W"))
+        self.assertEqual(parsed.tag, "ActivityManager")
+        self.assertEqual(parsed.message, "Slow operation: 52ms")
+
+    def test_tag_with_spaces_and_colons_in_message(self):
+        parsed = LogcatParser().parse("03-17 16:13:47.413  1234  1250 D My Tag  : key: value")
+        self.assertEqual(parsed.tag, "My Tag")
+        self.assertEqual(parsed.message, "key: value")
+
+    def test_other_lines_are_skipped(self):
+        parser = LogcatParser()
+        for line in ("--------- beginning of main", "", "03-17 16:13:47 broken line"):
+            self.assertIsNone(parser.parse(line), line)
+
+class LogcatFilterTest(unittest.TestCase):
+    def test_filterspec_levels_per_tag(self):
+        logcat_filter = LogcatFilter("ActivityManager:W MyApp:V *:S")
+
+        self.assertTrue(logcat_filter.matches(record(0, "ActivityManager", "E")))
+        self.assertFalse(logcat_filter.matches(record(0, "ActivityManager", "I")))
+        self.assertTrue(logcat_filter.matches(record(0, "MyApp", "V")))
+        self.assertFalse(logcat_filter.matches(record(0, "Other", "F")))
+
+    def test_other_tags_pass_at_the_default_level(self):
+        logcat_filter = LogcatFilter("MyApp:E", default_level="I")
+
+        self.assertFalse(logcat_filter.matches(record(0, "MyApp", "W")))
+        self.assertTrue(logcat_filter.matches(record(0, "Other", "I")))
+        self.assertFalse(logcat_filter.matches(record(0, "Other", "D")))
+
+    def test_message_regex(self):
+        logcat_filter = LogcatFilter(regex=r"crash|ANR")
+        self.assertTrue(logcat_filter.matches(record(0, message="ANR in com.example")))
+        self.assertFalse(logcat_filter.matches(record(0, message="all good")))
+
+    def test_invalid_filterspec_is_rejected(self):
+        for spec in ("MyApp", "MyApp:X", ":I"):
+            with self.assertRaises(ValueError, msg=spec):
+                LogcatFilter(spec)
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraps_keeping_the_newest_records(self):
+        buffer = RingBuffer(3)
+        for ts in range(5):
+            buffer.append(record(ts))
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual([item.ts for item in buffer.query()], [2, 3, 4])
+
+    def test_record_older_than_the_newest_is_dropped(self):
+        buffer = RingBuffer(3)
+        self.assertTrue(buffer.append(record(10)))
+        self.assertFalse(buffer.append(record(5)))
+        self.assertTrue(buffer.append(record(10)))
+        self.assertEqual([item.ts for item in buffer.query()], [10, 10])
+
+    def test_query_time_range_after_wrapping(self):
+        buffer = RingBuffer(4)
+        for ts in range(10):
+            buffer.append(record(ts, level="E" if ts % 2 else "D"))
+
+        self.assertEqual([item.ts for item in buffer.query(since=7, until=9)], [7, 8])
+        self.assertEqual([item.ts for item in buffer.query(since=0, limit=2)], [6, 7])
+        self.assertEqual([item.ts for item in buffer.query(record_filter=LogcatFilter("*:E"))], [7, 9])
+
+class LogcatStoreTest(unittest.TestCase):
+    def test_ingest_and_query_per_device(self):
+        store = LogcatStore(capacity=10)
+        store.ingest("emulator-5554", "03-17 16:13:47.413  1234  1250 E MyApp: boom")
+        store.ingest("emulator-5554", "--------- beginning of crash")
+        store.ingest("emulator-5556", "03-17 16:13:48.000  1234  1250 I MyApp: fine")
+
+        results = store.query("emulator-5554", spec="MyApp:E")
+        self.assertEqual([item["message"] for item in results], ["boom"])
+        self.assertEqual(store.stats(), {"emulator-5554": 1, "emulator-5556": 1})
+        self.assertEqual(store.query("unknown"), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.resilience import (BLOCKED, CLOSED, DELIVERED, FAILED, HALF_OPEN, OPEN, RETRY,
+                              CircuitBreaker, RetryQueue)
+
+class CircuitBreakerTest(unittest.TestCase):
+    def open_breaker(self, recovery_timeout: float = 0.05) -> CircuitBreaker:
+        breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=recovery_timeout)
+        breaker.record_failure()
+        breaker.record_failure()
+        return breaker
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+
+    def test_lets_a_single_probe_through_after_the_timeout(self):
+        breaker = self.open_breaker()
+        time.sleep(0.1)
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_successful_probe_closes(self):
+        breaker = self.open_breaker()
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        breaker = self.open_breaker()
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_released_probe_lets_another_through(self):
+        breaker = self.open_breaker()
+        time.sleep(0.1)
+        breaker.allow()
+        breaker.release_probe()
+
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+class RetryQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.outcomes = []
+        self.delivered = []
+        self.dropped = []
+
+    def deliver(self, request):
+        self.delivered.append(request["n"])
+        return self.outcomes.pop(0) if self.outcomes else DELIVERED
+
+    def start(self, **kwargs) -> RetryQueue:
+        queue = RetryQueue(self.deliver, base_delay=0.01, max_delay=0.01,
+                           on_drop=self.dropped.append, **kwargs)
+        self.addCleanup(queue.stop)
+        return queue
+
+    def request(self, n):
+        return {"method": "PUT", "endpoint": "/api/tasks/1", "n": n}
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Let a wrongly rescheduled request show up
+        time.sleep(0.05)
+
+    def test_newer_payload_supersedes_the_queued_one(self):
+        queue = self.start()
+        queue.submit("task-1", self.request(1), delay=0.1)
+        queue.submit("task-1", self.request(2), delay=0.1)
+        self.wait_for(lambda: self.delivered)
+
+        self.assertEqual(self.delivered, [2])
+
+    def test_retries_until_delivered(self):
+        self.outcomes = [RETRY, RETRY, DELIVERED]
+        queue = self.start(max_attempts=3)
+        queue.submit("task-1", self.request(1), delay=0)
+        self.wait_for(lambda: len(self.delivered) == 3)
+
+        self.assertEqual(self.delivered, [1, 1, 1])
+        self.assertEqual(self.dropped, [])
+
+    def test_gives_up_after_max_attempts(self):
+        self.outcomes = [RETRY, RETRY]
+        queue = self.start(max_attempts=2)
+        queue.submit("task-1", self.request(1), delay=0)
+        self.wait_for(lambda: self.dropped)
+
+        self.assertEqual(self.delivered, [1, 1])
+        self.assertEqual(self.dropped, [self.request(1)])
+
+    def test_rejected_request_is_not_retried(self):
+        self.outcomes = [FAILED]
+        queue = self.start()
+        queue.submit("task-1", self.request(1), delay=0)
+        self.wait_for(lambda: self.delivered)
+
+        self.assertEqual(self.delivered, [1])
+        self.assertEqual(self.dropped, [])
+
+    def test_blocked_request_is_dropped_when_on_drop_is_set(self):
+        self.outcomes = [BLOCKED]
+        queue = self.start()
+        queue.submit("task-1", self.request(1), delay=0)
+        self.wait_for(lambda: self.dropped)
+
+        self.assertEqual(self.dropped, [self.request(1)])
+
+    def test_overflow_is_dropped(self):
+        queue = self.start(max_size=1)
+        queue.submit("task-1", self.request(1), delay=60)
+        queue.submit("task-2", self.request(2), delay=60)
+
+        self.assertEqual(self.dropped, [self.request(2)])
+
+    def test_stop_returns_pending_requests_oldest_first(self):
+        queue = self.start()
+        queue.submit("task-1", self.request(1), delay=60)
+        queue.submit("task-2", self.request(2), delay=30)
+        queue.submit("task-1", self.request(3), delay=60)
+
+        self.assertEqual([request["n"] for request in queue.stop()], [2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
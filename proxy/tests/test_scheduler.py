@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scheduler import TaskScheduler
+
+class TaskSchedulerTest(unittest.TestCase):
+    """One worker held by a blocker task while the queue fills, then released"""
+
+    def setUp(self):
+        self.order = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.done = threading.Event()
+        self.expected = 0
+
+    def run_task(self, task, received_at):
+        if task["name"] == "blocker":
+            self.started.set()
+            self.release.wait(5)
+            return
+        self.order.append(task["name"])
+        if len(self.order) == self.expected:
+            self.done.set()
+
+    def schedule(self, tasks, aging=None, wait_before_release=0.0):
+        scheduler = TaskScheduler(self.run_task, workers=1, aging=aging)
+        self.addCleanup(scheduler.stop)
+        scheduler.submit({"name": "blocker", "priority": "interactive"})
+        self.assertTrue(self.started.wait(5))
+        self.expected = len(tasks)
+        for task in tasks:
+            scheduler.submit(task, tenant=task.get("tenant"))
+        time.sleep(wait_before_release)
+        self.release.set()
+        self.assertTrue(self.done.wait(5))
+        return self.order
+
+    def test_interactive_tasks_overtake_a_bulk_backlog(self):
+        tasks = [{"name": f"bulk-{n}", "priority": "bulk"} for n in range(4)]
+        tasks += [{"name": f"interactive-{n}", "priority": "interactive"} for n in range(4)]
+        order = self.schedule(tasks)
+        # bulk gets its single turn, then every interactive task runs first
+        self.assertEqual([name for name in order[:5] if name.startswith("interactive")],
+                         [f"interactive-{n}" for n in range(4)])
+
+    def test_weights_share_workers_between_classes(self):
+        tasks = [{"name": f"normal-{n}", "priority": "normal"} for n in range(8)]
+        tasks += [{"name": f"bulk-{n}", "priority": "bulk"} for n in range(8)]
+        order = self.schedule(tasks)
+        # normal has 4 times the weight of bulk: one bulk task per four normal ones
+        self.assertEqual(sum(name.startswith("bulk") for name in order[:5]), 1)
+
+    def test_tenants_within_a_class_are_served_round_robin(self):
+        order = self.schedule([
+            {"name": "a-1", "tenant": "a"},
+            {"name": "a-2", "tenant": "a"},
+            {"name": "a-3", "tenant": "a"},
+            {"name": "b-1", "tenant": "b"},
+        ])
+        self.assertEqual(order, ["a-1", "b-1", "a-2", "a-3"])
+
+    def test_aged_task_runs_next_regardless_of_weights(self):
+        order = self.schedule(
+            [{"name": "bulk", "priority": "bulk"}]
+            + [{"name": f"interactive-{n}", "priority": "interactive"} for n in range(3)],
+            aging={"bulk": 0.05},
+            wait_before_release=0.1
+        )
+        self.assertEqual(order[0], "bulk")
+
+    def test_unknown_priority_is_normal(self):
+        order = self.schedule([
+            {"name": "bulk", "priority": "bulk"},
+            {"name": "unknown", "priority": "urgent"},
+        ])
+        self.assertEqual(order, ["unknown", "bulk"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.spool import HEADER, Spool
+
+class SpoolTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open(self, **kwargs) -> Spool:
+        spool = Spool(self.directory, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def drain(self, spool: Spool, limit: int = 1000):
+        delivered = []
+        spool.replay(lambda record: delivered.append(record["n"]) is None, limit=limit)
+        return delivered
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def test_records_are_replayed_in_order_and_removed(self):
+        spool = self.open()
+        for n in range(5):
+            spool.append({"n": n})
+
+        self.assertEqual(self.drain(spool), [0, 1, 2, 3, 4])
+        self.assertTrue(spool.empty())
+        self.assertEqual(self.segments(), [])
+
+    def test_full_segment_rolls_over_to_a_new_one(self):
+        spool = self.open(segment_size=1)
+        for n in range(3):
+            spool.append({"n": n})
+
+        self.assertEqual(len(self.segments()), 3)
+        self.assertEqual(self.drain(spool), [0, 1, 2])
+
+    def test_rejected_record_stops_replay_and_is_delivered_again(self):
+        spool = self.open()
+        for n in range(3):
+            spool.append({"n": n})
+
+        delivered = []
+        def deliver(record):
+            if record["n"] == 1 and "rejected" not in delivered:
+                delivered.append("rejected")
+                return False
+            delivered.append(record["n"])
+            return True
+
+        self.assertEqual(spool.replay(deliver), 1)
+        self.assertEqual(spool.replay(deliver), 2)
+        self.assertEqual(delivered, [0, "rejected", 1, 2])
+
+    def test_cursor_resumes_a_partial_replay_after_reopen(self):
+        spool = self.open(segment_size=1 << 20)
+        for n in range(5):
+            spool.append({"n": n})
+        self.assertEqual(self.drain(spool, limit=2), [0, 1])
+        spool.close()
+
+        spool = self.open()
+        self.assertEqual(self.drain(spool), [2, 3, 4])
+
+    def test_corrupt_record_skips_the_rest_of_its_segment(self):
+        spool = self.open(segment_size=1 << 20)
+        spool.append({"n": 0})
+        spool.append({"n": 1})
+        spool.append({"n": 2})
+        spool.close()
+        name = self.segments()[0]
+        path = os.path.join(self.directory, name)
+        with open(path, "rb") as f:
+            data = bytearray(f.read())
+        # Flip the last payload byte of the second record
+        first = HEADER.size + HEADER.unpack_from(data)[0]
+        second = first + HEADER.size + HEADER.unpack_from(data, first)[0]
+        data[second - 1] ^= 0xFF
+        with open(path, "wb") as f:
+            f.write(data)
+
+        spool = self.open()
+        spool.append({"n": 3})
+        self.assertEqual(self.drain(spool), [0, 3])
+        self.assertNotIn(name, self.segments())
+
+    def test_torn_write_at_the_end_is_ignored(self):
+        spool = self.open()
+        spool.append({"n": 0})
+        spool.close()
+        with open(os.path.join(self.directory, self.segments()[0]), "ab") as f:
+            f.write(HEADER.pack(100, 0) + b"partial")
+
+        self.assertEqual(self.drain(self.open()), [0])
+
+    def test_oldest_segments_are_evicted_over_max_bytes(self):
+        spool = self.open(segment_size=1)
+        spool.append({"n": 0})
+        spool.max_bytes = 2 * os.path.getsize(os.path.join(self.directory, self.segments()[0]))
+        for n in range(1, 4):
+            spool.append({"n": n})
+
+        # Room for two one-record segments: the two oldest are dropped
+        self.assertEqual(self.drain(spool), [2, 3])
+
+if __name__ == "__main__":
+    unittest.main()
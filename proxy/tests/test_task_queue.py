@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from handlers import task_queue_handler
+from handlers.task_queue_handler import UNOWNED, RedisTaskQueue
+
+CLAIM_IDLE = 0.05
+
+@unittest.skipUnless(fakeredis, "fakeredis is not installed")
+class RedisTaskQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        for name, value in (("TASK_STREAM_CLAIM_IDLE", CLAIM_IDLE), ("TASK_STREAM_CLAIM_INTERVAL", 0),
+                            ("TASK_STREAM_MAX_DELIVERIES", 2)):
+            patcher = mock.patch.object(task_queue_handler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def node(self, consumer, owns=None) -> RedisTaskQueue:
+        client = fakeredis.FakeRedis(server=self.server, decode_responses=True)
+        return RedisTaskQueue(consumer, stream="tasks", group="proxies", client=client, owns=owns)
+
+    def poll(self, queue):
+        result = queue.get_pending_tasks(block=0.01)
+        self.assertEqual(result["status"], "success")
+        return result["tasks"]
+
+    def pending(self, queue):
+        return {entry["message_id"]: (entry["consumer"], entry["times_delivered"])
+                for entry in queue.redis.xpending_range("tasks", "proxies", "-", "+", 100)}
+
+    def dead_letters(self, queue):
+        return [fields for _, fields in queue.redis.xrange("tasks:dead")]
+
+    def test_task_stays_pending_until_acked(self):
+        a = self.node("node-a")
+        a.submit({"command": "devices"})
+
+        tasks = self.poll(a)
+        self.assertEqual([task["command"] for task in tasks], ["devices"])
+        entry_id = tasks[0]["stream_id"]
+        self.assertEqual(self.pending(a), {entry_id: ("node-a", 1)})
+
+        a.ack(entry_id)
+        self.assertEqual(self.pending(a), {})
+        self.assertEqual(a.inflight, {})
+
+    def test_unacked_tasks_are_recovered_after_restart(self):
+        a = self.node("node-a")
+        a.submit({"command": "devices"})
+        entry_id = self.poll(a)[0]["stream_id"]
+
+        restarted = self.node("node-a")
+        self.assertEqual([task["stream_id"] for task in self.poll(restarted)], [entry_id])
+        self.assertEqual(self.poll(restarted), [])
+
+    def test_owner_claims_the_entry_of_a_stopped_node(self):
+        a, b = self.node("node-a"), self.node("node-b")
+        a.submit({"command": "devices"})
+        entry_id = self.poll(a)[0]["stream_id"]
+        time.sleep(CLAIM_IDLE * 2)
+
+        self.assertEqual([task["stream_id"] for task in self.poll(b)], [entry_id])
+        self.assertEqual(self.pending(b), {entry_id: ("node-b", 2)})
+
+    def test_entries_of_devices_owned_elsewhere_are_not_claimed(self):
+        a = self.node("node-a")
+        b = self.node("node-b", owns=lambda task: task.get("emulator_serial") != "emulator-5554")
+        a.submit({"command": "shell ls", "emulator_serial": "emulator-5554"})
+        entry_id = self.poll(a)[0]["stream_id"]
+        time.sleep(CLAIM_IDLE * 2)
+
+        self.assertEqual(self.poll(b), [])
+        self.assertEqual(self.pending(b), {entry_id: ("node-a", 1)})
+
+    def test_keep_alive_stops_others_claiming_running_entries(self):
+        a, b = self.node("node-a"), self.node("node-b")
+        a.submit({"command": "devices"})
+        entry_id = self.poll(a)[0]["stream_id"]
+        time.sleep(CLAIM_IDLE * 2)
+
+        a.keep_alive()
+        self.assertEqual(self.poll(b), [])
+        self.assertEqual(self.pending(b)[entry_id][0], "node-a")
+
+    def test_entry_delivered_too_often_is_dead_lettered(self):
+        a, b, c = self.node("node-a"), self.node("node-b"), self.node("node-c")
+        a.submit({"command": "devices"})
+        entry_id = self.poll(a)[0]["stream_id"]
+        time.sleep(CLAIM_IDLE * 2)
+        self.assertEqual(len(self.poll(b)), 1)  # second delivery
+        time.sleep(CLAIM_IDLE * 2)
+
+        self.assertEqual(self.poll(c), [])
+        self.assertEqual(self.pending(c), {})
+        dead = self.dead_letters(c)
+        self.assertEqual(len(dead), 1)
+        self.assertEqual(dead[0]["source_id"], entry_id)
+        self.assertEqual(json.loads(dead[0]["task"]), {"command": "devices"})
+
+    def test_malformed_entry_is_dead_lettered(self):
+        a = self.node("node-a")
+        entry_id = a.redis.xadd("tasks", {"task": "{not json"})
+
+        self.assertEqual(self.poll(a), [])
+        self.assertEqual(self.pending(a), {})
+        self.assertEqual(self.dead_letters(a), [{"task": "{not json", "source_id": entry_id}])
+
+    def test_hand_off_to_the_owner_is_not_a_delivery(self):
+        a, b = self.node("node-a"), self.node("node-b")
+        a.submit({"command": "shell ls", "emulator_serial": "10.0.0.5:5555"})
+        entry_id = self.poll(a)[0]["stream_id"]
+        self.assertEqual(self.poll(b), [])  # node-b is up and done recovering
+
+        a.hand_off(entry_id, "node-b")
+        self.assertEqual(a.inflight, {})
+        self.assertEqual([task["stream_id"] for task in self.poll(b)], [entry_id])
+        self.assertEqual(self.pending(b), {entry_id: ("node-b", 1)})
+
+    def test_parked_entry_is_claimed_once_someone_owns_the_device(self):
+        a, b = self.node("node-a", owns=lambda task: False), self.node("node-b")
+        a.submit({"command": "shell ls", "emulator_serial": "10.0.0.5:5555"})
+        entry_id = self.poll(a)[0]["stream_id"]
+
+        a.hand_off(entry_id, None)
+        self.assertEqual(self.pending(a), {entry_id: (UNOWNED, 1)})
+        self.assertEqual(self.poll(a), [])
+        time.sleep(CLAIM_IDLE * 2)
+
+        self.assertEqual([task["stream_id"] for task in self.poll(b)], [entry_id])
+
+    def test_requeue_counts_redeliveries_and_dead_letters_past_the_limit(self):
+        a = self.node("node-a")
+        a.submit({"command": "devices"})
+        for _ in range(2):
+            task = self.poll(a)[0]
+            a.requeue(task)
+            self.assertEqual(self.pending(a), {})
+        task = self.poll(a)[0]
+        self.assertEqual(task["redeliveries"], 2)
+
+        a.requeue(task)
+        self.assertEqual(self.poll(a), [])
+        self.assertEqual(json.loads(self.dead_letters(a)[0]["task"])["redeliveries"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
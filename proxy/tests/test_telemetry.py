@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.telemetry_handler import TelemetrySampler, parse_cpu_times, parse_telemetry
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+OUTPUT = """@@battery
+Current Battery Service state:
+  AC powered: true
+  level: 87
+  temperature: 253
+@@meminfo
+MemTotal:        2048000 kB
+MemFree:          100000 kB
+MemAvailable:     512000 kB
+@@stat
+cpu  {cpu}
+@@loadavg
+1.25 0.80 0.50 2/512 4321
+@@boot
+1
+"""
+
+class ParseTelemetryTest(unittest.TestCase):
+    def test_parses_every_section(self):
+        sample, cpu = parse_telemetry(OUTPUT.format(cpu="100 0 100 700 100 0 0"))
+
+        self.assertEqual(sample["battery_level"], 87)
+        self.assertAlmostEqual(sample["battery_temp_c"], 25.3)
+        self.assertEqual(sample["mem_total_mb"], 2000)
+        self.assertEqual(sample["mem_available_mb"], 500)
+        self.assertAlmostEqual(sample["mem_used_pct"], 75)
+        self.assertEqual(sample["load1"], 1.25)
+        self.assertEqual(sample["boot_completed"], 1.0)
+        self.assertEqual(cpu, [100, 0, 100, 700, 100, 0, 0])
+        # CPU usage needs a previous sample
+        self.assertNotIn("cpu_pct", sample)
+
+    def test_cpu_usage_is_the_busy_share_since_the_previous_sample(self):
+        sample, _ = parse_telemetry(OUTPUT.format(cpu="200 0 200 1500 200 0 0"),
+                                    [100, 0, 100, 700, 100, 0, 0])
+        # 200 busy jiffies out of 1100, iowait counts as idle
+        self.assertAlmostEqual(sample["cpu_pct"], 100 * 200 / 1100)
+
+    def test_missing_and_malformed_sections_are_skipped(self):
+        sample, cpu = parse_telemetry("@@battery\nerror: device offline\n@@loadavg\nn/a\n@@boot\n\n")
+        self.assertEqual(sample, {})
+        self.assertIsNone(cpu)
+        self.assertIsNone(parse_cpu_times("intr 12345"))
+
+class InvalidQueryTest(unittest.TestCase):
+    def test_valid_queries(self):
+        self.assertIsNone(TelemetrySampler._invalid_query(None, None, None))
+        self.assertIsNone(TelemetrySampler._invalid_query(["cpu_pct"], 60, [50, 99.9]))
+
+    def test_invalid_queries(self):
+        for metrics, window, percentiles in (
+            ("cpu_pct", None, None),
+            (["cpu_pct", "gpu_pct"], None, None),
+            (None, 0, None),
+            (None, True, None),
+            (None, "60", None),
+            (None, None, [50, 101]),
+            (None, None, 95),
+        ):
+            self.assertIsNotNone(TelemetrySampler._invalid_query(metrics, window, percentiles),
+                                 (metrics, window, percentiles))
+
+@unittest.skipUnless(numpy, "numpy is not installed")
+class TimeSeriesRingTest(unittest.TestCase):
+    def setUp(self):
+        from utils.timeseries import TimeSeriesRing
+        self.ring = TimeSeriesRing(["cpu_pct", "load1"], 3)
+
+    def test_wraps_keeping_the_newest_samples_in_order(self):
+        now = time.time()
+        for n in range(5):
+            self.ring.append({"cpu_pct": n}, ts=now + n)
+
+        times, values = self.ring.window("cpu_pct")
+        self.assertEqual(len(self.ring), 3)
+        self.assertEqual(list(times), [now + 2, now + 3, now + 4])
+        self.assertEqual(list(values), [2, 3, 4])
+
+    def test_summary_ignores_missing_values(self):
+        now = time.time()
+        self.ring.append({"cpu_pct": 10, "load1": 1.0}, ts=now - 2)
+        self.ring.append({"cpu_pct": 30}, ts=now - 1)
+
+        summary = self.ring.summary("load1")
+        self.assertEqual(summary["count"], 1)
+        self.assertEqual(summary["latest"], 1.0)
+        summary = self.ring.summary("cpu_pct", percentiles=[50])
+        self.assertEqual((summary["min"], summary["max"], summary["mean"], summary["p50"]), (10, 30, 20, 20))
+
+    def test_window_keeps_recent_samples(self):
+        now = time.time()
+        self.ring.append({"cpu_pct": 10}, ts=now - 100)
+        self.ring.append({"cpu_pct": 30}, ts=now)
+
+        self.assertEqual(self.ring.summary("cpu_pct", seconds=10)["count"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tracing import Tracer, parse_traceparent, valid_id
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+    def shutdown(self):
+        pass
+
+class ParseTraceparentTest(unittest.TestCase):
+    def test_valid_header(self):
+        self.assertEqual(parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-01"), (TRACE_ID, SPAN_ID, True))
+        self.assertEqual(parse_traceparent(f" 00-{TRACE_ID.upper()}-{SPAN_ID}-00 "), (TRACE_ID, SPAN_ID, False))
+
+    def test_invalid_headers(self):
+        for header in (
+            None,
+            "",
+            42,
+            f"00-{TRACE_ID}-{SPAN_ID}",
+            f"00-{TRACE_ID}-{SPAN_ID}-01-extra",
+            f"00-{'0' * 32}-{SPAN_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",
+            f"00-{TRACE_ID[:-1]}g-{SPAN_ID}-01",
+            f"00-{TRACE_ID}-{SPAN_ID}-1",
+            f"00-{TRACE_ID}-{SPAN_ID}-zz",
+        ):
+            self.assertIsNone(parse_traceparent(header), header)
+
+    def test_valid_id(self):
+        self.assertTrue(valid_id(SPAN_ID, 16))
+        self.assertFalse(valid_id(SPAN_ID, 32))
+        self.assertFalse(valid_id(SPAN_ID.upper(), 16))
+        self.assertFalse(valid_id("0" * 16, 16))
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.exporter = CollectingExporter()
+        self.tracer = Tracer(self.exporter, sample_rate=1.0)
+
+    def test_remote_parent_is_continued(self):
+        span = self.tracer.start_span("task", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-01")
+        self.assertEqual((span.trace_id, span.parent_id, span.sampled), (TRACE_ID, SPAN_ID, True))
+
+    def test_dashed_trace_id_is_normalized(self):
+        dashed = "4BF92F35-77B3-4DA6-A3CE-929D0E0E4736"
+        self.assertEqual(self.tracer.start_span("task", trace_id=dashed).trace_id, TRACE_ID)
+
+    def test_malformed_trace_id_starts_a_new_trace(self):
+        for trace_id in ("not-a-trace", "0" * 32, 12345, TRACE_ID + "00"):
+            span = self.tracer.start_span("task", trace_id=trace_id)
+            self.assertTrue(valid_id(span.trace_id, 32), trace_id)
+            self.assertIsNone(span.parent_id)
+
+    def test_child_spans_share_the_trace_and_are_exported(self):
+        with self.tracer.start_span("root") as root:
+            with self.tracer.start_span("child") as child:
+                headers = self.tracer.inject()
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual(headers["traceparent"], f"00-{root.trace_id}-{child.span_id}-01")
+        self.assertEqual([span["name"] for span in self.exporter.spans], ["child", "root"])
+        self.assertEqual(self.tracer.inject(), {})
+
+    def test_error_is_recorded_on_the_span(self):
+        with self.assertRaises(RuntimeError):
+            with self.tracer.start_span("task"):
+                raise RuntimeError("boom")
+        self.assertEqual(self.exporter.spans[0]["status"], "error")
+        self.assertEqual(self.exporter.spans[0]["attributes"]["error"], "boom")
+
+    def test_unsampled_traces_are_not_exported(self):
+        tracer = Tracer(self.exporter, sample_rate=0.0)
+        with tracer.start_span("task"):
+            pass
+        with tracer.start_span("task", traceparent=f"00-{TRACE_ID}-{SPAN_ID}-00"):
+            pass
+        self.assertEqual(self.exporter.spans, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+# Attributes recorded in milliseconds that are part of the breakdown
+BREAKDOWN_ATTRIBUTES = {
+    "task.queue_wait_ms": "queue wait",
+    "adb.spawn_ms": "adb spawn",
+    "adb.first_byte_ms": "first byte"
+}
+
+def load_spans(path: str) -> Dict[str, List[Dict]]:
+    """Read exported spans and group them by trace id"""
+    traces = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            traces[span["trace_id"]].append(span)
+    return traces
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def breakdown(traces: Dict[str, List[Dict]]) -> Dict[str, Dict[str, List[float]]]:
+    """Collect durations per task type and span name / breakdown attribute"""
+    result = defaultdict(lambda: defaultdict(list))
+    for spans in traces.values():
+        root = next((span for span in spans if span["name"] == "proxy.handle_task"), None)
+        if root is None:
+            continue
+        task_type = root["attributes"].get("task.type", "unknown")
+        for span in spans:
+            result[task_type][span["name"]].append(span["duration_ms"])
+            for key, label in BREAKDOWN_ATTRIBUTES.items():
+                if key in span["attributes"]:
+                    result[task_type][label].append(float(span["attributes"][key]))
+    return result
+
+def render(result: Dict[str, Dict[str, List[float]]]) -> str:
+    lines = []
+    for task_type in sorted(result):
+        rows = result[task_type]
+        count = len(rows.get("proxy.handle_task", []))
+        lines.append(f"{task_type} ({count} tasks)")
+        lines.append(f"  {'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+        for name, values in sorted(rows.items(), key=lambda item: -percentile(item[1], 50)):
+            lines.append(
+                f"  {name:<28}{len(values):>7}{percentile(values, 50):>10.1f}"
+                f"{percentile(values, 95):>10.1f}{max(values):>10.1f}"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency breakdown per task type from exported spans")
+    parser.add_argument("path", nargs="?", default="logs/traces.jsonl", help="JSONL span file")
+    parser.add_argument("--type", dest="task_type", help="Only show this task type (adb subcommand)")
+    parser.add_argument("--json", action="store_true", help="Print percentiles as JSON")
+    args = parser.parse_args()
+
+    try:
+        result = breakdown(load_spans(args.path))
+    except FileNotFoundError:
+        print(f"No span file at {args.path}", file=sys.stderr)
+        return 1
+    if args.task_type:
+        result = {k: v for k, v in result.items() if k == args.task_type}
+
+    if args.json:
+        print(json.dumps({
+            task_type: {
+                name: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+                for name, values in rows.items()
+            }
+            for task_type, rows in result.items()
+        }, indent=2))
+    else:
+        print(render(result) or "No traced tasks found")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
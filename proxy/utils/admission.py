@@ -0,0 +1,137 @@
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import ADMISSION_LIMIT, HOST_SATURATED
+
+class HostSampler:
+    """Sample CPU, memory, load average and adb server responsiveness"""
+
+    def __init__(self, adb_port: int = 5037):
+        self.adb_port = adb_port
+        self.cpu_count = os.cpu_count() or 1
+        try:
+            import psutil
+            self.psutil = psutil
+            psutil.cpu_percent(interval=None)  # first call only sets the baseline
+        except ImportError as e:
+            logger.warning(f"Host CPU/memory sampling disabled: {e}")
+            self.psutil = None
+
+    def adb_latency(self) -> Optional[float]:
+        """Round trip of host:version to the adb server; None if it is not running"""
+        started = time.monotonic()
+        try:
+            with socket.create_connection(("127.0.0.1", self.adb_port), timeout=2) as conn:
+                conn.sendall(b"000chost:version")
+                if conn.recv(4) != b"OKAY":
+                    return None
+        except socket.timeout:
+            return 2.0
+        except OSError:
+            return None
+        return time.monotonic() - started
+
+    def sample(self) -> Dict:
+        sample = {"cpu": None, "memory": None, "load": None, "adb_latency": self.adb_latency()}
+        if self.psutil is not None:
+            sample["cpu"] = self.psutil.cpu_percent(interval=None)
+            sample["memory"] = self.psutil.virtual_memory().percent
+        if hasattr(os, "getloadavg"):
+            sample["load"] = os.getloadavg()[0] / self.cpu_count
+        return sample
+
+class AdmissionController:
+    """AIMD concurrency limit driven by host load.
+
+    Every `interval` seconds the host is sampled. When any signal is over its
+    threshold the limit is multiplied by `decrease` (never below `min_limit`),
+    at most once per `cooldown` seconds so a sustained spike does not collapse
+    it before the previous decrease took effect; otherwise it grows by one up
+    to `max_limit`. Listeners are called with the new limit whenever it changes.
+
+    flask-proxy/app/utils/admission.py applies the same AIMD rule as a blocking
+    per-request semaphore inside that service; the two services are deployed
+    separately and share no package, so changes to the rule go to both.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 10,
+        cpu_high: float = 85,
+        memory_high: float = 90,
+        load_high: float = 1.5,
+        adb_latency_high: float = 0.5,
+        decrease: float = 0.7,
+        cooldown: float = 5,
+        interval: float = 1,
+        sampler: Optional[HostSampler] = None
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.thresholds = {"cpu": cpu_high, "memory": memory_high, "load": load_high,
+                           "adb_latency": adb_latency_high}
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.last_decrease = float("-inf")
+        self.interval = interval
+        self.sampler = sampler or HostSampler()
+        self.limit = max_limit
+        self.last_sample: Dict = {}
+        self.listeners: List[Callable[[int], None]] = []
+        self.running = True
+        ADMISSION_LIMIT.set(self.limit)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add_listener(self, listener: Callable[[int], None]):
+        self.listeners.append(listener)
+        listener(self.limit)
+
+    def saturated(self, sample: Dict) -> List[str]:
+        """Signals over their threshold"""
+        return [name for name, high in self.thresholds.items()
+                if sample.get(name) is not None and sample[name] >= high]
+
+    def update(self, sample: Dict) -> int:
+        self.last_sample = sample
+        over = self.saturated(sample)
+        if over:
+            now = time.monotonic()
+            limit = self.limit
+            if now - self.last_decrease >= self.cooldown:
+                self.last_decrease = now
+                limit = max(self.min_limit, int(self.limit * self.decrease))
+            for name in over:
+                HOST_SATURATED.inc(1, name)
+        else:
+            limit = min(self.max_limit, self.limit + 1)
+        if limit != self.limit:
+            logger.info(f"Concurrency limit {self.limit} -> {limit}" + (f" (saturated: {', '.join(over)})" if over else ""))
+            self.limit = limit
+            ADMISSION_LIMIT.set(limit)
+            for listener in self.listeners:
+                listener(limit)
+        return limit
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.update(self.sampler.sample())
+            except Exception as e:
+                logger.error(f"Error sampling host load: {e}")
+
+    def retry_after(self) -> float:
+        """Seconds after which a rejected caller should try again"""
+        return self.interval * 2
+
+    def stats(self) -> Dict:
+        return {"limit": self.limit, "sample": self.last_sample}
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,292 @@
+import bisect
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from utils.logger import logger
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+LOOPBACK_HOSTS = ("localhost", "::1")
+
+def is_network_serial(serial: str) -> bool:
+    """Emulators reached over TCP (host:port) can be driven from any node.
+
+    Loopback addresses (127.0.0.1:6555, localhost:5555) only reach the host
+    the proxy runs on, so they are attached locally like USB serials.
+    """
+    host, separator, _ = serial.rpartition(":")
+    if not separator:
+        return False
+    host = host.strip("[]")
+    return host not in LOOPBACK_HOSTS and not host.startswith("127.")
+
+def is_host_serial(serial: str) -> bool:
+    """Serials naming a different device on every host: loopback host:port and emulator-<port>.
+
+    They are never leased, a node owns them while they are attached to it.
+    Hardware USB serials are unique, so their lease tells other nodes where
+    the device is attached.
+    """
+    return serial.startswith("emulator-") or (":" in serial and not is_network_serial(serial))
+
+class HashRing:
+    """Consistent hash ring of node ids with `replicas` virtual points per node"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self.keys = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def lookup(self, key: str) -> Optional[str]:
+        if not self.keys:
+            return None
+        index = bisect.bisect(self.keys, _hash(key)) % len(self.keys)
+        return self.owners[index]
+
+class MemoryLeaseStore:
+    """In-process lease store with the semantics of RedisLeaseStore.
+
+    For a single proxy, and for exercising the coordinator without Redis: several
+    DeviceCoordinator instances sharing one store behave like several nodes.
+    """
+
+    def __init__(self):
+        self.leases: Dict[str, tuple] = {}  # serial -> (node, expires_at)
+        self.members: Dict[str, float] = {}  # node -> expires_at
+        self.lock = threading.Lock()
+
+    def heartbeat(self, node: str, ttl: float):
+        with self.lock:
+            self.members[node] = time.time() + ttl
+
+    def leave(self, node: str):
+        with self.lock:
+            self.members.pop(node, None)
+
+    def nodes(self) -> List[str]:
+        now = time.time()
+        with self.lock:
+            return sorted(node for node, expires in self.members.items() if expires > now)
+
+    def acquire(self, serial: str, node: str, ttl: float) -> bool:
+        """Take or renew the lease of `serial`; False if another node holds it"""
+        now = time.time()
+        with self.lock:
+            holder = self.leases.get(serial)
+            if holder is not None and holder[1] > now and holder[0] != node:
+                return False
+            self.leases[serial] = (node, now + ttl)
+            return True
+
+    def release(self, serial: str, node: str):
+        with self.lock:
+            holder = self.leases.get(serial)
+            if holder is not None and holder[0] == node:
+                del self.leases[serial]
+
+    def owners(self, serials: List[str]) -> Dict[str, Optional[str]]:
+        now = time.time()
+        with self.lock:
+            result = {}
+            for serial in serials:
+                holder = self.leases.get(serial)
+                result[serial] = holder[0] if holder is not None and holder[1] > now else None
+            return result
+
+# Renew our own lease or take a free one, atomically
+ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not holder then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisLeaseStore:
+    """Leases as `<prefix>lease:<serial>` keys holding the node id with a PX expiry.
+
+    Live nodes are members of the `<prefix>nodes` sorted set scored by the time
+    their heartbeat expires.
+    """
+
+    def __init__(self, url: str, prefix: str = "adbproxy:"):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.nodes_key = f"{prefix}nodes"
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+        self.release_script = self.client.register_script(RELEASE_SCRIPT)
+
+    def _lease_key(self, serial: str) -> str:
+        return f"{self.prefix}lease:{serial}"
+
+    def heartbeat(self, node: str, ttl: float):
+        now_ms = int(time.time() * 1000)
+        pipe = self.client.pipeline()
+        pipe.zadd(self.nodes_key, {node: now_ms + int(ttl * 1000)})
+        pipe.zremrangebyscore(self.nodes_key, "-inf", now_ms)
+        pipe.execute()
+
+    def leave(self, node: str):
+        self.client.zrem(self.nodes_key, node)
+
+    def nodes(self) -> List[str]:
+        return sorted(self.client.zrangebyscore(self.nodes_key, int(time.time() * 1000), "+inf"))
+
+    def acquire(self, serial: str, node: str, ttl: float) -> bool:
+        return bool(self.acquire_script(keys=[self._lease_key(serial)], args=[node, int(ttl * 1000)]))
+
+    def release(self, serial: str, node: str):
+        self.release_script(keys=[self._lease_key(serial)], args=[node])
+
+    def owners(self, serials: List[str]) -> Dict[str, Optional[str]]:
+        if not serials:
+            return {}
+        return dict(zip(serials, self.client.mget([self._lease_key(serial) for serial in serials])))
+
+class DeviceCoordinator:
+    """Decide which proxy node drives each device, using renewable leases.
+
+    Devices attached to this host by USB are leased by this node; local
+    emulators (emulator-5554, 127.0.0.1:6555) are owned by every node they are
+    attached to, without a lease. Network emulators (host:port) are assigned by
+    a consistent hash ring of the live nodes, so a node joining or leaving only
+    moves its share of them: a node that stops being the ring owner releases
+    the lease and the new owner takes it on its next cycle. Tasks are only
+    taken by the lease holder, or, while a network emulator has no holder, by
+    its ring owner.
+    """
+
+    def __init__(
+        self,
+        node_id: str,
+        store,
+        list_devices: Callable[[], Iterable[str]],
+        lease_ttl: float = 15,
+        renew_interval: float = 5,
+        replicas: int = 64
+    ):
+        self.node_id = node_id
+        self.store = store
+        self.list_devices = list_devices
+        self.lease_ttl = lease_ttl
+        self.renew_interval = renew_interval
+        self.replicas = replicas
+        self.ring = HashRing([node_id], replicas)
+        self.known: Set[str] = set()  # serials seen in tasks or adb devices
+        self.local: Set[str] = set()
+        self.owned: Set[str] = set()
+        self.holders: Dict[str, Optional[str]] = {}
+        self.lock = threading.Lock()
+        self.running = True
+        self._refresh()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def observe(self, serial: str):
+        """Track a serial so its lease holder is looked up (and its lease maintained)"""
+        if serial not in self.known:
+            with self.lock:
+                self.known.add(serial)
+
+    def preferred(self, serial: str) -> Optional[str]:
+        """Node that should hold the lease; None for a device attached to another host"""
+        if serial in self.local:
+            return self.node_id
+        if is_network_serial(serial):
+            return self.ring.lookup(serial)
+        return None
+
+    def holder(self, serial: str) -> Optional[str]:
+        """Node holding the lease of `serial`, looked up now if it was not tracked yet"""
+        holders = self.holders
+        if serial not in holders:
+            try:
+                self.holders = holders = {**holders, **self.store.owners([serial])}
+            except Exception as e:
+                logger.error(f"Error looking up the lease of {serial}: {e}")
+        return holders.get(serial)
+
+    def owner(self, serial: str) -> Optional[str]:
+        """Node that should run tasks for `serial`"""
+        if is_host_serial(serial):
+            return self.preferred(serial)
+        return self.holder(serial) or self.preferred(serial)
+
+    def is_owner(self, serial: str) -> bool:
+        self.observe(serial)
+        return self.owner(serial) == self.node_id
+
+    def refresh(self):
+        self.store.heartbeat(self.node_id, self.lease_ttl)
+        nodes = self.store.nodes()
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        if sorted(nodes) != self.ring.nodes:
+            joined = set(nodes) - set(self.ring.nodes)
+            left = set(self.ring.nodes) - set(nodes)
+            logger.info(f"Proxy nodes changed: joined {sorted(joined)}, left {sorted(left)}")
+            self.ring = HashRing(nodes, self.replicas)
+
+        local = set()
+        for serial in self.list_devices():
+            self.observe(serial)
+            if not is_network_serial(serial):
+                local.add(serial)
+        self.local = local
+
+        with self.lock:
+            serials = sorted(serial for serial in self.known | local if not is_host_serial(serial))
+        owned = {serial for serial in local if is_host_serial(serial)}
+        for serial in serials:
+            if self.preferred(serial) == self.node_id:
+                if self.store.acquire(serial, self.node_id, self.lease_ttl):
+                    owned.add(serial)
+            elif serial in self.owned:
+                # Rebalanced away or detached: let the new owner take it
+                self.store.release(serial, self.node_id)
+                logger.info(f"Released device {serial} to {self.preferred(serial) or 'its host'}")
+        self.owned = owned
+        self.holders = self.store.owners(serials)
+
+    def _refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing device leases: {e}")
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.renew_interval)
+            self._refresh()
+
+    def stats(self) -> Dict:
+        return {"node": self.node_id, "nodes": self.ring.nodes, "owned": sorted(self.owned)}
+
+    def stop(self):
+        """Release every lease so other nodes can take the devices over immediately"""
+        self.running = False
+        try:
+            for serial in list(self.owned):
+                if not is_host_serial(serial):
+                    self.store.release(serial, self.node_id)
+            self.store.leave(self.node_id)
+        except Exception as e:
+            logger.error(f"Error releasing device leases: {e}")
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+class DedupeIndex:
+    """Bounded, time-windowed set of keys already seen (LRU + TTL).
+
+    A key counts as seen for `ttl` seconds after it was first added. Entries are
+    kept in insertion order, so expired ones and, beyond `capacity`, the oldest
+    ones are evicted from the front; every operation is O(1) amortized.
+    """
+
+    def __init__(self, capacity: int = 100000, ttl: float = 3600):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _expire(self, now: float):
+        entries = self.entries
+        while entries:
+            key, added = next(iter(entries.items()))
+            if now - added < self.ttl:
+                break
+            entries.popitem(last=False)
+
+    def add(self, key: str) -> bool:
+        """Record `key`; False if it was already seen within the window"""
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            if key in self.entries:
+                return False
+            self.entries[key] = now
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return True
+
+    def discard(self, key: str):
+        """Forget `key` so a re-delivery is processed again"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            added = self.entries.get(key)
+            return added is not None and time.monotonic() - added < self.ttl
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def task_content_key(task: Dict) -> str:
+    """Hash of what a task does, for tasks delivered without an id"""
+    content = json.dumps([
+        task.get("command"),
+        task.get("emulator_serial"),
+        bool(task.get("background", False)),
+        task.get("logcat_query"),
+        task.get("telemetry_query")
+    ], sort_keys=True)
+    return "sha1:" + hashlib.sha1(content.encode()).hexdigest()
@@ -0,0 +1,335 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    event TEXT NOT NULL,
+    api_task_id TEXT NOT NULL,
+    task_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_journal_api_task ON journal(api_task_id);
+"""
+
+# Task states folded from journal events
+ACCEPTED = "accepted"
+RUNNING = "running"
+FINISHED = "finished"
+REPORTED = "reported"
+
+class JournalRecord:
+    """State of one API task rebuilt from its journal events"""
+
+    __slots__ = ("api_task_id", "task_id", "state", "status", "exit_code",
+                 "command", "serial", "background", "output", "updated")
+
+    def __init__(self, api_task_id: str):
+        self.api_task_id = api_task_id
+        self.task_id: Optional[str] = None
+        self.state = ACCEPTED
+        self.status: Optional[str] = None
+        self.exit_code: Optional[int] = None
+        self.command = ""
+        self.serial: Optional[str] = None
+        self.background = False
+        self.output: List[str] = []
+        self.updated = 0.0
+
+    def status_payload(self) -> Dict:
+        """Status update to report for this task after a restart"""
+        output = "".join(self.output)
+        if self.state == RUNNING:
+            return {
+                "status": "error",
+                "error": "Task interrupted by proxy restart",
+                "output": output,
+                "exit_code": -1
+            }
+        return {"status": self.status, "output": output, "exit_code": self.exit_code}
+
+class TaskJournal:
+    """Append-only SQLite (WAL) journal of task accept/start/output/finish/report events.
+
+    Events are queued and written by a single thread that commits each batch in
+    one transaction (group commit). start() waits for its batch to commit so an
+    adb command is never running without a durable record of it. The same
+    thread prunes tasks reported longer than `retention` ago every
+    `prune_interval` seconds.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.01,
+                 retention: float = 86400, prune_interval: float = 300):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.last_prune = time.monotonic()
+        self.reported_since_prune: List[str] = []
+        self.queue: queue.Queue = queue.Queue()
+        self.records: Dict[str, JournalRecord] = {}
+        self.task_index: Dict[str, str] = {}  # local task_id -> api_task_id
+        self.lock = threading.Lock()
+        self.written = 0
+        self.commits = 0
+        self.running = True
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Recording
+
+    def accept(self, api_task_id: str, task: Dict) -> bool:
+        """Record a task received from the API; False if it is already journaled"""
+        with self.lock:
+            if api_task_id in self.records:
+                return False
+            record = JournalRecord(api_task_id)
+            record.command = task.get("command", "")
+            record.serial = task.get("emulator_serial")
+            record.background = bool(task.get("background", False))
+            record.updated = time.time()
+            self.records[api_task_id] = record
+        self._append("accept", api_task_id, None, {
+            "command": record.command,
+            "serial": record.serial,
+            "background": record.background
+        })
+        return True
+
+    def start(self, api_task_id: str, task_id: str, pid: Optional[int] = None):
+        """Record that adb was spawned for the task; blocks until committed"""
+        with self.lock:
+            record = self.records.get(api_task_id)
+            if record is None:
+                return
+            record.task_id = task_id
+            record.state = RUNNING
+            record.updated = time.time()
+            self.task_index[task_id] = api_task_id
+        done = threading.Event()
+        self._append("start", api_task_id, task_id, {"pid": pid}, done)
+        done.wait(5)
+
+    def output(self, task_id: str, offset: int, chunk: str):
+        """Record output produced from `offset` (characters) onwards"""
+        api_task_id = self.task_index.get(task_id)
+        if api_task_id is None or not chunk:
+            return
+        self._append("output", api_task_id, task_id, {"offset": offset, "chunk": chunk})
+
+    def finish(self, task_id: str, status: str, exit_code: Optional[int]):
+        api_task_id = self.task_index.get(task_id)
+        if api_task_id is None:
+            return
+        with self.lock:
+            record = self.records.get(api_task_id)
+            if record is not None:
+                record.state = FINISHED
+                record.status = status
+                record.exit_code = exit_code
+                record.updated = time.time()
+        self._append("finish", api_task_id, task_id, {"status": status, "exit_code": exit_code})
+
+    def reported(self, task_id: str):
+        """Record that the final status was delivered to the API"""
+        api_task_id = self.task_index.pop(task_id, None)
+        if api_task_id is None:
+            return
+        with self.lock:
+            record = self.records.get(api_task_id)
+            if record is not None:
+                record.state = REPORTED
+                record.output = []
+                record.updated = time.time()
+            self.reported_since_prune.append(api_task_id)
+        self._append("reported", api_task_id, task_id, None)
+
+    def release(self, api_task_id: str):
+        """Forget a task accepted but never started (spawn failed, query answered),
+        so a re-delivery of it is accepted again"""
+        with self.lock:
+            record = self.records.get(api_task_id)
+            if record is not None and record.state == ACCEPTED:
+                del self.records[api_task_id]
+
+    def lookup(self, api_task_id: str) -> Optional[JournalRecord]:
+        return self.records.get(api_task_id)
+
+    def _append(self, event: str, api_task_id: str, task_id: Optional[str], data: Optional[Dict],
+                done: Optional[threading.Event] = None):
+        self.queue.put(((time.time(), event, api_task_id, task_id, data), done))
+
+    # Group commit
+
+    def _take_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _coalesce(self, rows: List) -> List:
+        """Merge consecutive output chunks of the same task into one row and serialize"""
+        merged = []
+        chunks: List[str] = []
+        for row in rows:
+            previous = merged[-1] if merged else None
+            if (row[1] == "output" and previous is not None and previous[1] == "output"
+                    and previous[3] == row[3]):
+                chunks.append(row[4]["chunk"])
+                continue
+            if chunks:
+                previous[4]["chunk"] = "".join(chunks)
+            chunks = [row[4]["chunk"]] if row[1] == "output" else []
+            merged.append((row[0], row[1], row[2], row[3], dict(row[4]) if row[4] is not None else None))
+        if chunks:
+            merged[-1][4]["chunk"] = "".join(chunks)
+        return [row[:4] + (json.dumps(row[4]) if row[4] is not None else None,) for row in merged]
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            if time.monotonic() - self.last_prune >= self.prune_interval:
+                self.prune()
+            batch = self._take_batch()
+            if not batch:
+                continue
+            # flush() enqueues a marker without a row
+            rows = self._coalesce([row for row, _ in batch if row is not None])
+            try:
+                if rows:
+                    with self.connection:
+                        self.connection.execute("BEGIN")
+                        self.connection.executemany(
+                            "INSERT INTO journal (ts, event, api_task_id, task_id, data) VALUES (?, ?, ?, ?, ?)",
+                            rows
+                        )
+                    self.written += len(rows)
+                    self.commits += 1
+            except sqlite3.Error as e:
+                logger.error(f"Error writing {len(rows)} journal events: {e}")
+            finally:
+                for _, done in batch:
+                    if done is not None:
+                        done.set()
+
+    def flush(self, timeout: float = 5):
+        """Wait until every queued event is committed"""
+        done = threading.Event()
+        self.queue.put((None, done))
+        done.wait(timeout)
+
+    # Recovery
+
+    def replay(self) -> List[JournalRecord]:
+        """Rebuild task state from the journal.
+
+        Returns the tasks whose final status was never delivered to the API:
+        tasks still running when the proxy stopped and finished but unreported
+        ones. Must be called before new tasks are accepted.
+        """
+        cutoff = time.time() - self.retention
+        records: Dict[str, JournalRecord] = {}
+        cursor = self.connection.execute(
+            "SELECT ts, event, api_task_id, task_id, data FROM journal ORDER BY seq"
+        )
+        for ts, event, api_task_id, task_id, data in cursor:
+            record = records.get(api_task_id)
+            if record is None:
+                record = records[api_task_id] = JournalRecord(api_task_id)
+            data = json.loads(data) if data else {}
+            record.updated = ts
+            if event == "accept":
+                record.command = data.get("command", "")
+                record.serial = data.get("serial")
+                record.background = data.get("background", False)
+            elif event == "start":
+                record.task_id = task_id
+                record.state = RUNNING
+            elif event == "output":
+                record.output.append(data["chunk"])
+            elif event == "finish":
+                record.state = FINISHED
+                record.status = data.get("status")
+                record.exit_code = data.get("exit_code")
+            elif event == "reported":
+                record.state = REPORTED
+                record.output = []
+
+        # Tasks never started are forgotten so a re-delivery executes them
+        expired = [key for key, record in records.items()
+                   if record.state == ACCEPTED or (record.state == REPORTED and record.updated < cutoff)]
+        for key in expired:
+            records.pop(key)
+        self._compact(expired, [key for key, record in records.items() if record.state == REPORTED])
+
+        with self.lock:
+            self.records = records
+            self.task_index = {record.task_id: key for key, record in records.items()
+                               if record.task_id and record.state != REPORTED}
+        pending = [record for record in records.values() if record.state in (RUNNING, FINISHED)]
+        logger.info(f"Task journal replayed: {len(records)} tasks, {len(pending)} to report")
+        return pending
+
+    def prune(self):
+        """Drop tasks reported (or accepted and abandoned) before the retention
+        period from memory and disk, and the output of newly reported tasks"""
+        self.last_prune = time.monotonic()
+        cutoff = time.time() - self.retention
+        with self.lock:
+            expired = [key for key, record in self.records.items()
+                       if record.state in (REPORTED, ACCEPTED) and record.updated < cutoff]
+            for key in expired:
+                del self.records[key]
+            reported, self.reported_since_prune = self.reported_since_prune, []
+        if expired or reported:
+            self._compact(expired, reported)
+            logger.debug(f"Task journal pruned {len(expired)} tasks")
+
+    def _compact(self, expired: List[str], reported: List[str]):
+        """Drop expired tasks and the output of tasks already reported"""
+        try:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "DELETE FROM journal WHERE api_task_id = ?", [(key,) for key in expired]
+                )
+                self.connection.executemany(
+                    "DELETE FROM journal WHERE api_task_id = ? AND event = 'output'",
+                    [(key,) for key in reported]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error compacting task journal: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "tasks": len(self.records),
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "commits": self.commits
+        }
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=5)
+        self.connection.close()
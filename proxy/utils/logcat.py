@@ -0,0 +1,181 @@
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# `adb logcat -v threadtime`: "MM-DD HH:MM:SS.mmm  PID  TID L Tag: message"
+THREADTIME = re.compile(
+    r"^(\d\d-\d\d \d\d:\d\d:\d\d)\.(\d{3})\s+(\d+)\s+(\d+)\s+([VDIWEFAS])\s(.*?)\s*: (.*)$"
+)
+LEVELS = "VDIWEFAS"  # lowest to highest, S (silent) filters everything
+
+class LogcatRecord:
+    __slots__ = ("ts", "pid", "tid", "level", "tag", "message")
+
+    def __init__(self, ts: float, pid: int, tid: int, level: str, tag: str, message: str):
+        self.ts = ts
+        self.pid = pid
+        self.tid = tid
+        self.level = level
+        self.tag = tag
+        self.message = message
+
+    def to_dict(self) -> Dict:
+        return {"ts": self.ts, "pid": self.pid, "tid": self.tid, "level": self.level,
+                "tag": self.tag, "message": self.message}
+
+class LogcatParser:
+    """Parse threadtime lines; the epoch of each whole second is computed once"""
+
+    def __init__(self):
+        self.year = time.localtime().tm_year
+        self.second_cache: Dict[str, float] = {}
+
+    def _epoch(self, second: str) -> float:
+        epoch = self.second_cache.get(second)
+        if epoch is None:
+            if len(self.second_cache) > 4096:
+                self.second_cache.clear()
+            epoch = datetime.strptime(f"{self.year}-{second}", "%Y-%m-%d %H:%M:%S").timestamp()
+            self.second_cache[second] = epoch
+        return epoch
+
+    def parse(self, line: str) -> Optional[LogcatRecord]:
+        """Record for a log line, None for anything else (e.g. "--------- beginning of main")"""
+        match = THREADTIME.match(line.rstrip("\r\n"))
+        if match is None:
+            return None
+        second, millis, pid, tid, level, tag, message = match.groups()
+        return LogcatRecord(self._epoch(second) + int(millis) / 1000, int(pid), int(tid),
+                            level, tag, message)
+
+class LogcatFilter:
+    """Tag/level filter in logcat filterspec syntax plus an optional message regex.
+
+    "ActivityManager:I MyApp:V *:S" keeps ActivityManager at info and above,
+    every MyApp line and nothing else. Without a "*" rule other tags pass at
+    `default_level`.
+    """
+
+    def __init__(self, spec: str = "", regex: Optional[str] = None, default_level: str = "V"):
+        self.rules: Dict[str, int] = {}
+        self.default = LEVELS.index(default_level)
+        for token in spec.split():
+            tag, _, level = token.rpartition(":")
+            if not tag or level not in LEVELS:
+                raise ValueError(f"Invalid logcat filterspec: {token}")
+            if tag == "*":
+                self.default = LEVELS.index(level)
+            else:
+                self.rules[tag] = LEVELS.index(level)
+        self.regex = re.compile(regex) if regex else None
+
+    @classmethod
+    def from_task(cls, options: Optional[Dict]) -> Optional["LogcatFilter"]:
+        if not options:
+            return None
+        return cls(options.get("spec", ""), options.get("regex"), options.get("level", "V"))
+
+    def matches(self, record: LogcatRecord) -> bool:
+        if LEVELS.index(record.level) < self.rules.get(record.tag, self.default):
+            return False
+        return self.regex is None or self.regex.search(record.message) is not None
+
+class RingBuffer:
+    """Fixed-capacity buffer of the most recent records of one device, oldest first"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items: List[Optional[LogcatRecord]] = [None] * capacity
+        self.start = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def append(self, record: LogcatRecord) -> bool:
+        """Add a record; False (and not stored) if it is older than the newest one.
+
+        Another or a restarted logcat reader of the same device first replays
+        the device's log buffer; dropping those records keeps the buffer in
+        time order for query().
+        """
+        with self.lock:
+            if self.size and record.ts < self._at(self.size - 1).ts:
+                return False
+            if self.size < self.capacity:
+                self.items[(self.start + self.size) % self.capacity] = record
+                self.size += 1
+            else:
+                self.items[self.start] = record
+                self.start = (self.start + 1) % self.capacity
+            return True
+
+    def _at(self, index: int) -> LogcatRecord:
+        return self.items[(self.start + index) % self.capacity]
+
+    def _first_at_or_after(self, ts: float) -> int:
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._at(middle).ts < ts:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              record_filter: Optional[LogcatFilter] = None, limit: int = 1000) -> List[LogcatRecord]:
+        """Records with since <= ts < until passing the filter, oldest first.
+
+        Records arrive in device time order, so the range start is found by
+        binary search.
+        """
+        results = []
+        with self.lock:
+            index = self._first_at_or_after(since) if since is not None else 0
+            while index < self.size and len(results) < limit:
+                record = self._at(index)
+                if until is not None and record.ts >= until:
+                    break
+                if record_filter is None or record_filter.matches(record):
+                    results.append(record)
+                index += 1
+        return results
+
+    def __len__(self) -> int:
+        return self.size
+
+class LogcatStore:
+    """Per-device ring buffers of parsed logcat records"""
+
+    def __init__(self, capacity: int = 50000):
+        self.capacity = capacity
+        self.parser = LogcatParser()
+        self.buffers: Dict[str, RingBuffer] = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, serial: str) -> RingBuffer:
+        buffer = self.buffers.get(serial)
+        if buffer is None:
+            with self.lock:
+                buffer = self.buffers.setdefault(serial, RingBuffer(self.capacity))
+        return buffer
+
+    def ingest(self, serial: str, line: str) -> Optional[LogcatRecord]:
+        """Parse a line and buffer it; the record is returned even if it was too old to buffer"""
+        record = self.parser.parse(line)
+        if record is not None:
+            self.buffer(serial).append(record)
+        return record
+
+    def query(self, serial: str, since: Optional[float] = None, until: Optional[float] = None,
+              spec: str = "", regex: Optional[str] = None, level: str = "V",
+              limit: int = 1000) -> List[Dict]:
+        buffer = self.buffers.get(serial)
+        if buffer is None:
+            return []
+        record_filter = LogcatFilter(spec, regex, level) if spec or regex or level != "V" else None
+        return [record.to_dict() for record in buffer.query(since, until, record_filter, limit)]
+
+    def stats(self) -> Dict:
+        return {serial: len(buffer) for serial, buffer in list(self.buffers.items())}
@@ -0,0 +1,301 @@
+import bisect
+import functools
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.logger import logger
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class _Metric:
+    """Base metric with per-thread shards.
+
+    Each thread updates its own dict without taking a lock; shards are only
+    merged when the metrics endpoint is scraped. Shards of threads that have
+    exited are folded into a base shard then, so short-lived threads (one per
+    background task) do not accumulate.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Tuple[weakref.ref, Dict]] = []  # (owning thread, shard)
+        self._base: Dict = {}  # merged shards of exited threads
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _merge(self, into: Dict, shard: Dict):
+        raise NotImplementedError
+
+    def _snapshot(self) -> List[Dict]:
+        with self._shards_lock:
+            live = []
+            for thread_ref, shard in self._shards:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._base, shard)
+                else:
+                    live.append((thread_ref, shard))
+            self._shards = live
+            base = {}
+            self._merge(base, self._base)
+        # list(dict.items()) runs without releasing the GIL, so it is safe
+        # against the owning thread adding keys concurrently
+        return [base] + [dict(list(shard.items())) for _, shard in live]
+
+    def _format_labels(self, values: Tuple, extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.extend(extra.items())
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, *labels):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, into: Dict, shard: Dict):
+        for labels, value in list(shard.items()):
+            into[labels] = into.get(labels, 0) + value
+
+    def value(self, *labels) -> float:
+        return sum(shard.get(labels, 0) for shard in self._snapshot())
+
+    def _render_samples(self) -> List[str]:
+        totals: Dict[Tuple, float] = {}
+        for shard in self._snapshot():
+            self._merge(totals, shard)
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in totals.items()]
+
+class Gauge(_Metric):
+    """Gauge set directly or computed by a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def set_function(self, func: Callable[[], float]):
+        self.func = func
+
+    def _render_samples(self) -> List[str]:
+        if self.func is not None:
+            try:
+                return [f"{self.name} {self.func()}"]
+            except Exception as e:
+                logger.error(f"Error computing gauge {self.name}: {e}")
+                return []
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in list(self._values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [per-bucket counts..., +Inf count, sum]
+            state = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = state
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the elapsed time of the block"""
+        return _Timer(self, labels)
+
+    def _merge(self, into: Dict, shard: Dict):
+        for labels, state in list(shard.items()):
+            total = into.setdefault(labels, [0] * len(state))
+            for i, value in enumerate(list(state)):
+                total[i] += value
+
+    def _render_samples(self) -> List[str]:
+        merged: Dict[Tuple, List[float]] = {}
+        for shard in self._snapshot():
+            self._merge(merged, shard)
+
+        lines = []
+        for labels, state in merged.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(labels, {'le': repr(bound)})} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._format_labels(labels, {'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {cumulative}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), func=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, func))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+def timed(histogram: Histogram):
+    """Decorator observing a method's duration, labelled with the method name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, func.__name__)
+        return wrapper
+    return decorator
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host: str, port: int) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics in Prometheus text format from a daemon thread"""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    except OSError as e:
+        logger.error(f"Metrics server failed to bind {host}:{port}: {e}")
+        return None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
+
+# Proxy metrics
+TASKS_RECEIVED = registry.counter(
+    "adb_proxy_tasks_received_total", "Tasks received from the API")
+TASKS_SKIPPED = registry.counter(
+    "adb_proxy_tasks_skipped_total", "Tasks received but not executed", ["reason"])
+TASK_DISPATCH_SECONDS = registry.histogram(
+    "adb_proxy_task_dispatch_seconds", "Time from task poll to adb process spawn")
+ADB_SPAWN_SECONDS = registry.histogram(
+    "adb_proxy_adb_spawn_seconds", "Time spent creating the adb process")
+TIME_TO_FIRST_BYTE_SECONDS = registry.histogram(
+    "adb_proxy_time_to_first_byte_seconds", "Time from spawn to first output line of background tasks")
+COMMAND_DURATION_SECONDS = registry.histogram(
+    "adb_proxy_command_duration_seconds", "adb command duration", ["subcommand", "status"])
+BINARY_OUTPUT_BYTES = registry.counter(
+    "adb_proxy_binary_output_bytes_total", "Raw bytes written by binary (exec-out) commands", ["subcommand"])
+API_REQUEST_SECONDS = registry.histogram(
+    "adb_proxy_api_request_seconds", "APIHandler call latency", ["method"])
+API_ERRORS = registry.counter(
+    "adb_proxy_api_errors_total", "Failed API requests", ["endpoint"])
+MAIN_LOOP_LAG_SECONDS = registry.histogram(
+    "adb_proxy_main_loop_lag_seconds", "Main loop cycle time beyond POLL_INTERVAL")
+RUNNING_TASKS = registry.gauge(
+    "adb_proxy_running_tasks", "Tasks with a live adb process")
+OUTPUT_BYTES_BUFFERED = registry.gauge(
+    "adb_proxy_output_bytes_buffered", "Task output held in memory")
+API_BREAKER_STATE = registry.gauge(
+    "adb_proxy_api_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["endpoint"])
+API_BREAKER_TRANSITIONS = registry.counter(
+    "adb_proxy_api_breaker_transitions_total", "Circuit breaker state changes", ["endpoint", "state"])
+API_RETRIES = registry.counter(
+    "adb_proxy_api_retries_total", "Background retries of failed API writes", ["outcome"])
+API_RETRY_QUEUE = registry.gauge(
+    "adb_proxy_api_retry_queue", "API writes waiting for a retry")
+SPOOL_RECORDS = registry.counter(
+    "adb_proxy_spool_records_total", "Undeliverable API writes spooled to disk and replayed", ["outcome"])
+SPOOL_BYTES = registry.gauge(
+    "adb_proxy_spool_bytes", "Spooled bytes waiting for replay")
+SCHEDULER_QUEUE_DEPTH = registry.gauge(
+    "adb_proxy_scheduler_queue_depth", "Tasks waiting for a worker", ["priority"])
+SCHEDULER_WAIT_SECONDS = registry.histogram(
+    "adb_proxy_scheduler_wait_seconds", "Time tasks waited for a worker", ["priority"])
+ADMISSION_LIMIT = registry.gauge(
+    "adb_proxy_admission_limit", "Concurrent task limit set by admission control")
+HOST_SATURATED = registry.counter(
+    "adb_proxy_host_saturated_total", "Host load samples over threshold", ["signal"])
+TELEMETRY_SAMPLE_SECONDS = registry.histogram(
+    "adb_proxy_telemetry_sample_seconds", "Time to collect one device telemetry sample")
+OWNED_DEVICES = registry.gauge(
+    "adb_proxy_owned_devices", "Devices this node holds a lease on")
+CLUSTER_NODES = registry.gauge(
+    "adb_proxy_cluster_nodes", "Live proxy nodes sharing the device fleet")
+TASK_STREAM_ENTRIES = registry.counter(
+    "adb_proxy_task_stream_entries_total", "Redis task stream entries by outcome", ["outcome"])
+TASK_STREAM_INFLIGHT = registry.gauge(
+    "adb_proxy_task_stream_inflight", "Stream entries read and not yet acknowledged")
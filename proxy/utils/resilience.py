@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import API_BREAKER_STATE, API_BREAKER_TRANSITIONS, API_RETRIES
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Outcomes of a delivery attempt made by the retry queue
+DELIVERED = "delivered"
+RETRY = "retry"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one API endpoint.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail fast. Once `recovery_timeout` has passed a single probe is let through
+    (half-open); its result closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+        API_BREAKER_STATE.set(STATE_VALUES[CLOSED], name)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit for {self.name}: {self.state} -> {state}")
+            self.state = state
+            API_BREAKER_STATE.set(STATE_VALUES[state], self.name)
+            API_BREAKER_TRANSITIONS.inc(1, self.name, state)
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through"""
+        with self.lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def release_probe(self):
+        """End a probe that got neither a success nor a failure recorded"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "failures": self.failures}
+
+class RetryQueue:
+    """Deliver failed API writes from a background thread with jittered backoff.
+
+    Items are keyed so a newer payload for the same key (e.g. a later status of
+    the same task) replaces the queued one instead of being sent after it.
+    Requests given up on (retries exhausted, queue full or, when on_drop is
+    set, circuit open) are passed to on_drop.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[Dict], str],
+        max_size: int = 1000,
+        max_attempts: int = 3,
+        base_delay: float = 5,
+        max_delay: float = 60,
+        on_drop: Optional[Callable[[Dict], None]] = None
+    ):
+        self.deliver = deliver
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_drop = on_drop
+        self.heap = []
+        self.latest: Dict[str, int] = {}  # key -> sequence of the newest item
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def submit(self, key: str, request: Dict, attempt: int = 0, delay: Optional[float] = None):
+        with self.condition:
+            if key not in self.latest and len(self.latest) >= self.max_size:
+                API_RETRIES.inc(1, "overflow")
+                self._drop(request)
+                return
+            seq = next(self.sequence)
+            self.latest[key] = seq
+            due = time.monotonic() + (self.backoff(attempt) if delay is None else delay)
+            heapq.heappush(self.heap, (due, seq, key, attempt, request))
+            self.condition.notify()
+
+    def _drop(self, request: Dict):
+        logger.error(f"Giving up retrying API request {request['method']} {request['endpoint']}")
+        if self.on_drop:
+            try:
+                self.on_drop(request)
+            except Exception as e:
+                logger.error(f"Error handling dropped request: {e}")
+
+    def _next(self):
+        with self.condition:
+            while self.running:
+                if self.heap and self.heap[0][0] <= time.monotonic():
+                    due, seq, key, attempt, request = heapq.heappop(self.heap)
+                    if self.latest.get(key) != seq:
+                        continue  # superseded by a newer payload
+                    del self.latest[key]
+                    return key, attempt, request
+                timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                self.condition.wait(timeout)
+            return None
+
+    def _run(self):
+        while self.running:
+            item = self._next()
+            if item is None:
+                return
+            key, attempt, request = item
+            try:
+                outcome = self.deliver(request)
+            except Exception as e:
+                logger.error(f"Error retrying API request: {e}")
+                outcome = RETRY
+
+            if outcome == DELIVERED:
+                API_RETRIES.inc(1, "delivered")
+            elif outcome == BLOCKED and self.on_drop is None:
+                # Breaker is open: wait for it without using up an attempt
+                self.submit(key, request, attempt, delay=request.get("retry_after", self.base_delay))
+            elif outcome == RETRY and attempt + 1 < self.max_attempts:
+                API_RETRIES.inc(1, "rescheduled")
+                self.submit(key, request, attempt + 1)
+            elif outcome == FAILED:
+                # Rejected by the API: sending it again would not help
+                API_RETRIES.inc(1, "rejected")
+                logger.error(f"API rejected retried request {request['method']} {request['endpoint']}")
+            else:
+                API_RETRIES.inc(1, "dropped")
+                self._drop(request)
+
+    def size(self) -> int:
+        return len(self.latest)
+
+    def stop(self) -> List[Dict]:
+        """Stop the retry thread and return the requests still waiting, oldest first"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=5)
+        with self.condition:
+            pending = sorted((seq, request) for _, seq, key, _, request in self.heap
+                             if self.latest.get(key) == seq)
+            self.heap = []
+            self.latest = {}
+        return [request for _, request in pending]
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from utils.logger import logger
+from utils.metrics import SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, NORMAL, BULK)
+
+class _Entry:
+    __slots__ = ("task", "received_at", "enqueued_at", "priority", "tenant", "taken")
+
+    def __init__(self, task: Dict, received_at: Optional[float], priority: str, tenant: str):
+        self.task = task
+        self.received_at = received_at
+        self.enqueued_at = time.monotonic()
+        self.priority = priority
+        self.tenant = tenant
+        self.taken = False
+
+class _PriorityClass:
+    """Per-tenant FIFOs of one priority class, served round robin"""
+
+    def __init__(self, name: str, weight: float, aging: Optional[float]):
+        self.name = name
+        self.weight = weight
+        self.aging = aging
+        self.tenants: Dict[str, Deque[_Entry]] = {}
+        self.rotation: Deque[str] = deque()  # tenants with queued tasks, next to serve first
+        self.arrivals: Deque[_Entry] = deque()  # every entry in arrival order, for aging
+        self.size = 0
+        self.pass_value = 0.0  # stride scheduling position across classes
+
+    def push(self, entry: _Entry):
+        queue = self.tenants.get(entry.tenant)
+        if queue is None:
+            queue = self.tenants[entry.tenant] = deque()
+            self.rotation.append(entry.tenant)
+        queue.append(entry)
+        self.arrivals.append(entry)
+        self.size += 1
+
+    def oldest(self) -> Optional[_Entry]:
+        while self.arrivals and self.arrivals[0].taken:
+            self.arrivals.popleft()
+        return self.arrivals[0] if self.arrivals else None
+
+    def _take(self, entry: _Entry) -> _Entry:
+        entry.taken = True
+        self.size -= 1
+        return entry
+
+    def pop_fair(self) -> Optional[_Entry]:
+        """Next task of the tenant whose turn it is"""
+        while self.rotation:
+            tenant = self.rotation.popleft()
+            queue = self.tenants[tenant]
+            while queue and queue[0].taken:
+                queue.popleft()
+            if not queue:
+                del self.tenants[tenant]
+                continue
+            entry = queue.popleft()
+            if queue:
+                self.rotation.append(tenant)
+            else:
+                del self.tenants[tenant]
+            return self._take(entry)
+        return None
+
+    def pop_oldest(self) -> Optional[_Entry]:
+        entry = self.oldest()
+        if entry is None:
+            return None
+        self.arrivals.popleft()
+        return self._take(entry)
+
+class TaskScheduler:
+    """Run tasks on a pool of workers by priority class and tenant.
+
+    Classes share workers by weight (stride scheduling), tenants within a
+    class are served round robin, and a task waiting longer than its class's
+    aging limit is run next regardless of weights. `reserved` workers are kept
+    for interactive tasks so a bulk backlog cannot occupy every worker.
+    set_limit() caps how many workers may run at once (admission control).
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Dict, Optional[float]], None],
+        workers: int = 10,
+        weights: Optional[Dict[str, float]] = None,
+        aging: Optional[Dict[str, Optional[float]]] = None,
+        reserved: int = 1
+    ):
+        weights = weights or {INTERACTIVE: 16, NORMAL: 4, BULK: 1}
+        aging = aging or {}
+        self.run = run
+        self.workers = workers
+        self.reserved = min(reserved, workers - 1)
+        self.classes = {name: _PriorityClass(name, weights.get(name, 1), aging.get(name))
+                        for name in PRIORITY_CLASSES}
+        self.limit = workers
+        self.busy = 0
+        self.busy_background = 0  # workers running non-interactive tasks
+        self.condition = threading.Condition()
+        self.running = True
+        self.threads = [threading.Thread(target=self._worker, daemon=True, name=f"task-worker-{n}")
+                        for n in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, task: Dict, received_at: Optional[float] = None, tenant: Optional[str] = None):
+        priority = task.get("priority", NORMAL)
+        if priority not in self.classes:
+            priority = NORMAL
+        entry = _Entry(task, received_at, priority, tenant or task.get("emulator_serial") or "default")
+        with self.condition:
+            cls = self.classes[priority]
+            if not cls.size:
+                # A class that was idle does not get to catch up on the turns it missed
+                backlogged = [other.pass_value for other in self.classes.values() if other.size]
+                if backlogged:
+                    cls.pass_value = max(cls.pass_value, min(backlogged))
+            cls.push(entry)
+            SCHEDULER_QUEUE_DEPTH.set(cls.size, priority)
+            self.condition.notify()
+
+    def _select(self) -> Optional[_Entry]:
+        """Pick the next task; called with the lock held"""
+        if self.busy >= self.limit:
+            return None
+        background_limit = max(1, self.limit - self.reserved)
+        eligible = [cls for cls in self.classes.values() if cls.size and (
+            cls.name == INTERACTIVE or self.busy_background < background_limit
+        )]
+        if not eligible:
+            return None
+
+        # Aging: the task waiting longest past its class's limit goes first
+        now = time.monotonic()
+        aged = None
+        for cls in eligible:
+            oldest = cls.oldest()
+            if cls.aging is not None and oldest is not None and now - oldest.enqueued_at >= cls.aging:
+                if aged is None or oldest.enqueued_at < aged[1].enqueued_at:
+                    aged = (cls, oldest)
+        if aged is not None:
+            return aged[0].pop_oldest()
+
+        cls = min(eligible, key=lambda c: c.pass_value)
+        cls.pass_value += 1.0 / cls.weight
+        return cls.pop_fair()
+
+    def _next(self) -> Optional[_Entry]:
+        with self.condition:
+            while self.running:
+                entry = self._select()
+                if entry is not None:
+                    self.busy += 1
+                    if entry.priority != INTERACTIVE:
+                        self.busy_background += 1
+                    SCHEDULER_QUEUE_DEPTH.set(self.classes[entry.priority].size, entry.priority)
+                    return entry
+                self.condition.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - entry.enqueued_at, entry.priority)
+            try:
+                self.run(entry.task, entry.received_at)
+            except Exception as e:
+                logger.error(f"Error running scheduled task: {e}")
+            finally:
+                with self.condition:
+                    self.busy -= 1
+                    if entry.priority != INTERACTIVE:
+                        self.busy_background -= 1
+                    self.condition.notify()
+
+    def set_limit(self, limit: int):
+        with self.condition:
+            self.limit = max(1, min(limit, self.workers))
+            self.condition.notify_all()
+
+    def depth(self) -> int:
+        return sum(cls.size for cls in self.classes.values())
+
+    def stats(self) -> Dict:
+        with self.condition:
+            return {
+                "busy": self.busy,
+                "limit": self.limit,
+                "workers": self.workers,
+                "queued": {name: cls.size for name, cls in self.classes.items()}
+            }
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
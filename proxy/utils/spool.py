@@ -0,0 +1,193 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from utils.logger import logger
+from utils.metrics import SPOOL_RECORDS
+
+# Record header: compressed payload length, CRC32 of the compressed payload
+HEADER = struct.Struct(">II")
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+class Spool:
+    """Disk-backed FIFO of API requests that could not be delivered.
+
+    Records are zlib-compressed JSON appended to numbered segment files, each
+    with a length + CRC32 header so a torn write at the end of a segment is
+    detected and skipped. A cursor file remembers how far replay got; fully
+    replayed segments are deleted. Segments beyond `max_bytes` or older than
+    `max_age` are evicted oldest first.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 1 << 20, max_bytes: int = 256 << 20,
+                 max_age: float = 7 * 86400):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.active = None  # file object of the segment being appended to
+        self.active_name: Optional[str] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.cursor_segment, self.cursor_offset = self._load_cursor()
+        segments = self._segments()
+        self.next_segment = int(segments[-1][:-len(SEGMENT_SUFFIX)]) + 1 if segments else 1
+        if segments:
+            logger.info(f"Spool has {len(segments)} segments ({self.pending_bytes()} bytes) to replay")
+
+    # Segments and cursor
+
+    def _segments(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_cursor(self):
+        try:
+            with open(self._path(CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return cursor["segment"], cursor["offset"]
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+    def _save_cursor(self):
+        path = self._path(CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": self.cursor_segment, "offset": self.cursor_offset}, f)
+        os.replace(path + ".tmp", path)
+
+    def _seal(self):
+        """Close the active segment so replay can read it"""
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+            self.active_name = None
+
+    def _remove(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except OSError as e:
+            logger.error(f"Error removing spool segment {name}: {e}")
+        if name == self.cursor_segment:
+            self.cursor_segment, self.cursor_offset = None, 0
+            self._save_cursor()
+
+    def _evict(self):
+        """Drop the oldest segments while over the size or age limit"""
+        segments = [name for name in self._segments() if name != self.active_name]
+        cutoff = time.time() - self.max_age
+        total = self.pending_bytes()
+        for name in segments:
+            path = self._path(name)
+            size = os.path.getsize(path)
+            if total <= self.max_bytes and os.path.getmtime(path) >= cutoff:
+                break
+            logger.warning(f"Evicting spool segment {name} ({size} bytes)")
+            SPOOL_RECORDS.inc(1, "evicted_segment")
+            if name == self.cursor_segment:
+                size -= self.cursor_offset
+            total -= size
+            self._remove(name)
+
+    # Writing
+
+    def append(self, record: Dict):
+        payload = zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+        data = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self.lock:
+            try:
+                if self.active is None:
+                    self.active_name = f"{self.next_segment:010d}{SEGMENT_SUFFIX}"
+                    self.next_segment += 1
+                    self.active = open(self._path(self.active_name), "ab")
+                self.active.write(data)
+                self.active.flush()
+                SPOOL_RECORDS.inc(1, "spooled")
+                if self.active.tell() >= self.segment_size:
+                    self._seal()
+                    self._evict()
+            except OSError as e:
+                logger.error(f"Error writing to spool: {e}")
+
+    # Replay
+
+    def _read_records(self, name: str, offset: int):
+        """Yield (record, end offset) from `offset`; stops at a torn or corrupt record"""
+        with open(self._path(name), "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                length, checksum = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    logger.error(f"Corrupt record in spool segment {name} at offset {offset}, skipping rest")
+                    SPOOL_RECORDS.inc(1, "corrupt")
+                    return
+                offset = f.tell()
+                try:
+                    record = json.loads(zlib.decompress(payload))
+                except (zlib.error, ValueError):
+                    SPOOL_RECORDS.inc(1, "corrupt")
+                    continue
+                yield record, offset
+
+    def replay(self, deliver: Callable[[Dict], bool], limit: int = 1000, checkpoint_every: int = 100) -> int:
+        """Deliver up to `limit` records in order; stops at the first record deliver() rejects.
+
+        Returns the number of records delivered. The cursor is saved every
+        `checkpoint_every` records, so a crash re-delivers at most that many.
+        """
+        with self.lock:
+            self._seal()
+            self._evict()
+            segments = self._segments()
+
+        delivered = 0
+        for name in segments:
+            offset = self.cursor_offset if name == self.cursor_segment else 0
+            finished = True
+            for record, end in self._read_records(name, offset):
+                if delivered >= limit or not deliver(record):
+                    finished = False
+                    break
+                delivered += 1
+                SPOOL_RECORDS.inc(1, "replayed")
+                with self.lock:
+                    self.cursor_segment, self.cursor_offset = name, end
+                    if delivered % checkpoint_every == 0:
+                        self._save_cursor()
+            with self.lock:
+                if finished:
+                    self._remove(name)
+                else:
+                    self._save_cursor()
+                    break
+        return delivered
+
+    def pending_bytes(self) -> int:
+        total = 0
+        for name in self._segments():
+            try:
+                total += os.path.getsize(self._path(name))
+            except OSError:
+                continue
+            if name == self.cursor_segment:
+                total -= self.cursor_offset
+        return total
+
+    def empty(self) -> bool:
+        return self.pending_bytes() == 0
+
+    def close(self):
+        with self.lock:
+            self._seal()
+            self._save_cursor()
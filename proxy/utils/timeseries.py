@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+class TimeSeriesRing:
+    """Fixed-capacity ring of samples for one device.
+
+    Each sample is a row of float32 values, one column per metric, stored in a
+    preallocated NumPy array next to a float64 timestamp column. Missing values
+    are NaN and ignored by the statistics.
+    """
+
+    def __init__(self, metrics: Sequence[str], capacity: int):
+        self.metrics = list(metrics)
+        self.columns = {name: index for index, name in enumerate(self.metrics)}
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, len(self.metrics)), np.nan, dtype=np.float32)
+        self.next = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def append(self, sample: Dict[str, float], ts: Optional[float] = None):
+        row = np.full(len(self.metrics), np.nan, dtype=np.float32)
+        for name, value in sample.items():
+            column = self.columns.get(name)
+            if column is not None and value is not None:
+                row[column] = value
+        with self.lock:
+            self.times[self.next] = ts if ts is not None else time.time()
+            self.values[self.next] = row
+            self.next = (self.next + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def window(self, metric: str, seconds: Optional[float] = None):
+        """(timestamps, values) of a metric, oldest first, within the last `seconds`"""
+        column = self.columns[metric]
+        with self.lock:
+            if self.size < self.capacity:
+                times = self.times[:self.size].copy()
+                values = self.values[:self.size, column].copy()
+            else:
+                order = np.r_[self.next:self.capacity, 0:self.next]
+                times = self.times[order]
+                values = self.values[order, column]
+        if seconds is not None:
+            keep = times >= time.time() - seconds
+            times, values = times[keep], values[keep]
+        return times, values
+
+    def summary(self, metric: str, seconds: Optional[float] = None,
+                percentiles: Sequence[float] = (50, 95, 99)) -> Dict:
+        """latest/min/max/mean and percentiles of a metric over a window"""
+        times, values = self.window(metric, seconds)
+        valid = ~np.isnan(values)
+        times, values = times[valid], values[valid]
+        if not len(values):
+            return {"metric": metric, "count": 0}
+        points = np.percentile(values, percentiles)
+        result = {
+            "metric": metric,
+            "count": int(len(values)),
+            "latest": float(values[-1]),
+            "latest_ts": float(times[-1]),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "mean": float(values.mean())
+        }
+        for pct, point in zip(percentiles, points):
+            result[f"p{pct:g}"] = float(point)
+        return result
+
+    def __len__(self) -> int:
+        return self.size
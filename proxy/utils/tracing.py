@@ -0,0 +1,284 @@
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+_HEX = re.compile(r"[0-9a-f]+")
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def valid_id(value: str, length: int) -> bool:
+    """Lowercase hex of `length` digits, not all zero (W3C trace context)"""
+    return len(value) == length and _HEX.fullmatch(value) is not None and value.strip("0") != ""
+
+def parse_traceparent(header: Optional[str]):
+    """Parse a W3C traceparent header into (trace_id, span_id, sampled)"""
+    if not header or not isinstance(header, str):
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) != 4 or not valid_id(parts[1], 32) or not valid_id(parts[2], 16):
+        return None
+    if len(parts[3]) != 2 or _HEX.fullmatch(parts[3]) is None:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+class Span:
+    """A timed operation; use as a context manager to make it the current span"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "sampled",
+                 "attributes", "start_ns", "end_ns", "status", "_token")
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_id: Optional[str],
+                 sampled: bool, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self, status: Optional[str] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if status:
+            self.status = status
+        if self.sampled:
+            self.tracer.export(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.attributes["error"] = str(exc)
+            self.status = "error"
+        _current_span.reset(self._token)
+        self.end()
+        return False
+
+class _BatchExporter:
+    """Export finished spans from a background thread in batches"""
+
+    def __init__(self, batch_size: int = 256, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def export(self, span: Span):
+        try:
+            self.queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while self.running or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Error exporting {len(batch)} spans: {e}")
+
+    def _write(self, spans: List[Dict]):
+        raise NotImplementedError
+
+    def shutdown(self):
+        self.running = False
+        self.thread.join(timeout=5)
+
+class JSONLExporter(_BatchExporter):
+    """Append spans to a local JSONL file, one span per line"""
+
+    def __init__(self, path: str, **kwargs):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        super().__init__(**kwargs)
+
+    def _write(self, spans: List[Dict]):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span) + "\n" for span in spans))
+
+class OTLPExporter(_BatchExporter):
+    """POST spans to an OTLP/HTTP JSON collector endpoint (e.g. /v1/traces)"""
+
+    def __init__(self, endpoint: str, service_name: str = "adb-proxy", **kwargs):
+        import requests
+
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.session = requests.Session()
+        super().__init__(**kwargs)
+
+    def _write(self, spans: List[Dict]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "adb-proxy"},
+                    "spans": [self._otlp_span(span) for span in spans]
+                }]
+            }]
+        }
+        self.session.post(self.endpoint, json=payload, timeout=5)
+
+    def _otlp_span(self, span: Dict) -> Dict:
+        return {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"]),
+            "status": {"code": 2 if span["status"] == "error" else 1},
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in span["attributes"].items()
+            ]
+        }
+
+class Tracer:
+    """Create spans, decide sampling per trace and hand finished spans to the exporter.
+
+    The sampling decision is made once at the root from the trace id, so every
+    span of a trace is either kept or dropped together.
+    """
+
+    def __init__(self, exporter: Optional[_BatchExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def configure(self, exporter: Optional[_BatchExporter], sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def _sample(self, trace_id: str) -> bool:
+        if self.exporter is None:
+            return False
+        return int(trace_id[-8:], 16) < self.sample_rate * 0x100000000
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span] = None,
+        trace_id: Optional[str] = None,
+        traceparent: Optional[str] = None,
+        attributes: Optional[Dict] = None
+    ) -> Span:
+        """Start a span under `parent`, the current span, or a new/propagated trace"""
+        parent = parent or self.current()
+        if parent is not None:
+            return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+
+        remote = parse_traceparent(traceparent)
+        if remote:
+            remote_trace, remote_span, remote_sampled = remote
+            return Span(self, name, remote_trace, remote_span,
+                        remote_sampled and self.exporter is not None, attributes)
+
+        if isinstance(trace_id, str):
+            trace_id = trace_id.replace("-", "").lower()
+        if not isinstance(trace_id, str) or not valid_id(trace_id, 32):
+            # Missing or malformed: start a new trace
+            trace_id = _new_id(128)
+        return Span(self, name, trace_id, None, self._sample(trace_id), attributes)
+
+    def inject(self, headers: Optional[Dict] = None) -> Dict:
+        """Add the current span's traceparent header, if any"""
+        headers = headers if headers is not None else {}
+        span = self.current()
+        if span is not None:
+            headers["traceparent"] = span.traceparent()
+        return headers
+
+    def traced(self, name: Optional[str] = None, require_parent: bool = False):
+        """Decorator running the function in a child span.
+
+        With require_parent the span is only created inside an existing trace,
+        which keeps periodic calls such as task polling out of the trace file.
+        """
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if require_parent and self.current() is None:
+                    return func(*args, **kwargs)
+                with self.start_span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def export(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+tracer = Tracer()
+
+def configure_tracing(exporter: str, sample_rate: float, path: str, endpoint: str):
+    """Set up the global tracer with a 'jsonl' or 'otlp' exporter"""
+    try:
+        if exporter == "otlp":
+            tracer.configure(OTLPExporter(endpoint), sample_rate)
+        else:
+            tracer.configure(JSONLExporter(path), sample_rate)
+        logger.info(f"Tracing enabled ({exporter}, sample rate {sample_rate})")
+    except Exception as e:
+        logger.error(f"Tracing disabled: {e}")
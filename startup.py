@@ -7,19 +7,39 @@ import socket
 import requests
 import psutil
 import shutil
+import threading
+import selectors
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
 
-# Khởi tạo biến global
-node_process = None
-proxy_process = None
-gui_process = None
-appium_process = None
-xvfb_process = None
-monitor_process = None
-socket_process = None
-worker_process = None
-cron_process = None
-redis_process = None
+# Process của các service đã khởi động, theo thứ tự khởi động
+service_processes = {}
+supervisor = None
+
+# Readiness probe: bắt đầu poll 10ms, tăng dần tới tối đa 100ms
+PROBE_INITIAL_DELAY = 0.01
+PROBE_MAX_DELAY = 0.1
+
+# Supervisor: health check định kỳ, restart từng service với exponential backoff
+SUPERVISOR_INTERVAL = 5  # seconds
+SUPERVISOR_REPORT_INTERVAL = 300  # seconds
+RESTART_BACKOFF_INITIAL = 1  # seconds
+RESTART_BACKOFF_MAX = 60  # seconds
+CRASH_LOOP_RESTARTS = 5
+CRASH_LOOP_WINDOW = 300  # seconds
+CRASH_LOOP_COOLDOWN = 600  # seconds
+STATS_WINDOW = 3600  # seconds
+
+# Log của service con: đọc non-blocking, ghi file rotate theo service
+SERVICE_LOG_DIR = 'logs/services'
+SERVICE_LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+SERVICE_LOG_BACKUPS = 5
+SERVICE_LOG_TAIL_LINES = 200
+LOG_READ_SIZE = 64 * 1024  # bytes
+LOG_MAX_LINE = 64 * 1024  # bytes, dòng dài hơn bị cắt
 
 def create_required_directories():
     """Tạo các thư mục cần thiết"""
@@ -29,27 +49,65 @@ def create_required_directories():
         os.chmod(directory, 0o777)
     print("✓ Required directories created")
 
-def check_port_availability(port):
+def build_port_index():
+    """Quét bảng socket một lần, trả về dict port -> pid (ưu tiên socket LISTEN)"""
+    index = {}
+    listening = set()
+
+    def add(port, pid, status):
+        if not pid:
+            return
+        if status == psutil.CONN_LISTEN:
+            if port not in listening:
+                index[port] = pid
+                listening.add(port)
+        elif port not in index:
+            index[port] = pid
+
+    try:
+        for conn in psutil.net_connections(kind='inet'):
+            if conn.laddr:
+                add(conn.laddr.port, conn.pid, conn.status)
+    except psutil.AccessDenied:
+        # Một số hệ thống (macOS) cần quyền root cho net_connections toàn hệ thống:
+        # quét từng process nhưng chỉ một lượt cho tất cả các port
+        for proc in psutil.process_iter(['pid']):
+            try:
+                for conn in proc.net_connections(kind='inet'):
+                    if conn.laddr:
+                        add(conn.laddr.port, proc.pid, conn.status)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    return index
+
+class PortIndex:
+    """Index port -> pid dựng lười, dùng chung cho nhiều lần tra cứu"""
+
+    def __init__(self):
+        self._ports = None
+
+    def owner(self, port):
+        if self._ports is None:
+            self._ports = build_port_index()
+        return self._ports.get(port)
+
+    def refresh(self):
+        self._ports = None
+
+def check_port_availability(port, port_index=None):
     """Kiểm tra port có đang được sử dụng không"""
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
         sock.bind(('localhost', port))
-        sock.close()
         return True, None
     except socket.error:
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                connections = proc.net_connections()
-                for conn in connections:
-                    if hasattr(conn.laddr, 'port') and conn.laddr.port == port:
-                        return False, proc.pid
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return False, None
+        return False, (port_index or PortIndex()).owner(port)
+    finally:
+        sock.close()
 
-def kill_process_on_port(port):
+def kill_process_on_port(port, port_index=None):
     """Tắt process đang chạy trên port"""
-    available, pid = check_port_availability(port)
+    available, pid = check_port_availability(port, port_index)
     if not available and pid:
         try:
             process = psutil.Process(pid)
@@ -179,297 +237,645 @@ def check_dependencies():
 
     return True
 
-def wait_for_port(port, host='localhost', timeout=30):
-    """Đợi cho đến khi port được mở"""
-    start_time = time.time()
-    while True:
-        try:
-            socket.create_connection((host, port), timeout=1)
-            return True
-        except (socket.timeout, socket.error):
-            if time.time() - start_time > timeout:
-                return False
-            time.sleep(1)
-
-def check_api_health(url, timeout=30):
-    """Kiểm tra API có hoạt động không"""
-    start_time = time.time()
-    while True:
+
+class ServiceSpec:
+    """Mô tả một service: lệnh chạy, dependencies và readiness probe"""
+
+    def __init__(self, name, label, command, deps=(), probe=None, env=None,
+                 capture_output=False, timeout=30, external_check=None, on_ready=None,
+                 health=None):
+        self.name = name
+        self.label = label
+        self.command = command
+        self.deps = tuple(deps)
+        self.probe = probe
+        self.env = env or {}
+        self.capture_output = capture_output
+        self.timeout = timeout
+        self.external_check = external_check
+        self.on_ready = on_ready
+        self.health = health
+
+def probe_tcp(port, host='localhost'):
+    """Ready khi port nhận kết nối"""
+    def probe(process):
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
+            with socket.create_connection((host, port), timeout=0.1):
                 return True
-        except:
-            if time.time() - start_time > timeout:
-                return False
-            time.sleep(1)
+        except OSError:
+            return False
+    return probe
 
-def start_appium():
-    """Khởi động Appium server"""
-    global appium_process
-    try:
-        appium_process = subprocess.Popen(
-            ['npx', 'appium', '--allow-insecure', 'chromedriver_autodownload'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        if wait_for_port(4723):
-            print("Appium server started successfully")
-            return appium_process
-        else:
-            print("Failed to start Appium server")
-            return None
-    except Exception as e:
-        print(f"Error starting Appium server: {e}")
-        return None
+def probe_http(url, port=None):
+    """Ready khi URL trả về 200; kiểm tra port trước để tránh request vô ích"""
+    tcp = probe_tcp(port) if port else None
 
-def run_node_server():
-    """Khởi động Node.js server"""
-    global node_process
-    try:
-        node_process = subprocess.Popen(['node', 'index.js'])
-        if wait_for_port(3000) and check_api_health('http://localhost:3000/api/system/monitor'):
-            print("Node.js server started successfully")
-            return node_process
-        else:
-            print("Failed to start Node.js server")
-            return None
-    except Exception as e:
-        print(f"Error starting Node.js server: {e}")
-        return None
+    def probe(process):
+        if tcp and not tcp(process):
+            return False
+        try:
+            return requests.get(url, timeout=0.5).status_code == 200
+        except requests.RequestException:
+            return False
+    return probe
 
-def run_python_proxy():
-    """Khởi động Python proxy"""
-    global proxy_process
-    try:
-        env = os.environ.copy()
-        env['PYTHONPATH'] = os.getcwd()
-        
-        proxy_process = subprocess.Popen(
-            ['python3', 'proxy/proxy.py'],
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        time.sleep(2)  # Đợi proxy khởi động
-        print("Python proxy started successfully")
-        return proxy_process
-    except Exception as e:
-        print(f"Error starting Python proxy: {e}")
-        return None
+def probe_path(path):
+    """Ready khi file/socket xuất hiện"""
+    return lambda process: os.path.exists(path)
 
-def start_xvfb():
-    """Khởi động Xvfb"""
-    global xvfb_process
-    try:
-        # Kiểm tra xem Xvfb đã chạy chưa
-        try:
-            xvfb_pid = subprocess.check_output(['pidof', 'Xvfb']).decode().strip()
-            if xvfb_pid:
-                print(f"Xvfb is already running with PID {xvfb_pid}")
-                os.environ['DISPLAY'] = ':99'
-                return True
-        except:
-            pass
+def probe_alive(grace):
+    """Ready khi process vẫn sống sau `grace` giây (cho service không mở port)"""
+    started = {}
 
-        # Thử khởi động Xvfb mới với cấu hình chuẩn
-        xvfb_process = subprocess.Popen(
-            ['Xvfb', ':99', '-ac', '-screen', '0', '1920x1080x24'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        time.sleep(2)  # Đợi Xvfb khởi động
-
-        # Kiểm tra xem Xvfb đã khởi động thành công chưa
-        if xvfb_process.poll() is None:  # Nếu process vẫn đang chạy
-            os.environ['DISPLAY'] = ':99'
-            # Thử set resolution
-            try:
-                subprocess.run(['xrandr', '--display', ':99', '--screen', '0', '--output', 'screen', '--mode', '1920x1080'])
-            except:
-                pass  # Bỏ qua nếu không set được resolution
-            print("Xvfb started successfully")
-            return True
-        else:
-            stderr = xvfb_process.stderr.read().decode()
-            print(f"Failed to start Xvfb: {stderr}")
+    def probe(process):
+        if process is None:
             return False
+        started.setdefault(process.pid, time.monotonic())
+        return time.monotonic() - started[process.pid] >= grace
+    return probe
 
-    except Exception as e:
-        print(f"Error with Xvfb: {e}")
-        return False
+def wait_until_ready(spec, process):
+    """Poll readiness probe với backoff ngắn, dừng sớm nếu process đã chết"""
+    if spec.probe is None:
+        return True
+    deadline = time.monotonic() + spec.timeout
+    delay = PROBE_INITIAL_DELAY
+    while True:
+        if process is not None and process.poll() is not None:
+            return False
+        if spec.probe(process):
+            return True
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, PROBE_MAX_DELAY)
 
-def run_gui_control():
-    """Khởi động GUI Control service"""
-    global gui_process
+def xvfb_running():
+    """Kiểm tra Xvfb đã chạy sẵn chưa"""
     try:
-        env = os.environ.copy()
-        env['PYTHONPATH'] = os.getcwd()
-        env['DISPLAY'] = ':99'  # Đảm bảo sử dụng Xvfb display
-        
-        gui_process = subprocess.Popen(
-            ['python3', 'gui-control.py', 'service', '--port', '5000'],
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        if wait_for_port(5000):
-            print("GUI Control service started successfully")
-            return gui_process
-        else:
-            print("Failed to start GUI Control service")
-            return None
-    except Exception as e:
-        print(f"Error starting GUI Control service: {e}")
-        return None
+        xvfb_pid = subprocess.check_output(['pidof', 'Xvfb'], stderr=subprocess.DEVNULL).decode().strip()
+        if xvfb_pid:
+            print(f"Xvfb is already running with PID {xvfb_pid}")
+            return True
+    except Exception:
+        pass
+    return False
 
-def start_monitor():
-    """Khởi động monitoring service"""
-    global monitor_process
+def xvfb_ready():
+    """Cấu hình DISPLAY sau khi Xvfb sẵn sàng"""
+    os.environ['DISPLAY'] = ':99'
+    # Thử set resolution
     try:
-        monitor_process = subprocess.Popen(['node', 'monitor.js'])
-        if wait_for_port(3003) and check_api_health('http://localhost:3003/health'):
-            print("Monitor service started successfully")
-            return monitor_process
+        subprocess.run(['xrandr', '--display', ':99', '--screen', '0', '--output', 'screen', '--mode', '1920x1080'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception:
+        pass  # Bỏ qua nếu không set được resolution
+
+SERVICES = [
+    ServiceSpec(
+        'xvfb', 'Xvfb',
+        ['Xvfb', ':99', '-ac', '-screen', '0', '1920x1080x24'],
+        probe=probe_path('/tmp/.X11-unix/X99'),
+        capture_output=True,
+        timeout=10,
+        external_check=xvfb_running,
+        on_ready=xvfb_ready
+    ),
+    ServiceSpec(
+        'appium', 'Appium server',
+        ['npx', 'appium', '--allow-insecure', 'chromedriver_autodownload'],
+        probe=probe_tcp(4723),
+        capture_output=True
+    ),
+    ServiceSpec(
+        'node', 'Node.js server',
+        ['node', 'index.js'],
+        probe=probe_http('http://localhost:3000/api/system/monitor', port=3000)
+    ),
+    ServiceSpec(
+        'proxy', 'Python proxy',
+        ['python3', 'proxy/proxy.py'],
+        deps=['node'],
+        probe=probe_alive(0.5),
+        env={'PYTHONPATH': os.getcwd()},
+        capture_output=True
+    ),
+    ServiceSpec(
+        'gui', 'GUI Control service',
+        ['python3', 'gui-control.py', 'service', '--port', '5000'],
+        deps=['xvfb', 'appium'],
+        probe=probe_tcp(5000),
+        env={'PYTHONPATH': os.getcwd(), 'DISPLAY': ':99'},  # Đảm bảo sử dụng Xvfb display
+        capture_output=True
+    ),
+    ServiceSpec(
+        'monitor', 'Monitor service',
+        ['node', 'monitor.js'],
+        probe=probe_http('http://localhost:3003/health', port=3003)
+    ),
+    ServiceSpec(
+        'socket', 'Socket service',
+        ['node', 'socket.js'],
+        probe=probe_tcp(3002)
+    ),
+    ServiceSpec(
+        'worker', 'Worker service',
+        ['node', 'worker.js'],
+        probe=probe_alive(0.5)
+    ),
+    ServiceSpec(
+        'cron', 'Cron service',
+        ['node', 'cron.js'],
+        probe=probe_alive(0.5)
+    ),
+]
+
+class ServiceLauncher:
+    """Khởi động các service song song theo dependency graph"""
+
+    def __init__(self, specs):
+        self.specs = {spec.name: spec for spec in specs}
+        self._validate()
+        self.ready = {name: threading.Event() for name in self.specs}
+        self.failed = threading.Event()
+        self.timeline = {}
+        self.lock = threading.Lock()
+        self.t0 = None
+
+    def _validate(self):
+        """Kiểm tra dependency tồn tại và không có vòng lặp"""
+        visiting, done = set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dep in self.specs[name].deps:
+                if dep not in self.specs:
+                    raise ValueError(f"Service {name} depends on unknown service {dep}")
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.specs:
+            visit(name, [])
+
+    def launch(self):
+        """Khởi động tất cả service, trả về False nếu có service thất bại"""
+        self.t0 = time.monotonic()
+        threads = [
+            threading.Thread(target=self._start_service, args=(spec,), daemon=True)
+            for spec in self.specs.values()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return not self.failed.is_set()
+
+    def _wait_for_deps(self, spec):
+        for dep in spec.deps:
+            while not self.ready[dep].wait(0.05):
+                if self.failed.is_set():
+                    return False
+        return not self.failed.is_set()
+
+    def _start_service(self, spec):
+        if not self._wait_for_deps(spec):
+            return
+        started = time.monotonic() - self.t0
+        ok = start_service(spec)
+        finished = time.monotonic() - self.t0
+        with self.lock:
+            self.timeline[spec.name] = (started, finished, ok)
+        if ok:
+            self.ready[spec.name].set()
         else:
-            print("Failed to start monitor service")
-            return None
-    except Exception as e:
-        print(f"Error starting monitor service: {e}")
-        return None
-
-def start_socket():
-    """Khởi động socket service"""
-    global socket_process
+            self.failed.set()
+
+    def critical_path(self):
+        """Chuỗi dependency kết thúc muộn nhất"""
+        finished = {name: t for name, t in self.timeline.items() if t[2]}
+        if not finished:
+            return []
+        name = max(finished, key=lambda n: finished[n][1])
+        path = [name]
+        while True:
+            deps = [d for d in self.specs[name].deps if d in finished]
+            if not deps:
+                break
+            name = max(deps, key=lambda d: finished[d][1])
+            path.append(name)
+        return list(reversed(path))
+
+    def print_timeline(self, width=40):
+        if not self.timeline:
+            return
+        total = max(t[1] for t in self.timeline.values()) or 1e-9
+        critical = set(self.critical_path())
+        print(f"\nStartup timeline ({total:.2f}s):")
+        for name, (started, finished, ok) in sorted(self.timeline.items(), key=lambda item: item[1][0]):
+            begin = int(started / total * width)
+            end = max(begin + 1, int(finished / total * width))
+            bar = ' ' * begin + '#' * (end - begin)
+            mark = '*' if name in critical else ' '
+            status = '' if ok else '  FAILED'
+            print(f" {mark} {name:<8} {started:6.2f}s -> {finished:6.2f}s |{bar:<{width}}|{status}")
+        path = self.critical_path()
+        if path:
+            print(f"Critical path: {' -> '.join(path)} ({self.timeline[path[-1]][1]:.2f}s)")
+
+def start_service(spec):
+    """Chạy một service và đợi readiness probe"""
     try:
-        socket_process = subprocess.Popen(['node', 'socket.js'])
-        if wait_for_port(3002):
-            print("Socket service started successfully")
-            return socket_process
-        else:
-            print("Failed to start socket service")
-            return None
-    except Exception as e:
-        print(f"Error starting socket service: {e}")
-        return None
+        if spec.external_check and spec.external_check():
+            if spec.on_ready:
+                spec.on_ready()
+            return True
 
-def start_worker():
-    """Khởi động worker service"""
-    global worker_process
-    try:
-        worker_process = subprocess.Popen(['node', 'worker.js'])
-        time.sleep(2)  # Đợi worker khởi động
-        print("Worker service started successfully")
-        return worker_process
-    except Exception as e:
-        print(f"Error starting worker service: {e}")
-        return None
+        env = os.environ.copy()
+        env.update(spec.env)
+        output = subprocess.PIPE if spec.capture_output else None
+        process = subprocess.Popen(spec.command, env=env, stdout=output, stderr=output)
+        service_processes[spec.name] = process
+        if spec.capture_output:
+            log_mux.attach(spec.name, process)
+
+        if wait_until_ready(spec, process):
+            if spec.on_ready:
+                spec.on_ready()
+            print(f"{spec.label} started successfully")
+            return True
 
-def start_cron():
-    """Khởi động cron service"""
-    global cron_process
-    try:
-        cron_process = subprocess.Popen(['node', 'cron.js'])
-        time.sleep(2)  # Đợi cron khởi động
-        print("Cron service started successfully")
-        return cron_process
+        print(f"Failed to start {spec.label}")
+        for line in log_mux.tail(spec.name, 10):
+            print(f"  {spec.name} | {line}")
+        return False
     except Exception as e:
-        print(f"Error starting cron service: {e}")
-        return None
+        print(f"Error starting {spec.label}: {e}")
+        return False
 
-def verify_services():
-    """Kiểm tra tất cả services có hoạt động không"""
-    checks = {
-        "Node.js API": {
-            "url": "http://localhost:3000/api/system/monitor",
-            "status": False
-        },
-        "GUI Control": {
-            "port": 5000,
-            "status": False
-        },
-        "Appium": {
-            "port": 4723,
-            "status": False
-        },
-        "Monitor": {
-            "url": "http://localhost:3003/health",
-            "status": False
-        },
-        "Socket": {
-            "port": 3002,
-            "status": False
-        },
-        "Redis": {
-            "port": 6379,
-            "status": False
-        }
-    }
-    
-    # Kiểm tra các HTTP endpoints
-    for service in ["Node.js API", "Monitor"]:
+class LogMultiplexer:
+    """Một thread đọc non-blocking stdout/stderr của mọi service con
+
+    Pipe luôn được đọc cạn nên service con không bao giờ bị block khi ghi log.
+    Mỗi service có file log rotate riêng và một tail giới hạn trong bộ nhớ.
+    """
+
+    def __init__(self, log_dir=SERVICE_LOG_DIR, max_bytes=SERVICE_LOG_MAX_BYTES,
+                 backup_count=SERVICE_LOG_BACKUPS, tail_lines=SERVICE_LOG_TAIL_LINES):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.tail_lines = tail_lines
+        self.selector = selectors.DefaultSelector()
+        self.loggers = {}
+        self.tails = {}
+        self.bytes_read = {}
+        self.partial = {}
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def _service_logger(self, name):
+        if name not in self.loggers:
+            os.makedirs(self.log_dir, exist_ok=True)
+            service_logger = logging.getLogger(f'services.{name}')
+            service_logger.setLevel(logging.INFO)
+            service_logger.propagate = False
+            handler = RotatingFileHandler(
+                os.path.join(self.log_dir, f'{name}.log'),
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            service_logger.addHandler(handler)
+            self.loggers[name] = service_logger
+            self.tails[name] = deque(maxlen=self.tail_lines)
+            self.bytes_read[name] = 0
+        return self.loggers[name]
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._loop, name='log-mux', daemon=True)
+            self.thread.start()
+
+    def attach(self, name, process):
+        """Đăng ký stdout/stderr của process vào multiplexer"""
+        self._service_logger(name)
+        with self.lock:
+            for stream, label in ((process.stdout, 'out'), (process.stderr, 'err')):
+                if stream is not None:
+                    os.set_blocking(stream.fileno(), False)
+                    self.pending.append((stream, name, label))
+        self.start()
+        self._wake()
+
+    def _wake(self):
         try:
-            response = requests.get(checks[service]["url"])
-            checks[service]["status"] = response.status_code == 200
-        except:
+            os.write(self._wake_w, b'x')
+        except BlockingIOError:
             pass
 
-    # Kiểm tra các ports
-    for service in ["GUI Control", "Appium", "Socket", "Redis"]:
+    def _loop(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.data is None:
+                    self._register_pending()
+                else:
+                    self._read(key)
+
+    def _register_pending(self):
         try:
-            socket.create_connection(("localhost", checks[service]["port"]), timeout=1)
-            checks[service]["status"] = True
-        except:
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
             pass
+        with self.lock:
+            while self.pending:
+                stream, name, label = self.pending.popleft()
+                self.selector.register(stream, selectors.EVENT_READ, (name, label))
+
+    def _read(self, key):
+        name, label = key.data
+        try:
+            chunk = os.read(key.fd, LOG_READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b''
+
+        if not chunk:
+            # EOF: service đã đóng pipe
+            self.selector.unregister(key.fileobj)
+            rest = self.partial.pop(key.fd, b'')
+            if rest:
+                self._write(name, label, [rest])
+            key.fileobj.close()
+            return
+
+        self.bytes_read[name] += len(chunk)
+        data = self.partial.pop(key.fd, b'') + chunk
+        lines = data.split(b'\n')
+        rest = lines.pop()
+        if len(rest) > LOG_MAX_LINE:
+            lines.append(rest)
+        elif rest:
+            self.partial[key.fd] = rest
+        if lines:
+            self._write(name, label, lines)
+
+    def _write(self, name, label, lines):
+        text = [line[:LOG_MAX_LINE].decode('utf-8', 'replace').rstrip('\r') for line in lines]
+        self.tails[name].extend(text)
+        prefix = f"{time.strftime('%Y-%m-%d %H:%M:%S')} [{name}:{label}] "
+        self.loggers[name].info(prefix + ('\n' + prefix).join(text))
+
+    def tail(self, name, lines=None):
+        """Các dòng log gần nhất của service (để chẩn đoán)"""
+        tail = list(self.tails.get(name, ()))
+        return tail[-lines:] if lines else tail
+
+    def stats(self):
+        return {name: {"bytes": self.bytes_read[name], "tail": len(self.tails[name])}
+                for name in self.loggers}
+
+    def stop(self):
+        self.running = False
+        self._wake()
+        if self.thread:
+            self.thread.join(timeout=2)
+        for service_logger in self.loggers.values():
+            for handler in service_logger.handlers:
+                handler.close()
+
+log_mux = LogMultiplexer()
+
+def check_service_health(spec):
+    """Health check một service: process còn sống và probe thành công"""
+    process = service_processes.get(spec.name)
+    if process is not None and process.poll() is not None:
+        return False
+    if process is None and not spec.external_check:
+        return False
+    probe = spec.health or spec.probe
+    try:
+        return probe(process) if probe else True
+    except Exception:
+        return False
 
-    # Kiểm tra các process
-    processes = {
-        "Worker": worker_process,
-        "Cron": cron_process
+def verify_services():
+    """Kiểm tra tất cả services có hoạt động không"""
+    checks = {
+        "Node.js API": "node",
+        "GUI Control": "gui",
+        "Appium": "appium",
+        "Monitor": "monitor",
+        "Socket": "socket",
+        "Worker": "worker",
+        "Cron": "cron"
     }
-    for name, process in processes.items():
-        if process and process.poll() is None:
-            checks[name] = {"status": True}
-        else:
-            checks[name] = {"status": False}
+    specs = {spec.name: spec for spec in SERVICES}
+
+    # Chạy tất cả health check song song
+    with ThreadPoolExecutor(max_workers=len(checks) + 1) as executor:
+        futures = {
+            service: executor.submit(check_service_health, specs[name])
+            for service, name in checks.items()
+        }
+        futures["Redis"] = executor.submit(probe_tcp(6379), None)
+        results = {service: future.result() for service, future in futures.items()}
 
     # In kết quả
     print("\nService Status:")
-    for service, info in checks.items():
-        status = "✓ Running" if info["status"] else "✗ Not running"
+    for service, running in results.items():
+        status = "✓ Running" if running else "✗ Not running"
         print(f"{service}: {status}")
 
-    return all(info["status"] for info in checks.values())
+    return all(results.values())
+
+class ServiceState:
+    """Trạng thái và bộ đếm rolling của một service dưới supervisor"""
+
+    def __init__(self, name):
+        self.name = name
+        self.healthy = True
+        self.started_at = time.monotonic()
+        self.restarts = 0
+        self.restart_times = deque()
+        self.samples = deque()
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_restart = 0.0
+        self.restarting = False
+        self.crash_loop_until = 0.0
+
+    def record(self, healthy, now):
+        self.samples.append((now, healthy))
+        while self.samples and now - self.samples[0][0] > STATS_WINDOW:
+            self.samples.popleft()
+        while self.restart_times and now - self.restart_times[0] > STATS_WINDOW:
+            self.restart_times.popleft()
+
+    def availability(self):
+        if not self.samples:
+            return 1.0
+        return sum(1 for _, healthy in self.samples if healthy) / len(self.samples)
+
+    def recent_restarts(self, now, window):
+        return sum(1 for t in self.restart_times if now - t <= window)
+
+class ServiceSupervisor:
+    """Theo dõi service và chỉ khởi động lại service bị lỗi"""
+
+    def __init__(self, specs, interval=SUPERVISOR_INTERVAL):
+        self.specs = {spec.name: spec for spec in specs}
+        self.states = {name: ServiceState(name) for name in self.specs}
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=len(self.specs))
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.last_report = time.monotonic()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.tick()
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+
+    def check_all(self):
+        """Chạy health probe của tất cả service song song"""
+        futures = {
+            name: self.executor.submit(check_service_health, spec)
+            for name, spec in self.specs.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def tick(self):
+        health = self.check_all()
+        now = time.monotonic()
+        changed = False
+
+        with self.lock:
+            for name, healthy in health.items():
+                state = self.states[name]
+                if state.restarting:
+                    continue
+                state.record(healthy, now)
+
+                if healthy:
+                    if not state.healthy:
+                        print(f"✓ {self.specs[name].label} recovered")
+                        state.healthy = True
+                        changed = True
+                    # Chạy ổn định đủ lâu thì reset backoff
+                    if now - state.started_at > CRASH_LOOP_WINDOW:
+                        state.backoff = RESTART_BACKOFF_INITIAL
+                    continue
+
+                if state.healthy:
+                    print(f"✗ {self.specs[name].label} is down")
+                    state.healthy = False
+                    changed = True
+                self._maybe_restart(name, state, health, now)
+
+        if changed or now - self.last_report >= SUPERVISOR_REPORT_INTERVAL:
+            self.print_status()
+            self.last_report = now
+
+    def _maybe_restart(self, name, state, health, now):
+        spec = self.specs[name]
+        # Đợi dependency khỏe lại trước, dependency sẽ được restart riêng
+        if not all(health.get(dep, True) for dep in spec.deps):
+            return
+        if now < state.crash_loop_until or now < state.next_restart:
+            return
+        if state.recent_restarts(now, CRASH_LOOP_WINDOW) >= CRASH_LOOP_RESTARTS:
+            state.crash_loop_until = now + CRASH_LOOP_COOLDOWN
+            print(f"✗ {spec.label} is crash-looping "
+                  f"({CRASH_LOOP_RESTARTS} restarts in {CRASH_LOOP_WINDOW}s), "
+                  f"pausing restarts for {CRASH_LOOP_COOLDOWN}s")
+            return
+
+        state.restarting = True
+        state.restarts += 1
+        state.restart_times.append(now)
+        state.next_restart = now + state.backoff
+        state.backoff = min(state.backoff * 2, RESTART_BACKOFF_MAX)
+        threading.Thread(target=self._restart, args=(spec, state), daemon=True).start()
+
+    def _restart(self, spec, state):
+        print(f"Restarting {spec.label} (restart #{state.restarts})...")
+        stop_service(spec.name)
+        ok = not self.stopped.is_set() and start_service(spec)
+        with self.lock:
+            state.restarting = False
+            state.started_at = time.monotonic()
+            state.healthy = ok
+
+    def print_status(self):
+        now = time.monotonic()
+        print("\nSupervisor status:")
+        for name, state in self.states.items():
+            if state.restarting:
+                status = "restarting"
+            elif now < state.crash_loop_until:
+                status = "crash-loop"
+            else:
+                status = "up" if state.healthy else "down"
+            uptime = now - state.started_at if state.healthy else 0
+            print(f"  {name:<8} {status:<10} uptime {uptime:8.0f}s  "
+                  f"restarts {state.restarts} ({len(state.restart_times)}/h)  "
+                  f"availability {state.availability() * 100:5.1f}%")
+
+def stop_process(process, label):
+    """Dừng một process, kill nếu terminate không kịp"""
+    try:
+        process.terminate()
+        process.wait(timeout=5)
+        print(f"{label} stopped successfully")
+    except Exception as e:
+        print(f"Error stopping {label}: {e}")
+        try:
+            process.kill()
+        except:
+            pass
+
+def stop_service(name):
+    """Dừng process của một service nếu còn chạy"""
+    process = service_processes.pop(name, None)
+    if process and process.poll() is None:
+        labels = {spec.name: spec.label for spec in SERVICES}
+        stop_process(process, labels.get(name, name))
 
 def handle_shutdown(signum, frame):
     """Xử lý tắt hệ thống an toàn"""
     print("\nShutting down services...")
+    if supervisor:
+        supervisor.stop()
     
+    # Dừng theo thứ tự ngược với thứ tự khởi động để dependent dừng trước
+    labels = {spec.name: spec.label for spec in SERVICES}
     processes = [
-        (node_process, "Node.js server"),
-        (proxy_process, "Python proxy"),
-        (gui_process, "GUI Control service"),
-        (appium_process, "Appium server"),
-        (xvfb_process, "Xvfb"),
-        (monitor_process, "Monitor service"),
-        (socket_process, "Socket service"),
-        (worker_process, "Worker service"),
-        (cron_process, "Cron service")
+        (process, labels.get(name, name))
+        for name, process in reversed(list(service_processes.items()))
     ]
     
     for process, name in processes:
         if process:
-            try:
-                process.terminate()
-                process.wait(timeout=5)
-                print(f"{name} stopped successfully")
-            except Exception as e:
-                print(f"Error stopping {name}: {e}")
-                try:
-                    process.kill()
-                except:
-                    pass
+            stop_process(process, name)
+    log_mux.stop()
 
     # Dọn dẹp các file tạm
     try:
@@ -497,81 +903,33 @@ if __name__ == "__main__":
 
     # Kill các process đang chiếm dụng ports
     ports_to_check = [3000, 3001, 3002, 3003, 4723, 5000]
+    port_index = PortIndex()
     for port in ports_to_check:
-        kill_process_on_port(port)
-
-    # Khởi động hoặc kiểm tra Xvfb
-    if not start_xvfb():
-        print("Failed to start or connect to Xvfb")
-        sys.exit(1)
-
-    # Khởi động Appium
-    appium_process = start_appium()
-    if not appium_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động Node.js server
-    node_process = run_node_server()
-    if not node_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động Python proxy
-    proxy_process = run_python_proxy()
-    if not proxy_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động GUI Control
-    gui_process = run_gui_control()
-    if not gui_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động Monitor service
-    monitor_process = start_monitor()
-    if not monitor_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
+        kill_process_on_port(port, port_index)
 
-    # Khởi động Socket service
-    socket_process = start_socket()
-    if not socket_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động Worker service
-    worker_process = start_worker()
-    if not worker_process:
-        handle_shutdown(None, None)
-        sys.exit(1)
-
-    # Khởi động Cron service
-    cron_process = start_cron()
-    if not cron_process:
+    # Khởi động các service song song theo dependency graph
+    launcher = ServiceLauncher(SERVICES)
+    started = launcher.launch()
+    launcher.print_timeline()
+    if not started:
+        print("\nSome services failed to start!")
         handle_shutdown(None, None)
         sys.exit(1)
 
     # Kiểm tra tất cả services
     print("\nVerifying all services...")
-    time.sleep(5)  # Đợi các service khởi động hoàn tất
     
     if verify_services():
         print("\nAll services are running successfully!")
         print("\nPress Ctrl+C to stop all services")
         
         try:
-            # Giữ script chạy và kiểm tra services định kỳ
-            while True:
-                time.sleep(30)  # Kiểm tra mỗi 30 giây
-                if not verify_services():
-                    print("\nSome services have stopped running!")
-                    handle_shutdown(None, None)
-                    sys.exit(1)
+            # Supervisor chỉ restart service bị lỗi, không dừng cả hệ thống
+            supervisor = ServiceSupervisor(SERVICES)
+            supervisor.run()
         except KeyboardInterrupt:
             handle_shutdown(None, None)
     else:
         print("\nSome services failed to start!")
         handle_shutdown(None, None)
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,86 @@
+import importlib.util
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tên file có dấu gạch ngang nên không import trực tiếp được
+spec = importlib.util.spec_from_file_location('gui_control', os.path.join(ROOT, 'gui-control.py'))
+gui_control = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gui_control)
+
+class ReadHttpMessageTest(unittest.TestCase):
+    def setUp(self):
+        self.client, self.server = socket.socketpair()
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.server.close)
+
+    def send(self, *parts, delay=0.0, close=False):
+        """Gửi từng phần ở thread riêng để message đến qua nhiều lần recv"""
+        def run():
+            for part in parts:
+                self.client.sendall(part)
+                time.sleep(delay)
+            if close:
+                self.client.shutdown(socket.SHUT_WR)
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_reads_headers_and_body(self):
+        body = b'{"action": "click", "x": 1}'
+        self.send(b'POST / HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                  b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+
+        headers, received = gui_control.read_http_message(self.server)
+        self.assertEqual(headers['content-type'], 'application/json')
+        self.assertEqual(headers['host'], 'localhost')
+        self.assertEqual(received, body)
+
+    def test_message_split_across_reads(self):
+        self.send(b'POST / HTTP/1.1\r\nConte', b'nt-Length: 10\r\n', b'\r\n01234', b'56789', delay=0.02)
+
+        headers, body = gui_control.read_http_message(self.server)
+        self.assertEqual(headers['content-length'], '10')
+        self.assertEqual(body, b'0123456789')
+
+    def test_bytes_beyond_content_length_are_ignored(self):
+        self.send(b'POST / HTTP/1.1\r\nContent-Length: 3\r\n\r\nabcdef')
+        self.assertEqual(gui_control.read_http_message(self.server)[1], b'abc')
+
+    def test_no_body_without_content_length(self):
+        self.send(b'GET /health HTTP/1.1\r\n\r\n')
+        self.assertEqual(gui_control.read_http_message(self.server), ({}, b''))
+
+    def test_closed_before_sending_anything(self):
+        self.send(close=True)
+        self.assertEqual(gui_control.read_http_message(self.server), (None, None))
+
+    def test_truncated_messages_are_rejected(self):
+        for message in (b'POST / HTTP/1.1\r\nContent-Len', b'POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc'):
+            client, server = socket.socketpair()
+            with client, server:
+                client.sendall(message)
+                client.shutdown(socket.SHUT_WR)
+                with self.assertRaises(ValueError, msg=message):
+                    gui_control.read_http_message(server)
+
+    def test_invalid_or_oversized_content_length_is_rejected(self):
+        for length in (b'-1', b'abc', str(gui_control.GUI_CONTROL_MAX_BODY + 1).encode()):
+            client, server = socket.socketpair()
+            with client, server:
+                client.sendall(b'POST / HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+                with self.assertRaises(ValueError, msg=length):
+                    gui_control.read_http_message(server)
+
+    def test_oversized_header_is_rejected(self):
+        self.send(b'GET / HTTP/1.1\r\nX-Padding: ' + b'a' * (gui_control.GUI_CONTROL_MAX_HEADER + 1), close=True)
+        with self.assertRaisesRegex(ValueError, 'Header too large'):
+            gui_control.read_http_message(self.server)
+
+if __name__ == '__main__':
+    unittest.main()
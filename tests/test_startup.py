@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import startup
+from startup import LogMultiplexer, ServiceLauncher, ServiceSpec
+
+class LogMultiplexerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.mux = LogMultiplexer(log_dir=directory.name, tail_lines=10)
+        self.addCleanup(self.mux.stop)
+        self.log_dir = directory.name
+
+    def run_service(self, name, script):
+        process = subprocess.Popen([sys.executable, '-c', script],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.addCleanup(process.wait)
+        self.mux.attach(name, process)
+        process.wait(timeout=5)
+        # Đợi multiplexer đọc tới EOF của cả hai pipe
+        deadline = time.monotonic() + 5
+        while (process.stdout.closed, process.stderr.closed) != (True, True) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.mux.tail(name)
+
+    def test_lines_split_across_reads_are_joined(self):
+        tail = self.run_service('framing', (
+            "import sys, time\n"
+            "sys.stdout.write('first\\nsec'); sys.stdout.flush(); time.sleep(0.1)\n"
+            "sys.stdout.write('ond\\r\\nthird\\n'); sys.stdout.flush(); time.sleep(0.1)\n"
+            "sys.stdout.write('no newline at exit')\n"
+        ))
+        self.assertEqual(tail, ['first', 'second', 'third', 'no newline at exit'])
+
+    def test_stdout_and_stderr_go_to_the_service_log_file(self):
+        self.run_service('streams', "import sys; print('to out'); print('to err', file=sys.stderr)")
+        for handler in self.mux.loggers['streams'].handlers:
+            handler.flush()
+        with open(os.path.join(self.log_dir, 'streams.log')) as f:
+            content = f.read()
+        self.assertIn('[streams:out] to out', content)
+        self.assertIn('[streams:err] to err', content)
+        self.assertEqual(self.mux.stats()['streams']['tail'], 2)
+
+    def test_overlong_line_is_truncated(self):
+        with mock.patch.object(startup, 'LOG_MAX_LINE', 16):
+            tail = self.run_service('long', "print('x' * 100); print('short')")
+        self.assertEqual(tail[0], 'x' * 16)
+        self.assertEqual(tail[-1], 'short')
+
+    def test_tail_is_bounded(self):
+        tail = self.run_service('bounded', "for n in range(50): print(n)")
+        self.assertEqual(tail, [str(n) for n in range(40, 50)])
+        self.assertEqual(self.mux.tail('bounded', 2), ['48', '49'])
+
+class ServiceLauncherTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.failing = set()
+
+    def fake_start(self, spec):
+        with self.lock:
+            self.events.append(('start', spec.name))
+        time.sleep(0.05)
+        with self.lock:
+            self.events.append(('ready', spec.name))
+        return spec.name not in self.failing
+
+    def launch(self, specs):
+        launcher = ServiceLauncher(specs)
+        with mock.patch.object(startup, 'start_service', self.fake_start):
+            return launcher, launcher.launch()
+
+    def test_services_start_after_their_dependencies(self):
+        launcher, ok = self.launch([
+            ServiceSpec('api', 'API', [], deps=('redis', 'db')),
+            ServiceSpec('redis', 'Redis', []),
+            ServiceSpec('db', 'DB', []),
+            ServiceSpec('worker', 'Worker', [], deps=('api',)),
+        ])
+
+        self.assertTrue(ok)
+        position = {event: index for index, event in enumerate(self.events)}
+        for service, dep in (('api', 'redis'), ('api', 'db'), ('worker', 'api')):
+            self.assertLess(position[('ready', dep)], position[('start', service)], (service, dep))
+        # Service không phụ thuộc nhau khởi động song song
+        self.assertLess(position[('start', 'db')], position[('ready', 'redis')])
+        self.assertEqual(launcher.critical_path()[-2:], ['api', 'worker'])
+
+    def test_failed_dependency_stops_dependents(self):
+        self.failing.add('redis')
+        launcher, ok = self.launch([
+            ServiceSpec('redis', 'Redis', []),
+            ServiceSpec('api', 'API', [], deps=('redis',)),
+        ])
+
+        self.assertFalse(ok)
+        self.assertNotIn(('start', 'api'), self.events)
+        self.assertFalse(launcher.timeline['redis'][2])
+
+    def test_dependency_cycle_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'cycle'):
+            ServiceLauncher([
+                ServiceSpec('a', 'A', [], deps=('b',)),
+                ServiceSpec('b', 'B', [], deps=('c',)),
+                ServiceSpec('c', 'C', [], deps=('a',)),
+            ])
+
+    def test_unknown_dependency_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, 'unknown service'):
+            ServiceLauncher([ServiceSpec('api', 'API', [], deps=('redis',))])
+
+if __name__ == '__main__':
+    unittest.main()